@@ -66,6 +66,7 @@ try:
             ("comentario_admin_reembolso", "TEXT NULL"),
             ("historial_reembolsos", "JSON NULL"),
             ("visto_por_usuario", "BOOLEAN DEFAULT TRUE NOT NULL"),
+            ("reintentar_generacion_en", "TIMESTAMP NULL"),
         ]
 
         for col_name, col_def in columnas_casos:
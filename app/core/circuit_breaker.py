@@ -0,0 +1,152 @@
+"""
+Circuit breaker simple para integraciones externas (Vita Wallet, etc.)
+
+Estados:
+- CERRADO: las llamadas pasan normalmente
+- ABIERTO: tras N fallos consecutivos se rechazan las llamadas durante un tiempo
+- SEMI_ABIERTO: pasado ese tiempo se deja pasar una llamada de prueba;
+  si funciona se cierra, si falla se vuelve a abrir
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CERRADO = "CERRADO"
+ABIERTO = "ABIERTO"
+SEMI_ABIERTO = "SEMI_ABIERTO"
+
+
+class CircuitoAbiertoError(Exception):
+    """Se lanza cuando el circuito está abierto y la llamada no se intenta."""
+    def __init__(self, nombre: str, reintentar_en: float):
+        self.nombre = nombre
+        self.reintentar_en = reintentar_en
+        super().__init__(
+            f"Circuito '{nombre}' abierto, reintentar en {reintentar_en:.0f}s"
+        )
+
+
+class CircuitBreaker:
+    """
+    Uso:
+        breaker = CircuitBreaker("vita", umbral_fallos=5, segundos_abierto=30)
+
+        es_prueba = breaker.verificar()   # lanza CircuitoAbiertoError si está abierto
+        try:
+            resultado = llamar_servicio()
+        except ErrorTransitorio:
+            breaker.registrar_fallo()
+            raise
+        except BaseException:
+            # Cancelación o error ajeno al servicio: sin veredicto
+            if es_prueba:
+                breaker.liberar_prueba()
+            raise
+        breaker.registrar_exito()
+
+    Toda llamada autorizada como prueba debe terminar en registrar_exito,
+    registrar_fallo o liberar_prueba; si no, el circuito queda SEMI_ABIERTO
+    rechazando llamadas indefinidamente.
+    """
+
+    def __init__(self, nombre: str, umbral_fallos: int = 5, segundos_abierto: float = 30.0):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.segundos_abierto = segundos_abierto
+
+        self._estado = CERRADO
+        self._fallos_consecutivos = 0
+        self._abierto_desde: Optional[float] = None
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            self._actualizar_estado()
+            return self._estado
+
+    def _actualizar_estado(self):
+        """Pasa de ABIERTO a SEMI_ABIERTO cuando vence el tiempo de apertura."""
+        if self._estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.segundos_abierto:
+            self._estado = SEMI_ABIERTO
+            self._prueba_en_curso = False
+
+    def verificar(self) -> bool:
+        """
+        Autoriza una llamada o lanza CircuitoAbiertoError.
+        En SEMI_ABIERTO solo se permite una llamada de prueba a la vez.
+
+        Returns:
+            True si la llamada autorizada es la de prueba (SEMI_ABIERTO)
+        """
+        with self._lock:
+            self._actualizar_estado()
+
+            if self._estado == CERRADO:
+                return False
+
+            if self._estado == SEMI_ABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+
+            raise CircuitoAbiertoError(self.nombre, self._reintentar_en())
+
+    def _reintentar_en(self) -> float:
+        reintentar_en = 1.0
+        if self._abierto_desde is not None:
+            reintentar_en = max(
+                1.0, self.segundos_abierto - (time.monotonic() - self._abierto_desde)
+            )
+        return reintentar_en
+
+    def reintentar_en(self) -> Optional[float]:
+        """Segundos hasta la próxima llamada de prueba, o None si el circuito no está abierto."""
+        with self._lock:
+            self._actualizar_estado()
+            return self._reintentar_en() if self._estado == ABIERTO else None
+
+    def registrar_exito(self):
+        with self._lock:
+            if self._estado != CERRADO:
+                logger.info(f"🟢 Circuito '{self.nombre}' cerrado nuevamente")
+            self._estado = CERRADO
+            self._fallos_consecutivos = 0
+            self._abierto_desde = None
+            self._prueba_en_curso = False
+
+    def liberar_prueba(self):
+        """
+        Devuelve el cupo de la llamada de prueba sin veredicto (cancelada o
+        fallida por una causa ajena al servicio): la siguiente llamada probará.
+        """
+        with self._lock:
+            if self._estado == SEMI_ABIERTO:
+                self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos_consecutivos += 1
+            if self._estado == SEMI_ABIERTO or self._fallos_consecutivos >= self.umbral_fallos:
+                if self._estado != ABIERTO:
+                    logger.warning(
+                        f"🔴 Circuito '{self.nombre}' abierto tras "
+                        f"{self._fallos_consecutivos} fallos consecutivos"
+                    )
+                self._estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+                self._prueba_en_curso = False
+
+    def resumen(self) -> dict:
+        """Estado actual para health checks."""
+        with self._lock:
+            self._actualizar_estado()
+            return {
+                "nombre": self.nombre,
+                "estado": self._estado,
+                "fallos_consecutivos": self._fallos_consecutivos,
+            }
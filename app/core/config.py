@@ -38,6 +38,53 @@ class Settings(BaseSettings):
     VITA_X_LOGIN: Optional[str] = None  # Hash hexadecimal del business (para firmas)
     VITA_WALLET_MASTER_UUID: Optional[str] = None  # UUID de la wallet maestra
     VITA_ENVIRONMENT: str = "sandbox"  # sandbox | production
+    RECONCILIACION_INTERVALO_SEGUNDOS: int = 120  # Cada cuánto se reconcilian pagos pendientes
+
+    # Catálogo de referencias (entidades y derechos)
+    CATALOGO_RECARGA_SEGUNDOS: int = 60  # Cada cuánto cada worker revisa si hay nueva versión
+
+    # Almacenamiento de archivos subidos (evidencias)
+    STORAGE_BACKEND: str = "local"  # local (un object store se agrega en almacenamiento_service)
+    ALMACENAMIENTO_DIR: str = "almacenamiento"  # Privado: evidencias, previews y temporales (no se monta)
+    UPLOADS_DIR: str = "uploads"  # Solo lectura de evidencias antiguas; ya no se sirve públicamente
+
+    # Scheduler embebido (tareas periódicas y diarias)
+    SCHEDULER_ENABLED: bool = True  # False si se usa un cron externo
+    SCHEDULER_ZONA_HORARIA: str = "America/Bogota"  # Zona de las expresiones cron
+
+    # Generación de documentos con LLM
+    LLM_PROVEEDOR: str = "openai"  # openai | simulado (respuestas locales para pruebas de carga y CI)
+    LLM_PRESUPUESTO_TOKENS_DATOS: int = 3000  # Máximo de tokens de datos del caso por prompt (los hechos se recortan)
+    LLM_PRESUPUESTO_TOKENS_CONVERSACION: int = 6000  # Techo de la transcripción compactada para la extracción
+    LLM_MODELO_RESUMEN: str = "gpt-5-mini-2025-08-07"  # Modelo para resumir los turnos antiguos de transcripciones largas
+
+    # Protección ante degradación del LLM (circuit breaker + concurrencia AIMD)
+    LLM_TIMEOUT_S: float = 180.0  # Timeout por intento del cliente OpenAI
+    LLM_REINTENTOS: int = 1  # Reintentos del SDK (cada uno puede durar LLM_TIMEOUT_S)
+    LLM_CIRCUITO_UMBRAL_FALLOS: int = 5  # Fallos consecutivos (429, timeout, 5xx, lenta) que abren el circuito
+    LLM_CIRCUITO_SEGUNDOS_ABIERTO: float = 60.0  # Tiempo abierto antes de la llamada de prueba
+    LLM_LATENCIA_BASE_S: float = 20.0  # Una llamada es lenta si supera base + tokens / LLM_TOKENS_POR_SEGUNDO_MIN
+    LLM_TOKENS_POR_SEGUNDO_MIN: float = 20.0
+    LLM_CONCURRENCIA_MIN: int = 2  # Límite adaptativo de llamadas simultáneas por proceso
+    LLM_CONCURRENCIA_MAX: int = 16
+    LLM_ESPERA_PERMISO_S: float = 10.0  # Espera máxima por cupo antes de fallar rápido
+
+    # Proveedor simulado (LLM_PROVEEDOR=simulado)
+    LLM_SIMULADO_TTFT_MS: int = 800  # Mediana del tiempo al primer token
+    LLM_SIMULADO_TTFT_P95_MS: int = 3000  # p95 del tiempo al primer token (distribución lognormal)
+    LLM_SIMULADO_TOKENS_POR_SEGUNDO: float = 60.0  # Velocidad de decodificación
+    LLM_SIMULADO_ESCALA_TIEMPO: float = 1.0  # Multiplica todas las esperas (0 = sin esperas, para CI)
+    LLM_SIMULADO_TASA_ERROR: float = 0.0  # Fracción de llamadas que fallan (rate limit, timeout, 500)
+    LLM_SIMULADO_SEMILLA: int = 0
+
+    # Métricas (GET /metrics). Con varios workers definir además la variable de
+    # entorno PROMETHEUS_MULTIPROC_DIR (directorio compartido, vacío al arrancar)
+    METRICS_TOKEN: Optional[str] = None  # Si se define, el scrape debe enviar Bearer <token>
+
+    # Trazas OpenTelemetry (none = no-op; console/file para analizar flujos)
+    TRACING_EXPORTER: str = "none"  # none | console | file
+    TRACING_ARCHIVO: str = "trazas.jsonl"  # Destino con TRACING_EXPORTER=file
+    TRACING_SERVICIO: str = "abogadai-backend"
 
     # Email verification
     EMAIL_VERIFICATION_EXPIRE_HOURS: int = 24
@@ -0,0 +1,111 @@
+"""
+Parser mínimo de expresiones cron (5 campos) para el scheduler embebido.
+
+Formato: "minuto hora dia_mes mes dia_semana"
+- Soporta: *, números, listas (1,15), rangos (1-5), pasos (*/10, 0-30/5)
+- dia_semana: 0-7 (0 y 7 = domingo)
+- Como en cron estándar: si dia_mes y dia_semana están restringidos,
+  basta con que se cumpla uno de los dos
+
+Ejemplos:
+    "0 0 * * *"     -> todos los días a medianoche
+    "*/10 * * * *"  -> cada 10 minutos
+    "30 1 * * 1-5"  -> 01:30 de lunes a viernes
+"""
+
+from datetime import datetime, timedelta
+from typing import Set
+
+_LIMITES = (
+    ("minuto", 0, 59),
+    ("hora", 0, 23),
+    ("dia_mes", 1, 31),
+    ("mes", 1, 12),
+    ("dia_semana", 0, 7),
+)
+
+
+class ExpresionCronInvalida(ValueError):
+    pass
+
+
+def _parsear_campo(campo: str, nombre: str, minimo: int, maximo: int) -> Set[int]:
+    valores: Set[int] = set()
+    for parte in campo.split(","):
+        rango, _, paso_txt = parte.partition("/")
+        try:
+            paso = int(paso_txt) if paso_txt else 1
+            if rango == "*":
+                inicio, fin = minimo, maximo
+            elif "-" in rango:
+                inicio_txt, fin_txt = rango.split("-", 1)
+                inicio, fin = int(inicio_txt), int(fin_txt)
+            else:
+                inicio = int(rango)
+                fin = maximo if paso_txt else inicio
+        except ValueError:
+            raise ExpresionCronInvalida(f"Campo {nombre} inválido: '{campo}'")
+
+        if paso < 1 or inicio < minimo or fin > maximo or inicio > fin:
+            raise ExpresionCronInvalida(f"Campo {nombre} fuera de rango: '{campo}'")
+
+        valores.update(range(inicio, fin + 1, paso))
+    return valores
+
+
+class ExpresionCron:
+    """
+    Uso:
+        cron = ExpresionCron("0 0 * * *")
+        cron.siguiente(datetime(2026, 1, 1, 10, 30))  # -> 2026-01-02 00:00
+    """
+
+    def __init__(self, expresion: str):
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ExpresionCronInvalida(f"Se esperaban 5 campos: '{expresion}'")
+
+        self.expresion = expresion
+        self.minutos, self.horas, self.dias_mes, self.meses, dias_semana = (
+            _parsear_campo(campo, nombre, minimo, maximo)
+            for campo, (nombre, minimo, maximo) in zip(campos, _LIMITES)
+        )
+        # 7 = domingo = 0; se normaliza a la convención de Python (lunes=0)
+        self.dias_semana = {(d - 1) % 7 for d in dias_semana}
+
+        self._dia_mes_restringido = campos[2] != "*"
+        self._dia_semana_restringido = campos[4] != "*"
+
+    def _dia_coincide(self, fecha: datetime) -> bool:
+        coincide_mes = fecha.day in self.dias_mes
+        coincide_semana = fecha.weekday() in self.dias_semana
+        if self._dia_mes_restringido and self._dia_semana_restringido:
+            return coincide_mes or coincide_semana
+        return coincide_mes and coincide_semana
+
+    def siguiente(self, desde: datetime) -> datetime:
+        """Primer instante (minuto exacto) estrictamente posterior a `desde`."""
+        fecha = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = fecha + timedelta(days=366 * 5)
+
+        while fecha < limite:
+            if fecha.month not in self.meses:
+                # Saltar al primer día del mes siguiente
+                anio, mes = (fecha.year + 1, 1) if fecha.month == 12 else (fecha.year, fecha.month + 1)
+                fecha = fecha.replace(year=anio, month=mes, day=1, hour=0, minute=0)
+                continue
+            if not self._dia_coincide(fecha):
+                fecha = (fecha + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if fecha.hour not in self.horas:
+                fecha = (fecha + timedelta(hours=1)).replace(minute=0)
+                continue
+            if fecha.minute not in self.minutos:
+                fecha += timedelta(minutes=1)
+                continue
+            return fecha
+
+        raise ExpresionCronInvalida(f"La expresión nunca se cumple: '{self.expresion}'")
+
+    def __str__(self) -> str:
+        return self.expresion
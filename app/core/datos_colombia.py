@@ -329,30 +329,6 @@ def obtener_entidades_por_tipo(tipo: str = None):
     return todas
 
 
-def buscar_entidad(termino: str):
-    """
-    Busca una entidad por término de búsqueda.
-
-    Args:
-        termino: Término a buscar
-
-    Returns:
-        Lista de entidades que coinciden
-    """
-    termino_lower = termino.lower()
-    resultados = []
-
-    for categoria, entidades in ENTIDADES_PUBLICAS.items():
-        for entidad in entidades:
-            if termino_lower in entidad.lower():
-                resultados.append({
-                    "entidad": entidad,
-                    "categoria": categoria
-                })
-
-    return resultados
-
-
 # Normativa Legal Colombiana Relevante
 NORMATIVA_DERECHO_PETICION = {
     "ley_principal": {
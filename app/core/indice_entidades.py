@@ -0,0 +1,346 @@
+"""
+Índice de búsqueda en memoria para el autocompletado de entidades públicas.
+
+Se construye una sola vez a partir del catálogo y permite buscar sin recorrer
+la lista completa en cada tecla:
+- Normalización: minúsculas y sin tildes ("Gobernación" == "gobernacion")
+- Índice de prefijos por token: "min sal" encuentra "Ministerio de Salud..."
+- Índice de trigramas sobre el vocabulario para tolerar errores de digitación
+- Listas de posiciones en orden de ranking: la búsqueda se detiene al
+  juntar el límite de resultados
+"""
+
+import bisect
+import heapq
+import itertools
+import unicodedata
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+# Palabras vacías que no aportan a la búsqueda (se ignoran en la consulta)
+STOPWORDS = {"de", "del", "la", "las", "el", "los", "y", "e", "en", "para", "por", "a"}
+
+# Longitud máxima de prefijo indexado por token (acota la memoria del índice)
+MAX_LONGITUD_PREFIJO = 20
+
+# Rangos alfabéticos de hasta este tamaño se ordenan completos; los mayores se
+# recorren por la lista del primer token (que ya está en orden de ranking)
+MAX_RANGO_ORDENADO = 1000
+
+# Candidatos verificados uno a uno antes de pasar a filtrar con conjuntos, y
+# tamaño máximo (relativo a la lista guía) de una lista que vale la pena convertir
+MAX_VERIFICACIONES_DIRECTAS = 64
+FACTOR_CONJUNTO = 3
+
+_PATRON_TOKEN = re.compile(r"[a-z0-9ñ]+")
+
+
+def normalizar(texto: str) -> str:
+    """
+    Pasa a minúsculas y elimina tildes/diacríticos (conserva la ñ).
+
+    Ejemplo:
+        "Gobernación de Bolívar" -> "gobernacion de bolivar"
+    """
+    if not texto:
+        return ""
+    texto = texto.lower().replace("ñ", "\x00")
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return texto.replace("\x00", "ñ")
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Divide un texto normalizado en tokens alfanuméricos."""
+    return _PATRON_TOKEN.findall(normalizar(texto))
+
+
+def _trigramas(token: str) -> Set[str]:
+    """Trigramas del token con marcador de inicio (favorece coincidir el prefijo)."""
+    relleno = f"^{token}"
+    if len(relleno) < 3:
+        return {relleno}
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def _distancia_edicion(a: str, b: str, maximo: int) -> int:
+    """
+    Distancia de Damerau-Levenshtein (transposiciones adyacentes) con corte temprano.
+    Retorna maximo + 1 si la distancia supera el máximo permitido.
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+
+    anterior_anterior = None
+    anterior = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        actual = [i] + [0] * len(b)
+        minimo_fila = actual[0]
+        for j in range(1, len(b) + 1):
+            costo = 0 if a[i - 1] == b[j - 1] else 1
+            actual[j] = min(
+                anterior[j] + 1,
+                actual[j - 1] + 1,
+                anterior[j - 1] + costo,
+            )
+            if (anterior_anterior is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                actual[j] = min(actual[j], anterior_anterior[j - 2] + 1)
+            minimo_fila = min(minimo_fila, actual[j])
+        if minimo_fila > maximo:
+            return maximo + 1
+        anterior_anterior, anterior = anterior, actual
+
+    return anterior[len(b)]
+
+
+def _errores_permitidos(token: str) -> int:
+    """Errores de digitación tolerados según la longitud del token consultado."""
+    if len(token) < 4:
+        return 0
+    if len(token) < 8:
+        return 1
+    return 2
+
+
+class _Condicion(NamedTuple):
+    """Lo que un token de la consulta exige a una entrada."""
+    listas: List[List[int]]          # Posiciones candidatas (cada lista en orden de ranking)
+    cumple: Callable[[int], bool]    # Verificación sobre la entrada en esa posición
+    exacta: bool                     # True si las listas ya son exactamente las entradas que cumplen
+
+    @property
+    def tamano(self) -> int:
+        return sum(len(lista) for lista in self.listas)
+
+
+class IndiceEntidades:
+    """
+    Índice de búsqueda de entidades (nombre + categoría).
+
+    Las entradas se guardan en orden de ranking (nombre normalizado más corto
+    primero, luego orden de llegada) y todas las listas de posiciones del
+    índice quedan en ese orden: una búsqueda recorre las listas desde el
+    principio y se detiene al juntar `limite` resultados, sin puntuar todos
+    los candidatos de un prefijo corto.
+
+    Uso:
+        indice = IndiceEntidades.desde_catalogo(ENTIDADES_PUBLICAS)
+        indice.buscar("sanitas", limite=10)
+        -> [{"entidad": "Sanitas EPS", "categoria": "EPS"}]
+    """
+
+    def __init__(self, entradas: Iterable[Tuple[str, str]]):
+        llegadas = [(nombre, categoria, tokenizar(nombre)) for nombre, categoria in entradas]
+        llegadas.sort(key=lambda entrada: len(" ".join(entrada[2])))  # sort estable: desempata por llegada
+
+        # La posición de cada entrada es su lugar en el ranking
+        self._entradas: List[Tuple[str, str]] = []
+        self._nombres_normalizados: List[str] = []
+        self._tokens_por_entrada: List[List[str]] = []
+        # " " + nombre normalizado: `" " + token in ...` dice si algún token empieza por token
+        self._nombres_espaciados: List[str] = []
+
+        # prefijo de token -> posiciones de entradas que tienen un token con ese prefijo
+        self._prefijos: Dict[str, List[int]] = {}
+        # token completo -> posiciones de entradas
+        self._tokens: Dict[str, List[int]] = {}
+        # trigrama -> tokens del vocabulario que lo contienen
+        self._trigramas: Dict[str, Set[str]] = {}
+        # nombre normalizado -> posiciones (coincidencia exacta)
+        self._nombres: Dict[str, List[int]] = {}
+
+        for nombre, categoria, tokens in llegadas:
+            self._agregar(nombre, categoria, tokens)
+
+        # Nombres en orden alfabético: los que empiezan por el término son un rango contiguo
+        orden_alfabetico = sorted(range(len(self._entradas)), key=self._nombres_normalizados.__getitem__)
+        self._alfabetico: List[str] = [self._nombres_normalizados[i] for i in orden_alfabetico]
+        self._posiciones_alfabetico: List[int] = orden_alfabetico
+
+    @classmethod
+    def desde_catalogo(cls, catalogo: Dict[str, List[str]]) -> "IndiceEntidades":
+        """Construye el índice desde un dict {categoria: [nombres]}."""
+        return cls(
+            (nombre, categoria)
+            for categoria, nombres in catalogo.items()
+            for nombre in nombres
+        )
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def _agregar(self, nombre: str, categoria: str, tokens: List[str]):
+        posicion = len(self._entradas)
+        nombre_normalizado = " ".join(tokens)
+
+        self._entradas.append((nombre, categoria))
+        self._nombres_normalizados.append(nombre_normalizado)
+        self._tokens_por_entrada.append(tokens)
+        self._nombres_espaciados.append(f" {nombre_normalizado}")
+        self._nombres.setdefault(nombre_normalizado, []).append(posicion)
+
+        prefijos: Set[str] = set()
+        for token in set(tokens):
+            self._tokens.setdefault(token, []).append(posicion)
+            prefijos.update(token[:fin] for fin in range(1, min(len(token), MAX_LONGITUD_PREFIJO) + 1))
+            for trigrama in _trigramas(token):
+                self._trigramas.setdefault(trigrama, set()).add(token)
+        for prefijo in prefijos:
+            self._prefijos.setdefault(prefijo, []).append(posicion)
+
+    def _condicion_prefijo(self, token: str) -> _Condicion:
+        clave, nombres = f" {token}", self._nombres_espaciados
+
+        def cumple(posicion: int) -> bool:
+            return clave in nombres[posicion]
+
+        # Tokens más largos que el prefijo indexado: la lista es un superconjunto
+        lista = self._prefijos.get(token[:MAX_LONGITUD_PREFIJO], [])
+        return _Condicion([lista] if lista else [], cumple, len(token) <= MAX_LONGITUD_PREFIJO)
+
+    def _tokens_aproximados(self, token: str) -> Set[str]:
+        """Tokens del vocabulario parecidos (errores de digitación) al consultado."""
+        maximo = _errores_permitidos(token)
+        if maximo == 0:
+            return set()
+
+        # Vocabulario candidato: tokens que comparten suficientes trigramas
+        conteo: Dict[str, int] = {}
+        for trigrama in _trigramas(token):
+            for candidato in self._trigramas.get(trigrama, ()):
+                conteo[candidato] = conteo.get(candidato, 0) + 1
+        minimo_comun = max(1, len(_trigramas(token)) - 3 * maximo)
+
+        similares: Set[str] = set()
+        for candidato, comunes in conteo.items():
+            if comunes < minimo_comun:
+                continue
+            # Se compara contra el prefijo del candidato para seguir autocompletando
+            for largo in (len(token) - 1, len(token), len(token) + 1):
+                if largo <= 0 or largo > len(candidato):
+                    continue
+                if _distancia_edicion(token, candidato[:largo], maximo) <= maximo:
+                    similares.add(candidato)
+                    break
+        return similares
+
+    def _condicion_aproximada(self, token: str) -> _Condicion:
+        similares, tokens_por_entrada = self._tokens_aproximados(token), self._tokens_por_entrada
+
+        def cumple(posicion: int) -> bool:
+            return not similares.isdisjoint(tokens_por_entrada[posicion])
+
+        return _Condicion([self._tokens[t] for t in similares], cumple, True)
+
+    def _que_cumplen(self, condiciones: List[_Condicion]) -> Iterator[int]:
+        """
+        Posiciones que cumplen todas las condiciones, en orden de ranking.
+
+        Recorre la condición con menos candidatos y verifica las demás sobre
+        cada entrada. Si tras MAX_VERIFICACIONES_DIRECTAS candidatos la
+        intersección resulta poco densa, el resto se filtra con conjuntos de
+        las listas (en C) en vez de verificar entrada por entrada.
+        """
+        guia = min(condiciones, key=lambda condicion: condicion.tamano)
+        resto = [c for c in condiciones if c is not guia or not c.exacta]
+        if len(guia.listas) == 1:
+            candidatos = iter(guia.listas[0])
+        else:
+            # Una entrada puede estar en varias listas de la guía (tokens similares)
+            candidatos = (posicion for posicion, _ in itertools.groupby(heapq.merge(*guia.listas)))
+
+        for verificados, posicion in enumerate(candidatos, 1):
+            if all(condicion.cumple(posicion) for condicion in resto):
+                yield posicion
+            if verificados == MAX_VERIFICACIONES_DIRECTAS:
+                break
+        else:
+            return
+
+        for condicion in sorted(resto, key=lambda c: c.tamano):
+            if condicion.exacta and condicion.tamano <= FACTOR_CONJUNTO * guia.tamano:
+                conjunto = set(itertools.chain.from_iterable(condicion.listas))
+                candidatos = filter(conjunto.__contains__, candidatos)
+            else:
+                candidatos = filter(condicion.cumple, candidatos)
+        yield from candidatos
+
+    def _empiezan_por(self, termino: str) -> Iterator[int]:
+        """Posiciones cuyo nombre normalizado empieza por el término, en orden de ranking."""
+        inicio = bisect.bisect_left(self._alfabetico, termino)
+        fin = bisect.bisect_left(self._alfabetico, termino + "\U0010ffff", lo=inicio)
+        if fin - inicio <= MAX_RANGO_ORDENADO:
+            yield from sorted(self._posiciones_alfabetico[inicio:fin])
+            return
+        # Rango grande ("a", "alc"): la lista del primer token en orden de ranking
+        # encuentra los primeros resultados sin ordenar todo el rango
+        primer_token = termino.split(" ", 1)[0]
+        for posicion in self._condicion_prefijo(primer_token).listas[0]:
+            if self._nombres_normalizados[posicion].startswith(termino):
+                yield posicion
+
+    def buscar(self, termino: str, limite: Optional[int] = 20) -> List[dict]:
+        """
+        Busca entidades por término (insensible a mayúsculas y tildes).
+
+        Ranking (mayor a menor):
+            1. Nombre idéntico al término
+            2. Nombre que empieza por el término
+            3. Todos los tokens coinciden por prefijo
+            4. Coincidencias con errores de digitación
+        A igual puntaje, se prefieren los nombres más cortos.
+
+        Cada nivel se recorre en orden de ranking y la búsqueda termina al
+        juntar `limite` resultados.
+
+        Args:
+            termino: Texto escrito por el usuario
+            limite: Máximo de resultados (None = sin límite)
+
+        Returns:
+            Lista de {"entidad": str, "categoria": str}
+        """
+        tokens = tokenizar(termino)
+        significativos = [t for t in tokens if t not in STOPWORDS]
+        if significativos:
+            tokens = significativos
+        if not tokens or (limite is not None and limite <= 0):
+            return []
+
+        condiciones: List[_Condicion] = []
+        aproximada = False
+        for token in tokens:
+            condicion = self._condicion_prefijo(token)
+            if not condicion.listas:
+                condicion = self._condicion_aproximada(token)
+                aproximada = True
+            if not condicion.listas:
+                return []
+            condiciones.append(condicion)
+
+        if aproximada:
+            # Con un token corregido ningún nombre coincide ni empieza por el término
+            niveles = [self._que_cumplen(condiciones)]
+        else:
+            termino_normalizado = " ".join(tokenizar(termino))
+            niveles = [
+                self._nombres.get(termino_normalizado, ()),
+                self._empiezan_por(termino_normalizado),
+                self._que_cumplen(condiciones),
+            ]
+
+        resultados: List[int] = []
+        vistos: Set[int] = set()
+        for posicion in itertools.chain.from_iterable(niveles):
+            if posicion in vistos:
+                continue
+            vistos.add(posicion)
+            resultados.append(posicion)
+            if limite is not None and len(resultados) >= limite:
+                break
+
+        return [
+            {"entidad": self._entradas[i][0], "categoria": self._entradas[i][1]}
+            for i in resultados
+        ]
@@ -0,0 +1,71 @@
+"""
+Parser de objetos JSON truncados
+
+Una respuesta del LLM puede cortarse a mitad del objeto (max_completion_tokens,
+stream interrumpido). En vez de descartarla, se rescatan los pares
+clave/valor que llegaron completos:
+
+    parsear_json_parcial('{"a": "x", "b": tru')   # {"a": "x"}
+    parsear_json_parcial('{"a": "x", "b": true')  # {"a": "x", "b": True}
+
+Un valor se considera completo si termina en comilla de cierre, true/false/null
+o cierre de objeto/lista; un número al final se descarta (podría estar cortado).
+"""
+import json
+
+_FINALES_COMPLETOS = ('"', "true", "false", "null", "}", "]")
+
+
+def parsear_json_parcial(texto: str) -> dict:
+    """
+    Objeto JSON del texto, o sus pares completos si está truncado.
+
+    Returns:
+        dict (vacío si no hay ningún par rescatable o el JSON no es un objeto)
+    """
+    texto = (texto or "").strip()
+    inicio = texto.find("{")
+    if inicio < 0:
+        return {}
+
+    try:
+        valor, _ = json.JSONDecoder().raw_decode(texto, inicio)
+        return valor if isinstance(valor, dict) else {}
+    except json.JSONDecodeError:
+        pass
+
+    # Posiciones de las comas de primer nivel: todo lo anterior está completo
+    comas = []
+    profundidad = 0
+    en_cadena = escape = False
+    for i in range(inicio, len(texto)):
+        c = texto[i]
+        if en_cadena:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                en_cadena = False
+        elif c == '"':
+            en_cadena = True
+        elif c in "{[":
+            profundidad += 1
+        elif c in "}]":
+            profundidad -= 1
+        elif c == "," and profundidad == 1:
+            comas.append(i)
+
+    candidatos = []
+    if texto.rstrip().endswith(_FINALES_COMPLETOS):
+        # El último valor pudo llegar completo (faltaría solo el cierre)
+        candidatos.append(texto[inicio:] + "}" * max(profundidad, 1))
+    candidatos += [texto[inicio:coma] + "}" for coma in reversed(comas)]
+
+    for candidato in candidatos:
+        try:
+            valor = json.loads(candidato)
+        except json.JSONDecodeError:
+            continue
+        return valor if isinstance(valor, dict) else {}
+    return {}
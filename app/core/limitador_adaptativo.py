@@ -0,0 +1,118 @@
+"""
+Límite de concurrencia adaptativo (AIMD) para dependencias externas (LLM)
+
+- Cada llamada pide un permiso; si no hay cupo espera hasta `espera` segundos
+  y luego falla rápido con ConcurrenciaAgotadaError en vez de bloquear un hilo
+  durante todo el timeout de la dependencia
+- Aumento aditivo: cada llamada sana suma 1/límite (≈ +1 por cada límite llamadas)
+- Reducción multiplicativa: una señal de sobrecarga (429, timeout, 5xx, llamada
+  lenta) multiplica el límite por `factor_reduccion`, como mucho una vez cada
+  `segundos_entre_reducciones` (las llamadas en curso fallan juntas)
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrenciaAgotadaError(Exception):
+    """Se lanza cuando no hay cupo de concurrencia dentro del tiempo de espera."""
+    def __init__(self, nombre: str, reintentar_en: float):
+        self.nombre = nombre
+        self.reintentar_en = reintentar_en
+        super().__init__(
+            f"Concurrencia de '{nombre}' agotada, reintentar en {reintentar_en:.0f}s"
+        )
+
+
+class LimitadorAIMD:
+    """
+    Uso:
+        limitador = LimitadorAIMD("openai", minimo=2, maximo=32)
+
+        limitador.adquirir(espera=10)    # lanza ConcurrenciaAgotadaError sin cupo
+        try:
+            resultado = llamar_servicio()
+        except ErrorDeSobrecarga:
+            limitador.liberar(sano=False)
+            raise
+        limitador.liberar(sano=True)
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        minimo: int = 2,
+        maximo: int = 32,
+        inicial: Optional[int] = None,
+        factor_reduccion: float = 0.5,
+        segundos_entre_reducciones: float = 5.0,
+        segundos_reintento: float = 15.0,
+    ):
+        self.nombre = nombre
+        self.minimo = minimo
+        self.maximo = maximo
+        self.factor_reduccion = factor_reduccion
+        self.segundos_entre_reducciones = segundos_entre_reducciones
+        self.segundos_reintento = segundos_reintento
+
+        self._limite = float(inicial if inicial is not None else maximo)
+        self._en_curso = 0
+        self._ultima_reduccion = 0.0
+        self._condicion = threading.Condition()
+
+    @property
+    def limite(self) -> int:
+        return int(self._limite)
+
+    @property
+    def en_curso(self) -> int:
+        return self._en_curso
+
+    def adquirir(self, espera: float = 0.0):
+        """Toma un permiso o lanza ConcurrenciaAgotadaError tras `espera` segundos."""
+        fin = time.monotonic() + espera
+        with self._condicion:
+            while self._en_curso >= int(self._limite):
+                restante = fin - time.monotonic()
+                if restante <= 0:
+                    raise ConcurrenciaAgotadaError(self.nombre, self.segundos_reintento)
+                self._condicion.wait(restante)
+            self._en_curso += 1
+
+    def liberar(self, sano: Optional[bool] = None):
+        """
+        Devuelve el permiso y ajusta el límite.
+
+        Args:
+            sano: True = llamada sana (aumento aditivo), False = sobrecarga
+                  (reducción multiplicativa), None = no ajustar (llamada no hecha)
+        """
+        with self._condicion:
+            self._en_curso -= 1
+            if sano is True:
+                self._limite = min(float(self.maximo), self._limite + 1 / self._limite)
+            elif sano is False:
+                ahora = time.monotonic()
+                if ahora - self._ultima_reduccion >= self.segundos_entre_reducciones:
+                    anterior = int(self._limite)
+                    self._limite = max(float(self.minimo), self._limite * self.factor_reduccion)
+                    self._ultima_reduccion = ahora
+                    logger.warning(
+                        f"🔻 Concurrencia de '{self.nombre}' reducida {anterior} -> {int(self._limite)}"
+                    )
+            self._condicion.notify_all()
+
+    def resumen(self) -> dict:
+        """Estado actual para health checks."""
+        with self._condicion:
+            return {
+                "nombre": self.nombre,
+                "limite": int(self._limite),
+                "en_curso": self._en_curso,
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+            }
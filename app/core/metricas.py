@@ -0,0 +1,307 @@
+"""
+Métricas de la aplicación en formato Prometheus (GET /metrics)
+
+- HTTP: latencia por plantilla de ruta (/casos/{caso_id}, no la URL concreta,
+  para no explotar la cardinalidad) y requests en curso
+- Pool de conexiones de la BD: conexiones en uso y overflow
+- LLM: latencia, tokens y errores por función (generar_tutela, ...)
+- Render de PDF, retraso de procesamiento de webhooks y jobs del scheduler
+- Colas en background (webhook_events, email_outbox): se consultan en la BD
+  al momento del scrape, así que son globales y no dependen del worker
+
+Varios workers de uvicorn: definir PROMETHEUS_MULTIPROC_DIR (directorio vacío
+al arrancar) antes de iniciar el proceso. Cada worker escribe sus valores en
+ese directorio y /metrics los agrega, sin importar qué worker atienda el scrape.
+"""
+import logging
+import os
+import time
+from datetime import datetime
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event, func
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+MULTIPROCESO = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+NAMESPACE = "abogadai"
+
+# Ruta sin coincidencia (404) o fuera del router: una sola etiqueta
+RUTA_DESCONOCIDA = "sin_ruta"
+
+
+# HTTP
+HTTP_DURACION = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las requests HTTP por plantilla de ruta",
+    ["metodo", "ruta", "codigo"],
+    namespace=NAMESPACE,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_EN_CURSO = Gauge(
+    "http_requests_in_progress",
+    "Requests HTTP en curso",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+
+# Pool de conexiones de la BD
+DB_POOL_EN_USO = Gauge(
+    "db_pool_checked_out",
+    "Conexiones del pool prestadas en este momento",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Conexiones abiertas por encima del tamaño del pool",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+DB_POOL_TAMANO = Gauge(
+    "db_pool_size",
+    "Tamaño configurado del pool",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+
+# LLM
+LLM_DURACION = Histogram(
+    "llm_request_duration_seconds",
+    "Latencia de las llamadas al LLM por función",
+    ["funcion", "modelo"],
+    namespace=NAMESPACE,
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 180),
+)
+LLM_TOKENS = Counter(
+    "llm_tokens",
+    "Tokens consumidos por función y tipo (prompt/prompt_cache/completion)",
+    ["funcion", "modelo", "tipo"],
+    namespace=NAMESPACE,
+)
+LLM_TOKENS_RECORTADOS = Counter(
+    "llm_prompt_tokens_trimmed",
+    "Tokens de datos del caso recortados para respetar el presupuesto del prompt",
+    ["funcion"],
+    namespace=NAMESPACE,
+)
+LLM_RECHAZOS = Counter(
+    "llm_load_shed",
+    "Llamadas al LLM rechazadas sin intentarse (circuito, concurrencia) o lentas",
+    ["funcion", "motivo"],
+    namespace=NAMESPACE,
+)
+LLM_CONCURRENCIA_LIMITE = Gauge(
+    "llm_concurrency_limit",
+    "Límite adaptativo (AIMD) de llamadas simultáneas al LLM",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+LLM_CIRCUITO_ABIERTO = Gauge(
+    "llm_circuit_open",
+    "1 si el circuito del LLM está abierto",
+    namespace=NAMESPACE,
+    multiprocess_mode="livemax",
+)
+TRANSCRIPCION_COMPRESION = Histogram(
+    "transcript_compression_ratio",
+    "Tokens de la conversación compactada / tokens originales antes de la extracción",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+    namespace=NAMESPACE,
+)
+LLM_ERRORES = Counter(
+    "llm_errors",
+    "Llamadas al LLM fallidas por función y tipo de error",
+    ["funcion", "error"],
+    namespace=NAMESPACE,
+)
+
+# Documentos
+PDF_DURACION = Histogram(
+    "pdf_render_duration_seconds",
+    "Tiempo de generación de PDFs",
+    namespace=NAMESPACE,
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+
+# Webhooks: desde que se recibe el evento hasta que queda aplicado
+WEBHOOK_RETRASO = Histogram(
+    "webhook_processing_lag_seconds",
+    "Retraso entre la recepción y la aplicación de un webhook",
+    ["proveedor"],
+    namespace=NAMESPACE,
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 900, 3600),
+)
+
+# Scheduler
+JOB_DURACION = Histogram(
+    "scheduler_job_duration_seconds",
+    "Duración de las ejecuciones de jobs del scheduler",
+    ["job", "resultado"],
+    namespace=NAMESPACE,
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900),
+)
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI: latencia por plantilla de ruta y requests en curso.
+
+    La plantilla se lee de scope["route"], que el router completa al resolver
+    la ruta (por eso se consulta al terminar la request).
+
+    La medición termina con el último bloque de la respuesta: las
+    BackgroundTasks corren dentro de la misma llamada ASGI pero después de
+    responder, y no deben contar como latencia de la ruta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codigo = 500
+        inicio = time.perf_counter()
+        registrada = False
+
+        def registrar():
+            nonlocal registrada
+            if registrada:
+                return
+            registrada = True
+            HTTP_EN_CURSO.dec()
+            ruta = getattr(scope.get("route"), "path", None) or RUTA_DESCONOCIDA
+            HTTP_DURACION.labels(scope["method"], ruta, str(codigo)).observe(
+                time.perf_counter() - inicio
+            )
+
+        async def enviar(mensaje):
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            await send(mensaje)
+            if mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                registrar()
+
+        HTTP_EN_CURSO.inc()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            registrar()  # Sin respuesta completa (error o desconexión)
+
+
+def instrumentar_pool(engine):
+    """Actualiza los gauges del pool en cada checkout/checkin de conexión."""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return  # Pools sin contabilidad (NullPool, StaticPool)
+
+    if hasattr(pool, "size"):
+        DB_POOL_TAMANO.set(pool.size())
+
+    def actualizar(*_):
+        DB_POOL_EN_USO.set(pool.checkedout())
+        # overflow() es negativo mientras el pool no se llena
+        DB_POOL_OVERFLOW.set(max(0, pool.overflow()))
+
+    event.listen(engine, "checkout", actualizar)
+    event.listen(engine, "checkin", actualizar)
+
+
+class ColectorColas:
+    """Profundidad y antigüedad de las colas en background, leídas de la BD en cada scrape."""
+
+    def describe(self):
+        return [
+            GaugeMetricFamily(f"{NAMESPACE}_queue_depth", "", labels=["cola"]),
+            GaugeMetricFamily(f"{NAMESPACE}_queue_oldest_seconds", "", labels=["cola"]),
+        ]
+
+    def collect(self):
+        from .database import SessionLocal
+        from ..models.email_outbox import EmailOutbox, EstadoEmail
+        from ..models.webhook_event import WebhookEvent, EstadoWebhookEvent
+
+        profundidad = GaugeMetricFamily(
+            f"{NAMESPACE}_queue_depth",
+            "Elementos pendientes (o con error reintentable) por cola",
+            labels=["cola"],
+        )
+        antiguedad = GaugeMetricFamily(
+            f"{NAMESPACE}_queue_oldest_seconds",
+            "Antigüedad del pendiente más viejo por cola",
+            labels=["cola"],
+        )
+
+        colas = {
+            "webhook_events": (
+                WebhookEvent.id, WebhookEvent.recibido_en,
+                WebhookEvent.estado.in_([EstadoWebhookEvent.PENDIENTE, EstadoWebhookEvent.ERROR]),
+            ),
+            "email_outbox": (
+                EmailOutbox.id, EmailOutbox.creado_en,
+                EmailOutbox.estado.in_([EstadoEmail.PENDIENTE, EstadoEmail.ERROR]),
+            ),
+        }
+
+        db = SessionLocal()
+        try:
+            ahora = datetime.utcnow()
+            for cola, (columna_id, columna_fecha, filtro) in colas.items():
+                total, mas_antiguo = db.query(
+                    func.count(columna_id), func.min(columna_fecha)
+                ).filter(filtro).one()
+                profundidad.add_metric([cola], total)
+                antiguedad.add_metric(
+                    [cola], (ahora - mas_antiguo).total_seconds() if mas_antiguo else 0
+                )
+        except Exception as e:
+            logger.warning(f"[Métricas] No se pudo leer la profundidad de las colas: {e}")
+            return
+        finally:
+            db.close()
+
+        yield profundidad
+        yield antiguedad
+
+
+colector_colas = ColectorColas()
+
+if not MULTIPROCESO:
+    REGISTRY.register(colector_colas)
+
+
+def _registro() -> CollectorRegistry:
+    if not MULTIPROCESO:
+        return REGISTRY
+    # Registro nuevo por scrape: agrega los archivos de todos los workers
+    registro = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registro)
+    registro.register(colector_colas)
+    return registro
+
+
+def respuesta_metricas() -> Response:
+    """Exposición en formato texto de Prometheus."""
+    return Response(generate_latest(_registro()), media_type=CONTENT_TYPE_LATEST)
+
+
+def cerrar():
+    """Marca el worker como terminado (los gauges livesum dejan de contarlo)."""
+    if MULTIPROCESO:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,86 @@
+"""
+Respuestas de archivos en disco con validación condicional y caché HTTP
+
+- ETag y Last-Modified; If-None-Match / If-Modified-Since responden 304
+- Range lo resuelve FileResponse (206 / 416)
+- FileResponse usa la extensión ASGI http.response.pathsend (zero-copy)
+  cuando el servidor la soporta; si no, envía el archivo por bloques
+- Archivos direccionados por contenido (el nombre es su hash) no cambian
+  nunca: se marcan immutable y el navegador no vuelve a pedirlos
+"""
+
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+# Privado: son archivos de usuarios autenticados, no deben quedar en caches compartidos
+CACHE_CONTROL_INMUTABLE_PRIVADO = "private, max-age=31536000, immutable"
+CACHE_CONTROL_PRIVADO = "private, max-age=3600"
+
+
+def _etag_coincide(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for etiqueta in if_none_match.split(","):
+        etiqueta = etiqueta.strip()
+        if etiqueta.startswith("W/"):
+            etiqueta = etiqueta[2:]
+        if etiqueta == etag:
+            return True
+    return False
+
+
+def _no_modificado(request: Request, etag: str, mtime: float) -> bool:
+    """RFC 9110: si viene If-None-Match, If-Modified-Since se ignora."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_coincide(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def respuesta_archivo(
+    request: Request,
+    ruta: Path,
+    media_type: str,
+    etag: Optional[str] = None,
+    inmutable: bool = False,
+    filename: Optional[str] = None,
+) -> Response:
+    """
+    Sirve un archivo local con soporte de Range, 304 y cache headers.
+
+    Args:
+        etag: ETag fuerte (ej: el SHA-256 del contenido); por defecto mtime-tamaño
+        inmutable: True para archivos direccionados por contenido
+        filename: Nombre sugerido (Content-Disposition inline)
+    """
+    stat = ruta.stat()
+    etag = f'"{etag or f"{int(stat.st_mtime):x}-{stat.st_size:x}"}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL_INMUTABLE_PRIVADO if inmutable else CACHE_CONTROL_PRIVADO,
+        "Accept-Ranges": "bytes",
+    }
+
+    if _no_modificado(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        ruta,
+        media_type=media_type,
+        headers=headers,
+        filename=filename,
+        content_disposition_type="inline",
+        stat_result=stat,
+    )
@@ -0,0 +1,138 @@
+"""
+Respuestas JSON precomputadas para datos de referencia que no cambian entre requests.
+
+El cuerpo se serializa y comprime una sola vez (gzip y, si está instalado, brotli)
+y se sirve con ETag fuerte y Cache-Control largo. Si el cliente envía
+If-None-Match con el ETag vigente se responde 304 sin cuerpo.
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Optional, Set
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se sirve gzip
+    brotli = None
+
+# Datos estáticos (departamentos, ciudades): 1 día en caché del navegador/CDN
+CACHE_CONTROL_ESTATICO = "public, max-age=86400"
+
+# Datos del catálogo: pueden cambiar con una importación, se revalidan con ETag
+CACHE_CONTROL_CATALOGO = "public, max-age=3600, stale-while-revalidate=86400"
+
+# Por debajo de este tamaño comprimir no compensa
+TAMANO_MINIMO_COMPRESION = 512
+
+# Nivel de brotli: 11 es el máximo (lento) y solo vale la pena en cuerpos pequeños
+_CALIDAD_BROTLI_MAXIMA = 11
+_CALIDAD_BROTLI_GRANDE = 6
+_TAMANO_BROTLI_GRANDE = 256 * 1024
+
+
+class CuerpoPrecomputado:
+    """
+    JSON serializado + variantes comprimidas + ETag (hash del contenido).
+
+    Cada codificación tiene su propio ETag fuerte ("<hash>", "<hash>-gzip",
+    "<hash>-br") porque los bytes son distintos.
+    """
+
+    __slots__ = ("identidad", "gzip", "br", "hash")
+
+    def __init__(self, datos: Any):
+        self.identidad = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.hash = hashlib.sha256(self.identidad).hexdigest()[:32]
+
+        self.gzip: Optional[bytes] = None
+        self.br: Optional[bytes] = None
+        if len(self.identidad) >= TAMANO_MINIMO_COMPRESION:
+            # mtime=0 para que los bytes (y el ETag) sean iguales en todos los workers
+            self.gzip = gzip.compress(self.identidad, compresslevel=9, mtime=0)
+            if brotli is not None:
+                calidad = (
+                    _CALIDAD_BROTLI_MAXIMA
+                    if len(self.identidad) < _TAMANO_BROTLI_GRANDE
+                    else _CALIDAD_BROTLI_GRANDE
+                )
+                self.br = brotli.compress(self.identidad, quality=calidad)
+
+    def etag(self, codificacion: Optional[str] = None) -> str:
+        return f'"{self.hash}-{codificacion}"' if codificacion else f'"{self.hash}"'
+
+
+def _codificaciones_aceptadas(accept_encoding: str) -> Set[str]:
+    """Codificaciones del header Accept-Encoding con q > 0."""
+    aceptadas = set()
+    for parte in accept_encoding.split(","):
+        partes = parte.strip().split(";")
+        nombre = partes[0].strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        for parametro in partes[1:]:
+            clave, _, valor = parametro.strip().partition("=")
+            if clave.strip() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            aceptadas.add(nombre)
+    return aceptadas
+
+
+def _etag_coincide(if_none_match: str, cuerpo: CuerpoPrecomputado) -> bool:
+    """
+    If-None-Match usa comparación débil: se ignora el prefijo W/ y el sufijo
+    de codificación, de modo que cualquier variante del mismo contenido coincide.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    for etiqueta in if_none_match.split(","):
+        etiqueta = etiqueta.strip()
+        if etiqueta.startswith("W/"):
+            etiqueta = etiqueta[2:]
+        etiqueta = etiqueta.strip('"')
+        if etiqueta.split("-", 1)[0] == cuerpo.hash:
+            return True
+    return False
+
+
+def respuesta_precomputada(
+    request: Request,
+    cuerpo: CuerpoPrecomputado,
+    cache_control: str = CACHE_CONTROL_ESTATICO,
+) -> Response:
+    """
+    Construye la respuesta HTTP para un cuerpo precomputado.
+
+    - 304 si el ETag coincide con If-None-Match
+    - br > gzip > identidad según Accept-Encoding
+    """
+    aceptadas = _codificaciones_aceptadas(request.headers.get("accept-encoding", ""))
+
+    codificacion = None
+    contenido = cuerpo.identidad
+    if cuerpo.br is not None and "br" in aceptadas:
+        codificacion, contenido = "br", cuerpo.br
+    elif cuerpo.gzip is not None and ("gzip" in aceptadas or "*" in aceptadas):
+        codificacion, contenido = "gzip", cuerpo.gzip
+
+    headers = {
+        "ETag": cuerpo.etag(codificacion),
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_coincide(if_none_match, cuerpo):
+        return Response(status_code=304, headers=headers)
+
+    if codificacion:
+        headers["Content-Encoding"] = codificacion
+
+    return Response(content=contenido, media_type="application/json", headers=headers)
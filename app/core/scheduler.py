@@ -0,0 +1,381 @@
+"""
+Scheduler embebido para tareas periódicas (reemplaza los loops por worker y el cron externo)
+
+Cada worker de uvicorn corre el mismo scheduler, pero cada ejecución
+programada se hace una sola vez en toda la flota:
+1. Jitter aleatorio antes de intentar (reparte la carga entre workers)
+2. pg_try_advisory_lock por job: solo un worker lo ejecuta a la vez
+   (si la ejecución anterior sigue corriendo, no se solapa)
+3. INSERT en job_ejecuciones con UNIQUE (job, programado_para): si otro
+   worker ya tomó esa ejecución, se omite
+4. Se registra estado, duración, resultado o error de cada ejecución
+
+Los jobs por intervalo se alinean a múltiplos del intervalo (epoch), así
+todos los workers calculan la misma hora programada.
+
+Los jobs con por_worker=True (estado local, ej. recargar el snapshot del
+catálogo) corren en cada worker: sin lock ni registro en job_ejecuciones.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from . import metricas, trazas
+from .config import settings
+from .cron import ExpresionCron
+from .database import engine, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Máximo tiempo dormido entre revisiones del loop
+_ESPERA_MAXIMA = 30.0
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+FuncionJob = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+class Job:
+    """Definición de un job programado (por expresión cron o por intervalo)."""
+
+    def __init__(
+        self,
+        nombre: str,
+        funcion: FuncionJob,
+        cron: Optional[str] = None,
+        cada_segundos: Optional[int] = None,
+        jitter_segundos: float = 0,
+        por_worker: bool = False,
+    ):
+        if bool(cron) == bool(cada_segundos):
+            raise ValueError(f"Job {nombre}: defina cron o cada_segundos (solo uno)")
+
+        self.nombre = nombre
+        self.funcion = funcion
+        self.cron = ExpresionCron(cron) if cron else None
+        self.cada_segundos = cada_segundos
+        self.jitter_segundos = jitter_segundos
+        self.por_worker = por_worker
+
+        self.siguiente: Optional[datetime] = None  # UTC naive
+        self.en_curso = False
+
+    @property
+    def programacion(self) -> str:
+        if self.cron:
+            return f"cron '{self.cron}' ({settings.SCHEDULER_ZONA_HORARIA})"
+        return f"cada {self.cada_segundos} s"
+
+    def calcular_siguiente(self, desde_utc: datetime) -> datetime:
+        """Siguiente ejecución programada (UTC naive) estrictamente posterior a desde_utc."""
+        if self.cron:
+            zona = ZoneInfo(settings.SCHEDULER_ZONA_HORARIA)
+            local = desde_utc.replace(tzinfo=timezone.utc).astimezone(zona).replace(tzinfo=None)
+            siguiente_local = self.cron.siguiente(local)
+            return (
+                siguiente_local.replace(tzinfo=zona)
+                .astimezone(timezone.utc)
+                .replace(tzinfo=None)
+            )
+
+        epoch = desde_utc.replace(tzinfo=timezone.utc).timestamp()
+        slot = (int(epoch) // self.cada_segundos + 1) * self.cada_segundos
+        return datetime.utcfromtimestamp(slot)
+
+
+class Scheduler:
+    """
+    Uso:
+        scheduler.agregar("limpieza", tarea_limpieza, cron="0 1 * * *")
+        scheduler.agregar("webhooks", procesar_eventos, cada_segundos=30, jitter_segundos=5)
+        await scheduler.iniciar()
+        ...
+        await scheduler.detener()
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self._tarea: Optional[asyncio.Task] = None
+        self._ejecuciones: set = set()
+
+    def agregar(
+        self,
+        nombre: str,
+        funcion: FuncionJob,
+        cron: Optional[str] = None,
+        cada_segundos: Optional[int] = None,
+        jitter_segundos: float = 0,
+        por_worker: bool = False,
+    ) -> Job:
+        job = Job(
+            nombre, funcion, cron=cron, cada_segundos=cada_segundos,
+            jitter_segundos=jitter_segundos, por_worker=por_worker,
+        )
+        self.jobs[nombre] = job
+        return job
+
+    async def iniciar(self):
+        if self._tarea is not None:
+            return
+        ahora = datetime.utcnow()
+        for job in self.jobs.values():
+            job.siguiente = job.calcular_siguiente(ahora)
+        self._tarea = asyncio.create_task(self._loop())
+        logger.info(
+            f"[Scheduler] Iniciado en {WORKER_ID} con {len(self.jobs)} jobs: "
+            + ", ".join(f"{j.nombre} ({j.programacion})" for j in self.jobs.values())
+        )
+
+    async def detener(self):
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        for tarea in list(self._ejecuciones):
+            tarea.cancel()
+        await asyncio.gather(self._tarea, *self._ejecuciones, return_exceptions=True)
+        self._tarea = None
+
+    async def _loop(self):
+        while True:
+            ahora = datetime.utcnow()
+            for job in self.jobs.values():
+                if job.siguiente and job.siguiente <= ahora:
+                    programado_para = job.siguiente
+                    job.siguiente = job.calcular_siguiente(max(ahora, programado_para))
+                    if job.en_curso:
+                        # Este worker aún ejecuta la anterior: no se solapa
+                        logger.warning(f"[Scheduler] {job.nombre}: ejecución anterior en curso, se omite")
+                        continue
+                    tarea = asyncio.create_task(self._ejecutar(job, programado_para))
+                    self._ejecuciones.add(tarea)
+                    tarea.add_done_callback(self._ejecuciones.discard)
+
+            proxima = min((j.siguiente for j in self.jobs.values() if j.siguiente), default=None)
+            espera = _ESPERA_MAXIMA
+            if proxima:
+                espera = min(_ESPERA_MAXIMA, max(0.5, (proxima - datetime.utcnow()).total_seconds()))
+            await asyncio.sleep(espera)
+
+    async def _ejecutar(self, job: Job, programado_para: datetime):
+        job.en_curso = True
+        conexion = None
+        ejecucion_id = None
+        try:
+            if job.jitter_segundos:
+                await asyncio.sleep(random.uniform(0, job.jitter_segundos))
+
+            if job.por_worker:
+                await self._ejecutar_local(job)
+                return
+
+            conexion = await asyncio.to_thread(_tomar_lock, job.nombre)
+            if conexion is None:
+                logger.debug(f"[Scheduler] {job.nombre}: otro worker lo está ejecutando")
+                return
+
+            ejecucion_id = await asyncio.to_thread(_registrar_inicio, job.nombre, programado_para)
+            if ejecucion_id is None:
+                logger.debug(f"[Scheduler] {job.nombre}: ejecución {programado_para} ya tomada")
+                return
+
+            inicio = time.monotonic()
+            try:
+                with trazas.tracer.start_as_current_span(f"job {job.nombre}"):
+                    if inspect.iscoroutinefunction(job.funcion):
+                        resultado = await job.funcion()
+                    else:
+                        resultado = await asyncio.to_thread(job.funcion)
+            except asyncio.CancelledError:
+                await asyncio.to_thread(
+                    _registrar_fin, ejecucion_id, "ERROR", inicio, None, "Cancelado (apagado del worker)"
+                )
+                raise
+            except Exception as e:
+                logger.error(f"[Scheduler] {job.nombre}: error: {e}", exc_info=True)
+                metricas.JOB_DURACION.labels(job.nombre, "ERROR").observe(time.monotonic() - inicio)
+                await asyncio.to_thread(_registrar_fin, ejecucion_id, "ERROR", inicio, None, str(e))
+            else:
+                metricas.JOB_DURACION.labels(job.nombre, "EXITOSO").observe(time.monotonic() - inicio)
+                await asyncio.to_thread(_registrar_fin, ejecucion_id, "EXITOSO", inicio, resultado, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[Scheduler] {job.nombre}: error del scheduler: {e}", exc_info=True)
+        finally:
+            if conexion is not None:
+                await asyncio.to_thread(_liberar_lock, conexion, job.nombre)
+            job.en_curso = False
+
+    async def _ejecutar_local(self, job: Job):
+        """Job por worker: solo métrica y log de errores (no se registra en la BD)."""
+        inicio = time.monotonic()
+        try:
+            if inspect.iscoroutinefunction(job.funcion):
+                await job.funcion()
+            else:
+                await asyncio.to_thread(job.funcion)
+        except Exception as e:
+            logger.error(f"[Scheduler] {job.nombre}: error: {e}", exc_info=True)
+            metricas.JOB_DURACION.labels(job.nombre, "ERROR").observe(time.monotonic() - inicio)
+        else:
+            metricas.JOB_DURACION.labels(job.nombre, "EXITOSO").observe(time.monotonic() - inicio)
+
+    def estado(self) -> List[dict]:
+        """Jobs registrados con su siguiente ejecución y última ejecución (de la BD)."""
+        db = SessionLocal()
+        try:
+            filas = db.execute(text("""
+                SELECT DISTINCT ON (job)
+                    job, programado_para, estado, worker, iniciado_en,
+                    finalizado_en, duracion_ms, resultado, error
+                FROM job_ejecuciones
+                ORDER BY job, programado_para DESC
+            """)).mappings().all()
+        finally:
+            db.close()
+
+        ultimas = {fila["job"]: dict(fila) for fila in filas}
+        estado = []
+        for job in self.jobs.values():
+            ultima = ultimas.get(job.nombre)
+            if ultima:
+                for campo in ("programado_para", "iniciado_en", "finalizado_en"):
+                    if ultima[campo]:
+                        ultima[campo] = ultima[campo].isoformat()
+                ultima.pop("job", None)
+            estado.append({
+                "job": job.nombre,
+                "programacion": job.programacion,
+                "siguiente_ejecucion": job.siguiente.isoformat() if job.siguiente else None,
+                "en_curso_en_este_worker": job.en_curso,
+                "ultima_ejecucion": ultima,
+            })
+        return estado
+
+
+def _clave_lock(nombre: str) -> str:
+    return f"scheduler:{nombre}"
+
+
+def _tomar_lock(nombre: str):
+    """
+    Intenta tomar el advisory lock del job en una conexión dedicada.
+    Retorna la conexión (que mantiene el lock) o None si otro worker lo tiene.
+    """
+    conexion = engine.connect()
+    try:
+        obtenido = conexion.execute(
+            text("SELECT pg_try_advisory_lock(hashtext(:clave))"),
+            {"clave": _clave_lock(nombre)}
+        ).scalar()
+        conexion.commit()
+    except Exception:
+        conexion.close()
+        raise
+
+    if not obtenido:
+        conexion.close()
+        return None
+    return conexion
+
+
+def _liberar_lock(conexion, nombre: str):
+    try:
+        conexion.execute(
+            text("SELECT pg_advisory_unlock(hashtext(:clave))"),
+            {"clave": _clave_lock(nombre)}
+        )
+        conexion.commit()
+    except Exception as e:
+        logger.warning(f"[Scheduler] No se pudo liberar el lock de {nombre}: {e}")
+    finally:
+        # Cerrar la conexión también libera los locks de sesión
+        conexion.close()
+
+
+def _registrar_inicio(nombre: str, programado_para: datetime) -> Optional[int]:
+    """Reserva la ejecución programada; None si otro worker ya la tomó."""
+    from ..models.job_ejecucion import JobEjecucion
+
+    db = SessionLocal()
+    try:
+        ejecucion_id = db.execute(
+            insert(JobEjecucion)
+            .values(
+                job=nombre,
+                programado_para=programado_para,
+                estado="EJECUTANDO",
+                worker=WORKER_ID,
+                iniciado_en=datetime.utcnow(),
+            )
+            .on_conflict_do_nothing(constraint="uq_job_ejecuciones_job_programado")
+            .returning(JobEjecucion.id)
+        ).scalar()
+        db.commit()
+        return ejecucion_id
+    finally:
+        db.close()
+
+
+def _serializable(resultado: Any) -> Any:
+    """El resultado se guarda como JSON; lo que no se pueda serializar va como texto."""
+    if resultado is None:
+        return None
+    try:
+        return json.loads(json.dumps(resultado, default=str))
+    except (TypeError, ValueError):
+        return {"valor": str(resultado)[:2000]}
+
+
+def _registrar_fin(
+    ejecucion_id: int,
+    estado: str,
+    inicio: float,
+    resultado: Any,
+    error: Optional[str],
+):
+    from ..models.job_ejecucion import JobEjecucion
+
+    db = SessionLocal()
+    try:
+        db.query(JobEjecucion).filter(JobEjecucion.id == ejecucion_id).update({
+            JobEjecucion.estado: estado,
+            JobEjecucion.finalizado_en: datetime.utcnow(),
+            JobEjecucion.duracion_ms: int((time.monotonic() - inicio) * 1000),
+            JobEjecucion.resultado: _serializable(resultado),
+            JobEjecucion.error: error[:4000] if error else None,
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def limpiar_historial(dias: int = 30) -> int:
+    """Elimina ejecuciones más antiguas que `dias` (el historial de jobs frecuentes crece rápido)."""
+    from ..models.job_ejecucion import JobEjecucion
+
+    db = SessionLocal()
+    try:
+        eliminados = db.query(JobEjecucion).filter(
+            JobEjecucion.programado_para < datetime.utcnow() - timedelta(days=dias)
+        ).delete(synchronize_session=False)
+        db.commit()
+        return eliminados
+    finally:
+        db.close()
+
+
+# Instancia global (una por proceso)
+scheduler = Scheduler()
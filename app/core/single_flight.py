@@ -0,0 +1,93 @@
+"""
+Caché con coalescencia de llamadas concurrentes (single-flight) para asyncio.
+
+Si varias corrutinas piden la misma clave mientras la carga está en curso,
+todas esperan el mismo resultado en lugar de lanzar una llamada cada una.
+El resultado se guarda con un TTL que puede depender del valor obtenido.
+
+Es por proceso: con varios workers cada uno mantiene su propia caché.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, Union
+
+Ttl = Union[float, Callable[[Any], float]]
+
+
+def _consumir_excepcion(tarea: asyncio.Task):
+    """Evita el aviso "exception was never retrieved" si todos los llamadores se cancelaron."""
+    if not tarea.cancelled():
+        tarea.exception()
+
+
+class SingleFlightCache:
+    """
+    Uso:
+        cache = SingleFlightCache()
+        valor = await cache.obtener(clave, lambda: consultar_api(clave), ttl=5)
+    """
+
+    def __init__(self, max_entradas: int = 10000):
+        self.max_entradas = max_entradas
+        self._valores: Dict[Hashable, Tuple[float, Any]] = {}
+        self._en_vuelo: Dict[Hashable, asyncio.Task] = {}
+
+    async def obtener(
+        self,
+        clave: Hashable,
+        cargar: Callable[[], Awaitable[Any]],
+        ttl: Ttl,
+    ) -> Any:
+        """
+        Retorna el valor cacheado, se une a la carga en curso o carga uno nuevo.
+
+        Args:
+            clave: Clave de la caché
+            cargar: Corrutina que obtiene el valor (solo se llama si hace falta)
+            ttl: Segundos de vigencia, o función valor -> segundos
+        """
+        cacheado = self._valores.get(clave)
+        if cacheado is not None and cacheado[0] > time.monotonic():
+            return cacheado[1]
+
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            # La carga corre en su propia tarea: no depende de ningún llamador
+            tarea = asyncio.create_task(self._cargar(clave, cargar, ttl))
+            tarea.add_done_callback(_consumir_excepcion)
+            self._en_vuelo[clave] = tarea
+
+        # shield: si un llamador se cancela (ej. cliente desconectado), incluido
+        # el que inició la carga, la carga sigue para los demás
+        return await asyncio.shield(tarea)
+
+    async def _cargar(self, clave: Hashable, cargar: Callable[[], Awaitable[Any]], ttl: Ttl) -> Any:
+        try:
+            valor = await cargar()
+            segundos = ttl(valor) if callable(ttl) else ttl
+            if segundos > 0:
+                self._guardar(clave, valor, segundos)
+            return valor
+        finally:
+            self._en_vuelo.pop(clave, None)
+
+    def _guardar(self, clave: Hashable, valor: Any, segundos: float):
+        self._valores.pop(clave, None)  # reinsertar para mantener el orden por antigüedad
+        if len(self._valores) >= self.max_entradas:
+            self._purgar()
+        self._valores[clave] = (time.monotonic() + segundos, valor)
+
+    def _purgar(self):
+        """Elimina vencidos; si no alcanza, los más antiguos (orden de inserción)."""
+        ahora = time.monotonic()
+        for clave in [c for c, (expira, _) in self._valores.items() if expira <= ahora]:
+            del self._valores[clave]
+        while len(self._valores) >= self.max_entradas:
+            del self._valores[next(iter(self._valores))]
+
+    def invalidar(self, clave: Hashable):
+        self._valores.pop(clave, None)
+
+    def __len__(self) -> int:
+        return len(self._valores)
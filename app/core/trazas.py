@@ -0,0 +1,201 @@
+"""
+Trazas distribuidas (OpenTelemetry)
+
+Por defecto no se exporta nada: sin TracerProvider configurado la API de
+OpenTelemetry es no-op y los spans no cuestan nada. Para analizar un flujo
+(ej: de dónde salen los 60 s de POST /casos/{id}/generar):
+
+    TRACING_EXPORTER=console   # spans al stdout
+    TRACING_EXPORTER=file      # un span JSON por línea en TRACING_ARCHIVO
+
+Spans:
+- Cada request HTTP (nombre = método + plantilla de ruta); respeta el header
+  traceparent entrante. FastAPI >= 0.143 ya los emite (además de dependencias,
+  endpoint y background tasks) apenas hay un TracerProvider; en versiones
+  anteriores se agrega MiddlewareTrazas
+- Cada statement SQL, solo dentro de un span activo (no crea trazas sueltas)
+- Llamadas al LLM (llm_service), generar_pdf, Vita y LiveKit
+- Trabajo en background: propagar() lleva el contexto de la request a la tarea
+"""
+import functools
+import importlib.util
+import inspect
+import logging
+import os
+from contextlib import contextmanager
+
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("abogadai")
+
+# FastAPI con telemetría nativa (spans de request propios)
+FASTAPI_NATIVO = importlib.util.find_spec("fastapi.telemetry") is not None
+
+# Largo máximo del SQL guardado en el span
+MAX_LARGO_SQL = 2000
+
+_proveedor = None
+
+
+def configurar():
+    """Instala el exportador según TRACING_EXPORTER (none | console | file)."""
+    global _proveedor
+    exportador = settings.TRACING_EXPORTER.lower()
+    if exportador == "none" or _proveedor is not None:
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if exportador == "console":
+        salida = ConsoleSpanExporter()
+    elif exportador == "file":
+        archivo = open(settings.TRACING_ARCHIVO, "a", encoding="utf-8")
+        salida = ConsoleSpanExporter(
+            out=archivo,
+            formatter=lambda span: span.to_json(indent=None) + os.linesep,
+        )
+    else:
+        raise RuntimeError(f"TRACING_EXPORTER no soportado: {settings.TRACING_EXPORTER}")
+
+    _proveedor = TracerProvider(resource=Resource.create({"service.name": settings.TRACING_SERVICIO}))
+    _proveedor.add_span_processor(BatchSpanProcessor(salida))
+    trace.set_tracer_provider(_proveedor)
+    logger.info(f"[Trazas] Exportando spans ({exportador})")
+
+
+def cerrar():
+    """Envía los spans pendientes (shutdown de la aplicación)."""
+    if _proveedor is not None:
+        _proveedor.shutdown()
+
+
+@contextmanager
+def span_cliente(nombre: str, **atributos):
+    """Span de una llamada saliente (Vita, LiveKit, LLM)."""
+    with tracer.start_as_current_span(nombre, kind=SpanKind.CLIENT, attributes=atributos) as span:
+        yield span
+
+
+def propagar(funcion, nombre: str = None):
+    """
+    Envuelve una tarea en background para que corra en la traza que la creó.
+
+    El contexto se captura al llamar a propagar() (dentro de la request) y la
+    tarea abre su propio span hijo, aunque el span de la request ya terminó.
+
+    Uso:
+        background_tasks.add_task(trazas.propagar(_generar_documento_bg), caso_id, tipo_doc)
+    """
+    contexto = otel_context.get_current()
+    nombre = nombre or funcion.__name__
+
+    if inspect.iscoroutinefunction(funcion):
+        @functools.wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            with tracer.start_as_current_span(nombre, context=contexto):
+                return await funcion(*args, **kwargs)
+    else:
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with tracer.start_as_current_span(nombre, context=contexto):
+                return funcion(*args, **kwargs)
+    return envoltura
+
+
+class MiddlewareTrazas:
+    """
+    Middleware ASGI: un span SERVER por request (solo sin FASTAPI_NATIVO).
+
+    Como en MiddlewareMetricas, el span termina con el último bloque de la
+    respuesta (las BackgroundTasks se trazan aparte con propagar()).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cabeceras = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        span = tracer.start_span(
+            scope["method"],
+            context=propagate.extract(cabeceras),
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": scope["method"], "url.path": scope["path"]},
+        )
+        if not span.is_recording():
+            await self.app(scope, receive, send)
+            return
+
+        def finalizar():
+            if not span.is_recording():
+                return
+            ruta = getattr(scope.get("route"), "path", None)
+            if ruta:
+                span.update_name(f"{scope['method']} {ruta}")
+                span.set_attribute("http.route", ruta)
+            span.end()
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                span.set_attribute("http.response.status_code", mensaje["status"])
+                if mensaje["status"] >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
+            await send(mensaje)
+            if mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                finalizar()
+
+        token = otel_context.attach(trace.set_span_in_context(span))
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception as e:
+            span.record_exception(e)
+            span.set_status(Status(StatusCode.ERROR, type(e).__name__))
+            raise
+        finally:
+            finalizar()
+            otel_context.detach(token)
+
+
+def instrumentar_engine(engine):
+    """Un span por statement SQL (solo si hay un span activo)."""
+
+    def antes(conn, cursor, statement, parameters, contexto, executemany):
+        if not trace.get_current_span().is_recording():
+            return
+        operacion = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        contexto._span_otel = tracer.start_span(
+            operacion,
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": engine.dialect.name,
+                "db.statement": statement[:MAX_LARGO_SQL],
+            },
+        )
+
+    def despues(conn, cursor, statement, parameters, contexto, executemany):
+        span = getattr(contexto, "_span_otel", None)
+        if span is not None:
+            span.end()
+
+    def error(contexto_excepcion):
+        span = getattr(contexto_excepcion.execution_context, "_span_otel", None)
+        if span is not None:
+            span.record_exception(contexto_excepcion.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
+
+    event.listen(engine, "before_cursor_execute", antes)
+    event.listen(engine, "after_cursor_execute", despues)
+    event.listen(engine, "handle_error", error)
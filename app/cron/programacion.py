@@ -0,0 +1,110 @@
+"""
+Registro de jobs del scheduler embebido (app.core.scheduler)
+
+Reemplaza los loops asyncio por worker y el cron externo:
+- livekit_cleanup: cierra rooms LiveKit inactivos (cada 10 min)
+- webhooks: aplica eventos de webhook pendientes (cada 30 s)
+- email_outbox: envía emails encolados o con reintento vencido (cada 30 s)
+- reconciliacion_pagos: reconcilia pagos pendientes con Vita
+- medianoche / limpieza: tareas diarias (hora de SCHEDULER_ZONA_HORARIA)
+- historial_scheduler: purga ejecuciones antiguas de job_ejecuciones
+- purga_email_outbox: purga emails ya enviados o fallidos (DIAS_RETENCION)
+- recarga_catalogo: por worker, recarga el snapshot del catálogo si hay nueva versión
+
+Las tareas diarias siguen disponibles por CLI (python -m app.cron.tareas_diarias).
+"""
+
+import asyncio
+import logging
+
+from ..core.config import settings
+from ..core.scheduler import scheduler, limpiar_historial
+
+logger = logging.getLogger(__name__)
+
+
+def _exigir_exito(resultados: dict) -> dict:
+    """Las tareas diarias capturan sus errores; aquí se propagan para que queden como ERROR."""
+    if not resultados.get("exito"):
+        raise RuntimeError("; ".join(resultados.get("errores") or ["Tarea sin éxito"]))
+    return resultados
+
+
+async def _cerrar_rooms_inactivos() -> dict:
+    from ..services.livekit_service import cerrar_rooms_inactivos
+    cerrados = await cerrar_rooms_inactivos()
+    if cerrados:
+        logger.info(f"[LiveKit cleanup] {cerrados} rooms inactivos cerrados")
+    return {"rooms_cerrados": cerrados}
+
+
+async def _procesar_webhooks() -> dict:
+    from ..services.webhook_service import procesar_eventos_pendientes
+    procesados = await asyncio.to_thread(procesar_eventos_pendientes)
+    if procesados:
+        logger.info(f"[Webhooks] {procesados} eventos aplicados")
+    return {"eventos_procesados": procesados}
+
+
+async def _enviar_emails() -> dict:
+    from ..services.email_outbox_service import procesar_outbox
+    return {"emails_enviados": await procesar_outbox()}
+
+
+async def _reconciliar_pagos() -> dict:
+    from ..services.reconciliacion_service import reconciliar_pagos_pendientes
+    return await reconciliar_pagos_pendientes()
+
+
+def _tarea_medianoche() -> dict:
+    from .tareas_diarias import tarea_medianoche
+    return _exigir_exito(tarea_medianoche())
+
+
+def _tarea_limpieza() -> dict:
+    from .tareas_diarias import tarea_limpieza
+    return _exigir_exito(tarea_limpieza())
+
+
+def _limpiar_historial_scheduler() -> dict:
+    return {"ejecuciones_eliminadas": limpiar_historial(dias=30)}
+
+
+def _purgar_email_outbox() -> dict:
+    from ..services.email_outbox_service import purgar_terminados
+    return {"emails_eliminados": purgar_terminados()}
+
+
+def _recargar_catalogo():
+    from ..services.catalogo_service import recargar_catalogo
+    recargar_catalogo()
+
+
+def registrar_jobs_locales():
+    """Jobs de estado en memoria: corren en cada worker aunque SCHEDULER_ENABLED=false."""
+    scheduler.agregar(
+        "recarga_catalogo",
+        _recargar_catalogo,
+        cada_segundos=settings.CATALOGO_RECARGA_SEGUNDOS,
+        jitter_segundos=5,
+        por_worker=True,
+    )
+
+
+def registrar_jobs():
+    """Registra todos los jobs en el scheduler global (idempotente)."""
+    registrar_jobs_locales()
+    scheduler.agregar("livekit_cleanup", _cerrar_rooms_inactivos, cada_segundos=600, jitter_segundos=20)
+    scheduler.agregar("webhooks", _procesar_webhooks, cada_segundos=30, jitter_segundos=3)
+    scheduler.agregar("email_outbox", _enviar_emails, cada_segundos=30, jitter_segundos=3)
+    from ..services.reconciliacion_service import JOB_RECONCILIACION
+    scheduler.agregar(
+        JOB_RECONCILIACION,
+        _reconciliar_pagos,
+        cada_segundos=settings.RECONCILIACION_INTERVALO_SEGUNDOS,
+        jitter_segundos=10,
+    )
+    scheduler.agregar("medianoche", _tarea_medianoche, cron="0 0 * * *", jitter_segundos=10)
+    scheduler.agregar("limpieza", _tarea_limpieza, cron="0 1 * * *", jitter_segundos=10)
+    scheduler.agregar("historial_scheduler", _limpiar_historial_scheduler, cron="30 3 * * *", jitter_segundos=10)
+    scheduler.agregar("purga_email_outbox", _purgar_email_outbox, cron="45 3 * * *", jitter_segundos=10)
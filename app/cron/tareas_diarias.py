@@ -5,6 +5,10 @@ Este módulo contiene las tareas que deben ejecutarse periódicamente:
 - tarea_medianoche: Ejecutar a las 00:00 todos los días
 - tarea_limpieza: Ejecutar a las 01:00 todos los días
 
+En producción las ejecuta el scheduler embebido (app/cron/programacion.py),
+una sola vez por horario aunque haya varios workers. El CLI queda para
+ejecuciones manuales.
+
 Uso:
     python -m app.cron.tareas_diarias medianoche
     python -m app.cron.tareas_diarias limpieza
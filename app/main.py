@@ -1,20 +1,22 @@
-import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, status
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.exceptions import RequestValidationError
+from sqlalchemy.orm import Session
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from app.core import metricas, trazas
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, get_db
 from app.routes import auth, livekit, casos, referencias, sesiones, mensajes, perfil, migrations, usuarios, admin, webhooks
 # Importar modelos que no están en ninguna ruta para que create_all los registre
 from app.models.audit_log import AuditLog  # noqa: F401
+from app.models.caso import Caso
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -23,29 +25,55 @@ logger = logging.getLogger(__name__)
 # Crear tablas en la base de datos (incluye audit_logs)
 Base.metadata.create_all(bind=engine)
 
+# Métricas del pool de conexiones (GET /metrics)
+metricas.instrumentar_pool(engine)
 
-async def _tarea_cerrar_rooms_inactivos():
-    """Tarea periódica: cierra rooms LiveKit que llevan >30 min activos."""
-    # Espera inicial para que el servidor termine de arrancar
-    await asyncio.sleep(60)
-    while True:
-        try:
-            from app.services.livekit_service import cerrar_rooms_inactivos
-            cerrados = await cerrar_rooms_inactivos()
-            if cerrados:
-                logger.info(f"[LiveKit cleanup] {cerrados} rooms inactivos cerrados")
-        except Exception as e:
-            logger.error(f"[LiveKit cleanup] Error: {e}")
-        await asyncio.sleep(600)  # cada 10 minutos
+# Trazas (no-op salvo TRACING_EXPORTER=console|file): spans de requests y SQL
+trazas.configurar()
+trazas.instrumentar_engine(engine)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: lanzar tarea background de limpieza de rooms
-    asyncio.create_task(_tarea_cerrar_rooms_inactivos())
-    logger.info("[Lifespan] Tarea de limpieza de rooms LiveKit iniciada (cada 10 min)")
+    # Startup: sembrar el catálogo si la BD está vacía y cargar el snapshot
+    try:
+        from app.core.database import SessionLocal
+        from app.services import catalogo_service
+        db = SessionLocal()
+        try:
+            version = catalogo_service.sembrar_catalogo_inicial(db)
+            if version:
+                logger.info(f"[Lifespan] Catálogo inicial sembrado (v{version})")
+        finally:
+            db.close()
+        catalogo_service.recargar_catalogo()
+    except Exception as e:
+        logger.error(f"[Lifespan] Error preparando catálogo: {e}")
+
+    # Startup: cliente HTTP compartido para Vita Wallet (pool + keep-alive)
+    from app.services.vitawallet_service import vitawallet_service
+    await vitawallet_service.iniciar()
+
+    # Startup: scheduler embebido (limpieza LiveKit, webhooks, reconciliación, tareas diarias)
+    # La recarga del catálogo es por worker y corre siempre
+    from app.core.scheduler import scheduler
+    from app.cron.programacion import registrar_jobs, registrar_jobs_locales
+    if settings.SCHEDULER_ENABLED:
+        registrar_jobs()
+    else:
+        registrar_jobs_locales()
+        logger.info("[Lifespan] Scheduler deshabilitado (SCHEDULER_ENABLED=false): solo jobs por worker")
+    await scheduler.iniciar()
     yield
-    # Shutdown: no hay limpieza especial necesaria
+    # Shutdown: detener el scheduler (libera los locks de los jobs en curso)
+    await scheduler.detener()
+    # Shutdown: cerrar conexiones abiertas con Vita, LiveKit y SMTP
+    await vitawallet_service.cerrar()
+    from app.services import livekit_service, email_outbox_service
+    await livekit_service.cerrar()
+    await email_outbox_service.cerrar()
+    metricas.cerrar()
+    trazas.cerrar()
 
 
 app = FastAPI(
@@ -77,6 +105,15 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Comprimir respuestas JSON grandes (casos, listados); las respuestas que ya
+# traen Content-Encoding (referencias precomputadas) pasan sin recomprimir
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Latencia por ruta y requests en curso (agregado al final: envuelve a los demás)
+app.add_middleware(metricas.MiddlewareMetricas)
+if not trazas.FASTAPI_NATIVO:
+    app.add_middleware(trazas.MiddlewareTrazas)
+
 # Manejador global de excepciones para asegurar headers CORS en errores
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
@@ -133,14 +170,24 @@ app.include_router(usuarios.router)  # NUEVO - Endpoints de niveles y beneficios
 app.include_router(admin.router)  # NUEVO - Endpoints de administración
 app.include_router(webhooks.router)  # Vita Wallet - Webhooks de pago
 
-# Configurar carpeta de archivos estáticos para evidencias de reembolso
-uploads_dir = "uploads"
-if not os.path.exists(uploads_dir):
-    os.makedirs(uploads_dir)
-    logger.info(f"📁 Carpeta de uploads creada: {uploads_dir}")
+# Almacenamiento privado de evidencias (no se monta como estático)
+almacenamiento_dir = settings.ALMACENAMIENTO_DIR
+if not os.path.exists(almacenamiento_dir):
+    os.makedirs(almacenamiento_dir)
+    logger.info(f"📁 Carpeta de almacenamiento creada: {almacenamiento_dir}")
 
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
-logger.info(f"📁 Archivos estáticos montados en /uploads desde {os.path.abspath(uploads_dir)}")
+
+@app.get("/uploads/{ruta:path}", include_in_schema=False)
+def evidencia_legado(ruta: str, db: Session = Depends(get_db)):
+    """
+    Compatibilidad con evidencia_url guardadas: ya no sirve archivos, redirige
+    al endpoint autenticado GET /casos/{id}/evidencia (Range, 304, previews).
+    """
+    # Con almacenamiento por contenido varios casos pueden compartir la misma URL
+    fila = db.query(Caso.id).filter(Caso.evidencia_rechazo_url == f"/uploads/{ruta}").first()
+    if fila is None:
+        raise StarletteHTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return RedirectResponse(f"/casos/{fila.id}/evidencia", status_code=status.HTTP_307_TEMPORARY_REDIRECT)
 
 
 @app.get("/")
@@ -155,3 +202,11 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    """Métricas Prometheus. Con METRICS_TOKEN definido exige 'Authorization: Bearer <token>'."""
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise StarletteHTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No autorizado")
+    return metricas.respuesta_metricas()
@@ -3,6 +3,11 @@ from .caso import Caso, TipoDocumento, EstadoCaso
 from .mensaje import Mensaje
 from .sesion_diaria import SesionDiaria
 from .pago import Pago, EstadoPago, MetodoPago
+from .catalogo import EntidadPublica, DerechoFundamental, CatalogoVersion
+from .webhook_event import WebhookEvent, EstadoWebhookEvent
+from .job_ejecucion import JobEjecucion
+from .email_outbox import EmailOutbox, EstadoEmail
+from .llm_uso import LlmUso
 
 __all__ = [
     "User",
@@ -10,8 +15,17 @@ __all__ = [
     "Mensaje",
     "SesionDiaria",
     "Pago",
+    "EntidadPublica",
+    "DerechoFundamental",
+    "CatalogoVersion",
+    "WebhookEvent",
+    "JobEjecucion",
+    "EmailOutbox",
+    "LlmUso",
     "TipoDocumento",
     "EstadoCaso",
     "EstadoPago",
-    "MetodoPago"
+    "MetodoPago",
+    "EstadoWebhookEvent",
+    "EstadoEmail"
 ]
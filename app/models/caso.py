@@ -67,6 +67,7 @@ class Caso(Base):
     documento_desbloqueado = Column(Boolean, default=False, nullable=False)
     fecha_pago = Column(DateTime, nullable=True)
     fecha_vencimiento = Column(DateTime, nullable=True)  # 14 días después de generación
+    reintentar_generacion_en = Column(DateTime, nullable=True)  # Con ERROR_GENERACION por LLM no disponible
 
     # Sistema de reembolsos
     reembolso_solicitado = Column(Boolean, default=False, nullable=False)
@@ -0,0 +1,59 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, UniqueConstraint
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class EntidadPublica(Base):
+    """
+    Catálogo de entidades públicas (EPS, ministerios, alcaldías, etc.)
+    Se carga masivamente desde CSV/JSON y se sirve desde un snapshot en memoria
+    """
+    __tablename__ = "entidades_publicas"
+    __table_args__ = (
+        UniqueConstraint("nombre", "tipo", name="uq_entidades_publicas_nombre_tipo"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    nombre = Column(String(300), nullable=False)
+    tipo = Column(String(50), nullable=False, index=True)  # EPS, MINISTERIOS, SUPERINTENDENCIAS, etc.
+
+    # Datos para autollenado del caso
+    direccion = Column(Text, nullable=True)
+    ciudad = Column(String(100), nullable=True)
+    nit = Column(String(20), nullable=True, index=True)
+
+    activo = Column(Boolean, default=True, nullable=False)  # False = retirada en la última importación
+
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DerechoFundamental(Base):
+    """
+    Catálogo de derechos fundamentales de la Constitución Política
+    """
+    __tablename__ = "derechos_fundamentales"
+
+    id = Column(Integer, primary_key=True, index=True)
+    articulo = Column(String(10), nullable=False, unique=True)
+    derecho = Column(String(200), nullable=False)
+    descripcion = Column(Text, nullable=False)
+    nota = Column(String(200), nullable=True)  # "Por conexidad", "Fundamental - Menores", etc.
+    orden = Column(Integer, default=0, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CatalogoVersion(Base):
+    """
+    Registro de versiones del catálogo (una fila por cada importación)
+    Los workers comparan la última versión para recargar su snapshot en memoria
+    """
+    __tablename__ = "catalogo_versiones"
+
+    id = Column(Integer, primary_key=True, index=True)  # La versión es el id
+    descripcion = Column(String(300), nullable=True)
+    registros = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
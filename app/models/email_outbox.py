@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum as SQLEnum
+from datetime import datetime
+import enum
+
+from ..core.database import Base
+
+
+class EstadoEmail(str, enum.Enum):
+    PENDIENTE = "PENDIENTE"    # En cola, falta enviarlo
+    ENVIADO = "ENVIADO"        # Aceptado por el servidor SMTP (o por el sumidero de debug)
+    ERROR = "ERROR"            # Falló, se reintenta con backoff
+    FALLIDO = "FALLIDO"        # Agotó los reintentos
+
+
+class EmailOutbox(Base):
+    """
+    Cola de emails transaccionales (outbox)
+
+    Las rutas solo insertan aquí (en la misma transacción que el token que
+    va en el email); el envío SMTP lo hace email_outbox_service en background.
+    """
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String(50), nullable=False)  # verificacion | reset_contrasena | ...
+    destinatario = Column(String(255), nullable=False)
+    asunto = Column(String(255), nullable=False)
+    html = Column(Text, nullable=False)
+    texto = Column(Text, nullable=True)  # Alternativa text/plain
+
+    # Envío
+    estado = Column(SQLEnum(EstadoEmail), nullable=False, default=EstadoEmail.PENDIENTE, index=True)
+    intentos = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    siguiente_intento_en = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    # Fechas
+    creado_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+    enviado_en = Column(DateTime, nullable=True)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, UniqueConstraint
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class JobEjecucion(Base):
+    """
+    Historial de ejecuciones del scheduler embebido
+
+    La restricción única (job, programado_para) asegura que cada ejecución
+    programada corra una sola vez aunque haya varios workers.
+    """
+    __tablename__ = "job_ejecuciones"
+    __table_args__ = (
+        UniqueConstraint("job", "programado_para", name="uq_job_ejecuciones_job_programado"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job = Column(String(100), nullable=False, index=True)
+    programado_para = Column(DateTime, nullable=False)  # UTC
+
+    estado = Column(String(20), nullable=False, default="EJECUTANDO")  # EJECUTANDO | EXITOSO | ERROR
+    worker = Column(String(100), nullable=True)  # host:pid que la ejecutó
+    iniciado_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finalizado_en = Column(DateTime, nullable=True)
+    duracion_ms = Column(Integer, nullable=True)
+    resultado = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
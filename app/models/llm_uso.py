@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, Boolean
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class LlmUso(Base):
+    """
+    Registro de cada llamada al LLM: tokens, costo y a qué caso/usuario se atribuye
+
+    Lo escribe llm_service.completar(). Si el caso se elimina, el registro se
+    conserva (caso_id queda en NULL) para no perder el costo histórico.
+    """
+    __tablename__ = "llm_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    caso_id = Column(Integer, ForeignKey("casos.id", ondelete="SET NULL"), nullable=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    funcion = Column(String(60), nullable=False, index=True)  # generar_tutela, extraer_datos_conversacion, ...
+    modelo = Column(String(60), nullable=False)
+
+    tokens_prompt = Column(Integer, default=0, nullable=False)
+    tokens_prompt_cache = Column(Integer, default=0, nullable=False)  # Parte del prompt servida desde caché
+    tokens_completion = Column(Integer, default=0, nullable=False)
+    costo_usd = Column(Numeric(12, 6), default=0, nullable=False)
+
+    duracion_ms = Column(Integer, nullable=True)
+    exito = Column(Boolean, default=True, nullable=False)
+    error = Column(String(100), nullable=True)  # Tipo de excepción si falló
+
+    creado_en = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
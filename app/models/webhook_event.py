@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum as SQLEnum, UniqueConstraint
+from datetime import datetime
+import enum
+
+from ..core.database import Base
+
+
+class EstadoWebhookEvent(str, enum.Enum):
+    PENDIENTE = "PENDIENTE"    # Recibido, falta aplicarlo
+    PROCESADO = "PROCESADO"    # Aplicado (pago actualizado)
+    IGNORADO = "IGNORADO"      # No requiere acción (pago no encontrado, estado no procesable, etc.)
+    ERROR = "ERROR"            # Falló al aplicarse, se reintenta con backoff
+
+
+class WebhookEvent(Base):
+    """
+    Registro de eventos de webhook recibidos (ledger de idempotencia)
+
+    La restricción única (proveedor, event_id) garantiza que un mismo evento
+    entregado varias veces se registre y se aplique una sola vez.
+    """
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        UniqueConstraint("proveedor", "event_id", name="uq_webhook_events_proveedor_event_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    proveedor = Column(String(30), nullable=False)  # "vita"
+    event_id = Column(String(200), nullable=False)  # ID del evento en el proveedor
+    event_type = Column(String(100), nullable=True)
+    payload = Column(JSON, nullable=False)
+
+    # Procesamiento
+    estado = Column(SQLEnum(EstadoWebhookEvent), nullable=False, default=EstadoWebhookEvent.PENDIENTE, index=True)
+    intentos = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    resultado = Column(String(200), nullable=True)  # Resumen de lo que se hizo
+    pago_id = Column(Integer, nullable=True, index=True)
+    siguiente_intento_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Fechas
+    recibido_en = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    procesado_en = Column(DateTime, nullable=True)
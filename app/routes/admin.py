@@ -3,21 +3,26 @@ Endpoints de Administración - Reembolsos y Métricas
 Solo accesible para usuarios administradores
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, func
 
 from ..core.database import get_db
 from ..models.user import User
-from ..models import Caso, Pago, EstadoCaso
+from ..models import Caso, Pago, EstadoCaso, EstadoPago, MetodoPago
 from ..models.audit_log import AuditLog
 from .auth import get_current_user
-from ..services import pago_service, nivel_service
+from ..services import pago_service, nivel_service, catalogo_service, reconciliacion_service, llm_service, llm_uso_service
 from ..services.audit_service import (
     registrar_auditoria,
     ACCION_APROBAR_REEMBOLSO,
     ACCION_RECHAZAR_REEMBOLSO,
     ACCION_PROCESAR_REEMBOLSO,
+    ACCION_IMPORTAR_CATALOGO,
 )
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -72,7 +77,10 @@ async def listar_reembolsos_pendientes(
                 "solicitud_reembolso": {
                     "fecha_solicitud": caso.fecha_solicitud_reembolso,
                     "motivo": caso.motivo_rechazo,
-                    "evidencia_url": caso.evidencia_rechazo_url
+                    "evidencia_url": caso.evidencia_rechazo_url,
+                    # Endpoint autenticado con caché; preview = imagen reducida
+                    "evidencia_descarga_url": f"/casos/{caso.id}/evidencia" if caso.evidencia_rechazo_url else None,
+                    "evidencia_preview_url": f"/casos/{caso.id}/evidencia?preview=true" if caso.evidencia_rechazo_url else None
                 },
                 "caso": {
                     "tipo_documento": caso.tipo_documento.value,
@@ -213,6 +221,47 @@ async def obtener_metricas_niveles(
         )
 
 
+@router.get("/metricas/llm")
+async def obtener_metricas_llm(
+    agrupar_por: str = Query("funcion", pattern="^(funcion|modelo|usuario|caso|dia)$"),
+    dias: int = Query(30, ge=1, le=365),
+    user_id: Optional[int] = None,
+    caso_id: Optional[int] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    🤖 Consumo del LLM: tokens y costo (USD)
+
+    Solo admin - Agregados de llm_usage por función, modelo, usuario, caso o día
+    en los últimos `dias`, costo unitario por documento, estado del circuito y
+    de la concurrencia del proveedor (este worker) y, si se filtra por usuario,
+    su consumo frente al presupuesto de su nivel.
+    """
+    desde = datetime.utcnow() - timedelta(days=dias)
+    respuesta = {
+        "desde": desde.isoformat(),
+        "agrupado_por": agrupar_por,
+        "filas": llm_uso_service.resumen_uso(
+            db, agrupar_por, desde=desde, user_id=user_id, caso_id=caso_id, limite=limite
+        ),
+        "costo_por_documento": llm_uso_service.costo_por_documento(db, desde=desde),
+        "proveedor": llm_service.estado(),
+    }
+
+    if user_id is not None:
+        usuario = db.query(User).filter(User.id == user_id).first()
+        if usuario:
+            respuesta["presupuesto_usuario"] = {
+                "nivel": nivel_service.NOMBRES_NIVEL.get(usuario.nivel_usuario, "FREE"),
+                "presupuesto": nivel_service.presupuesto_llm_de_nivel(usuario.nivel_usuario),
+                "consumo_24h": llm_uso_service.consumo_usuario(user_id, db),
+            }
+
+    return respuesta
+
+
 @router.get("/metricas/reembolsos")
 async def obtener_metricas_reembolsos(
     current_user: User = Depends(get_admin_user),
@@ -412,6 +461,7 @@ async def listar_reembolsos_con_filtro(
                 "estado": estado_actual,
                 "motivo": caso.motivo_rechazo or "No especificado",
                 "evidencia_url": caso.evidencia_rechazo_url,
+                "evidencia_preview_url": f"/casos/{caso.id}/evidencia?preview=true" if caso.evidencia_rechazo_url else None,
                 "tipo_documento": caso.tipo_documento.value if caso.tipo_documento else "tutela"
             })
 
@@ -603,3 +653,176 @@ async def listar_auditoria(
         }
         for log in logs
     ]
+
+
+# Tamaño máximo del archivo de importación del catálogo
+MAX_TAMANO_IMPORTACION_CATALOGO = 50 * 1024 * 1024  # 50 MB
+
+
+@router.get("/catalogo")
+def estado_catalogo(
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    📚 Estado del catálogo de entidades y derechos
+
+    Muestra la versión en BD, la versión cargada en este worker y los conteos por tipo.
+    """
+    return catalogo_service.estado_catalogo(db)
+
+
+@router.post("/catalogo/entidades/importar")
+def importar_catalogo_entidades(
+    request: Request,
+    archivo: UploadFile = File(...),
+    reemplazar: bool = False,
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    📥 Importación masiva de entidades públicas (CSV o JSON)
+
+    - CSV con encabezado: nombre,tipo[,direccion,ciudad,nit]
+    - JSON: lista de objetos con esas mismas llaves
+    - reemplazar=true desactiva las entidades que no vengan en el archivo
+
+    Cada importación publica una nueva versión; los workers la recargan solos.
+    Es síncrono a propósito: COPY, upsert y recarga del índice corren en el
+    threadpool, no en el event loop.
+    """
+    nombre_archivo = archivo.filename or ""
+    formato = "json" if nombre_archivo.lower().endswith(".json") else "csv"
+
+    contenido = archivo.file.read(MAX_TAMANO_IMPORTACION_CATALOGO + 1)
+    if len(contenido) > MAX_TAMANO_IMPORTACION_CATALOGO:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo excede el tamaño máximo de 50MB"
+        )
+
+    try:
+        resultado = catalogo_service.importar_entidades(
+            contenido,
+            formato,
+            db,
+            reemplazar=reemplazar,
+            descripcion=f"{nombre_archivo} ({current_user.email})",
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error importando catálogo: {str(e)}"
+        )
+
+    registrar_auditoria(
+        db=db,
+        admin_id=current_user.id,
+        admin_email=current_user.email,
+        accion=ACCION_IMPORTAR_CATALOGO,
+        entidad="catalogo",
+        entidad_id=resultado["version"],
+        detalle={"archivo": nombre_archivo, "reemplazar": reemplazar, **resultado},
+        ip=request.client.host if request.client else None,
+    )
+
+    # Este worker recarga de inmediato; el resto lo hará en su próxima verificación
+    catalogo_service.recargar_catalogo(forzar=True)
+
+    return {"success": True, **resultado}
+
+
+@router.post("/catalogo/recargar")
+def recargar_catalogo(
+    current_user: User = Depends(get_admin_user),
+):
+    """
+    🔄 Fuerza la recarga del snapshot del catálogo en este worker
+    """
+    snapshot = catalogo_service.recargar_catalogo(forzar=True)
+    return {
+        "version": snapshot.version,
+        "entidades": snapshot.total_entidades,
+        "derechos": len(snapshot.derechos),
+    }
+
+
+@router.get("/catalogo/entidades/buscar")
+async def buscar_catalogo_entidades(
+    q: str = Query(..., min_length=2),
+    limite: int = Query(20, ge=1, le=200),
+    incluir_inactivas: bool = False,
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    🔍 Búsqueda de entidades directamente en BD (similitud pg_trgm)
+
+    Incluye dirección, NIT y estado para curar el catálogo.
+    """
+    try:
+        resultados = catalogo_service.buscar_entidades_db(
+            q, db, limite=limite, incluir_inactivas=incluir_inactivas
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error buscando entidades (¿migración pg_trgm aplicada?): {str(e)}"
+        )
+    return {"query": q, "resultados": resultados, "total": len(resultados)}
+
+
+@router.get("/pagos/reconciliacion")
+async def estado_reconciliacion(
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    🔁 Estado de la reconciliación de pagos con Vita
+
+    Pagos pendientes actuales, antigüedad del más viejo y resumen de la
+    última ejecución programada (job_ejecuciones, la corra el worker que la corra).
+    """
+    pendientes, mas_antiguo = db.query(
+        func.count(Pago.id),
+        func.min(Pago.created_at)
+    ).filter(
+        Pago.estado == EstadoPago.PENDIENTE,
+        Pago.metodo_pago == MetodoPago.VITA_WALLET,
+        Pago.vita_public_code.isnot(None)
+    ).one()
+
+    return {
+        "pendientes": pendientes,
+        "pendiente_mas_antiguo": mas_antiguo.isoformat() if mas_antiguo else None,
+        "ultima_ejecucion": reconciliacion_service.ultima_ejecucion(db),
+    }
+
+
+@router.post("/pagos/reconciliar")
+async def ejecutar_reconciliacion(
+    current_user: User = Depends(get_admin_user),
+):
+    """
+    🔁 Ejecuta una pasada de reconciliación de pagos pendientes ahora
+    """
+    return await reconciliacion_service.reconciliar_pagos_pendientes()
+
+
+@router.get("/scheduler")
+async def estado_scheduler(
+    current_user: User = Depends(get_admin_user),
+):
+    """
+    ⏱️ Jobs del scheduler embebido
+
+    Programación, siguiente ejecución y última ejecución registrada
+    (estado, worker, duración, resultado o error) de cada job.
+    """
+    from ..core.scheduler import scheduler
+    return {"jobs": await asyncio.to_thread(scheduler.estado)}
@@ -1,7 +1,7 @@
 import secrets
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 
@@ -18,7 +18,8 @@ from app.schemas.user import (
     UserCreate, UserLogin, UserResponse,
     ForgotPasswordRequest, ResetPasswordRequest, ResendVerificationRequest
 )
-from app.services.email_service import enviar_email_reset_contrasena, enviar_email_verificacion
+from app.services.email_service import encolar_email_reset_contrasena, encolar_email_verificacion
+from app.services.email_outbox_service import procesar_outbox
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -65,7 +66,11 @@ def get_current_user(
 
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
+async def signup(
+    user_data: UserCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
     existing_user = db.query(User).filter(User.email == user_data.email).first()
     if existing_user:
         raise HTTPException(
@@ -86,17 +91,15 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
+    # El email se encola en la misma transacción; el envío SMTP va en background
+    encolar_email_verificacion(
+        email_destino=new_user.email,
+        nombre=new_user.nombre,
+        token=verification_token,
+        db=db
+    )
     db.commit()
-    db.refresh(new_user)
-
-    try:
-        await enviar_email_verificacion(
-            email_destino=new_user.email,
-            nombre=new_user.nombre,
-            token=verification_token
-        )
-    except Exception:
-        pass
+    background_tasks.add_task(procesar_outbox)
 
     return {"message": "Cuenta creada. Revisa tu email para verificar."}
 
@@ -185,6 +188,7 @@ def verify_email(token: str, db: Session = Depends(get_db)):
 @router.post("/resend-verification", status_code=status.HTTP_200_OK)
 async def resend_verification(
     request_data: ResendVerificationRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.email == request_data.email).first()
@@ -193,16 +197,14 @@ async def resend_verification(
         token = secrets.token_urlsafe(32)
         user.email_verification_token = token
         user.email_verification_expires = datetime.utcnow() + timedelta(hours=settings.EMAIL_VERIFICATION_EXPIRE_HOURS)
+        encolar_email_verificacion(
+            email_destino=user.email,
+            nombre=user.nombre,
+            token=token,
+            db=db
+        )
         db.commit()
-
-        try:
-            await enviar_email_verificacion(
-                email_destino=user.email,
-                nombre=user.nombre,
-                token=token
-            )
-        except Exception:
-            pass
+        background_tasks.add_task(procesar_outbox)
 
     return {"message": "Si el email está registrado y sin verificar, recibirás un nuevo enlace de verificación"}
 
@@ -210,12 +212,13 @@ async def resend_verification(
 @router.post("/forgot-password", status_code=status.HTTP_200_OK)
 async def forgot_password(
     request_data: ForgotPasswordRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
     Solicita recuperación de contraseña.
 
-    Genera un token de reset (válido 1 hora) y envía el email.
+    Genera un token de reset (válido 1 hora) y encola el email.
     Siempre retorna 200 para no revelar si el email existe o no.
     """
     user = db.query(User).filter(User.email == request_data.email).first()
@@ -224,17 +227,15 @@ async def forgot_password(
         token = secrets.token_urlsafe(32)
         user.reset_password_token = token
         user.reset_token_expires = datetime.utcnow() + timedelta(hours=1)
+        encolar_email_reset_contrasena(
+            email_destino=user.email,
+            nombre=user.nombre,
+            token=token,
+            db=db
+        )
         db.commit()
-
-        try:
-            await enviar_email_reset_contrasena(
-                email_destino=user.email,
-                nombre=user.nombre,
-                token=token
-            )
-        except Exception:
-            # No exponer el error al cliente; el log ya registró el detalle
-            pass
+        # Envío en background: el tiempo de respuesta no revela si el email existe
+        background_tasks.add_task(procesar_outbox)
 
     return {
         "message": "Si el email está registrado, recibirás un enlace para restablecer tu contraseña"
@@ -1,19 +1,23 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 import logging
-import os
 
+from ..core import trazas
 from ..core.database import get_db, SessionLocal
 from ..core.config import settings
+from ..core.respuestas_archivos import respuesta_archivo
 from ..models.user import User
 from ..models.caso import Caso, EstadoCaso, TipoDocumento
 from ..models.mensaje import Mensaje
 from ..models.pago import Pago, EstadoPago, MetodoPago
 from ..schemas.caso import CasoCreate, CasoUpdate, CasoResponse, CasoListResponse
-from ..services import openai_service, document_service, pago_service
+from ..services import openai_service, document_service, pago_service, catalogo_service, almacenamiento_service
+from ..services import llm_service, llm_uso_service
 from ..services.vitawallet_service import vitawallet_service, VitaWalletError
 from .auth import get_current_user
 
@@ -55,22 +59,36 @@ def _generar_documento_bg(caso_id: int, tipo_doc: str):
             'pruebas': caso.pruebas,
         }
 
-        if tipo_doc == 'TUTELA':
-            doc = openai_service.generar_tutela(datos_caso)
-        else:
-            doc = openai_service.generar_derecho_peticion(datos_caso)
+        # Tokens y costo quedan registrados en llm_usage a nombre del caso
+        with llm_service.atribuir(caso_id=caso.id, user_id=caso.user_id):
+            if tipo_doc == 'TUTELA':
+                doc = openai_service.generar_tutela(datos_caso)
+            else:
+                doc = openai_service.generar_derecho_peticion(datos_caso)
 
         caso.documento_generado = doc
         caso.estado = EstadoCaso.GENERADO
+        caso.reintentar_generacion_en = None
         caso.fecha_vencimiento = datetime.utcnow() + timedelta(days=14)
         db.commit()
         logger.info(f"✅ Documento generado exitosamente para caso {caso_id}")
 
+    except llm_service.LlmNoDisponible as e:
+        # Fallo rápido: el proveedor está degradado, no se bloquea el hilo esperando el timeout
+        logger.warning(f"⏳ Generación del caso {caso_id} rechazada: {e}")
+        try:
+            if caso:
+                caso.estado = EstadoCaso.ERROR_GENERACION
+                caso.reintentar_generacion_en = datetime.utcnow() + timedelta(seconds=e.reintentar_en)
+                db.commit()
+        except Exception:
+            pass
     except Exception as e:
         logger.error(f"❌ Error generando documento caso {caso_id}: {e}")
         try:
             if caso:
                 caso.estado = EstadoCaso.ERROR_GENERACION
+                caso.reintentar_generacion_en = None
                 db.commit()
         except Exception:
             pass
@@ -448,6 +466,38 @@ def validar_caso(
     }
 
 
+def _verificar_presupuesto_llm(usuario: User, db: Session, generacion: bool):
+    """HTTP 429 si el usuario agotó su presupuesto de IA de las últimas 24 horas."""
+    try:
+        llm_uso_service.verificar_presupuesto(usuario, db, generacion=generacion)
+    except llm_uso_service.PresupuestoExcedido as e:
+        logger.warning(f"⛔ Presupuesto de IA agotado para {usuario.email}: {e.razon}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "error": "Límite de uso de IA alcanzado",
+                "razon": e.razon,
+                "generaciones_24h": e.consumo["generaciones"],
+                "generaciones_disponibles": max(
+                    0, e.consumo["presupuesto"]["generaciones_dia"] - e.consumo["generaciones"]
+                ),
+            }
+        )
+
+
+def _http_llm_no_disponible(reintentar_en: float) -> HTTPException:
+    """HTTP 503 con Retry-After cuando el LLM está degradado (circuito abierto o sin cupo)."""
+    segundos = max(1, int(round(reintentar_en)))
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail={
+            "error": "El servicio de IA no está disponible temporalmente",
+            "reintentar_en_segundos": segundos,
+        },
+        headers={"Retry-After": str(segundos)},
+    )
+
+
 @router.post("/{caso_id}/procesar-transcripcion", response_model=CasoResponse)
 def procesar_transcripcion(
     caso_id: int,
@@ -485,6 +535,9 @@ def procesar_transcripcion(
             detail="Sesión abandonada sin mensajes. Revisa los logs del agente."
         )
 
+    # 🔒 Presupuesto de IA (la extracción solo cuenta contra el costo diario)
+    _verificar_presupuesto_llm(current_user, db, generacion=False)
+
     try:
         # Convertir mensajes a formato para el servicio de IA
         mensajes_formateados = [
@@ -497,7 +550,12 @@ def procesar_transcripcion(
         ]
 
         # Extraer datos con IA
-        datos_extraidos = openai_service.extraer_datos_conversacion(mensajes_formateados)
+        try:
+            with llm_service.atribuir(caso_id=caso.id, user_id=current_user.id):
+                datos_extraidos = openai_service.extraer_datos_conversacion(mensajes_formateados)
+        except llm_service.LlmNoDisponible as e:
+            logger.warning(f"⏳ Extracción del caso {caso_id} rechazada: {e}")
+            raise _http_llm_no_disponible(e.reintentar_en)
 
         # Detección automática de urgencia
         from ..core.validation_helper import clasificar_derecho_vulnerado
@@ -598,6 +656,15 @@ def procesar_transcripcion(
             caso.direccion_entidad = datos_extraidos['direccion_entidad']
             campos_actualizados.append('direccion_entidad')
 
+        # Si la IA no obtuvo la dirección, completarla desde el catálogo de entidades
+        if caso.entidad_accionada and not caso.direccion_entidad:
+            entidad_catalogo = catalogo_service.obtener_catalogo().detalle_entidad(caso.entidad_accionada)
+            if entidad_catalogo and entidad_catalogo.get("direccion"):
+                caso.direccion_entidad = entidad_catalogo["direccion"]
+                if 'direccion_entidad' not in campos_actualizados:
+                    campos_actualizados.append('direccion_entidad')
+                logger.info(f"📚 Dirección de '{caso.entidad_accionada}' autollenada desde el catálogo")
+
         # 🆕 CIUDAD DE LOS HECHOS
         if 'ciudad_de_los_hechos' in datos_extraidos:
             caso.ciudad_de_los_hechos = datos_extraidos['ciudad_de_los_hechos']
@@ -655,6 +722,8 @@ def procesar_transcripcion(
 
         return caso
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error procesando transcripción: {str(e)}")
         logger.error(f"   Tipo de error: {type(e).__name__}")
@@ -665,7 +734,7 @@ def procesar_transcripcion(
 
 
 @router.post("/{caso_id}/generar", response_model=CasoResponse, status_code=202)
-async def generar_documento(
+def generar_documento(
     caso_id: int,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
@@ -675,7 +744,9 @@ async def generar_documento(
     Inicia la generación del documento legal en background y retorna 202.
 
     El cliente debe hacer polling a GET /casos/{id} cada 2s hasta que
-    estado sea GENERADO o ERROR_GENERACION.
+    estado sea GENERADO o ERROR_GENERACION. Si la IA está degradada responde
+    503 con Retry-After, o la tarea termina en ERROR_GENERACION con
+    reintentar_generacion_en.
 
     VALIDACIÓN ESTRICTA: Valida todos los campos críticos antes de encolar
     la tarea background.
@@ -733,12 +804,36 @@ async def generar_documento(
             }
         )
 
+    # ⏳ Con el circuito del LLM abierto no se encola nada (la tarea fallaría igual)
+    reintentar_en = llm_service.breaker.reintentar_en()
+    if reintentar_en is not None:
+        logger.warning(f"⏳ Generación del caso {caso_id} rechazada: circuito del LLM abierto")
+        raise _http_llm_no_disponible(reintentar_en)
+
+    # 🔒 Reserva de la generación: con la fila del usuario bloqueada hasta el
+    # commit que pasa el caso a GENERANDO, el presupuesto cuenta también las
+    # generaciones en curso (requests simultáneos no comparten el mismo cupo).
+    # Si no se reserva, el rollback suelta el bloqueo antes de responder
+    llm_uso_service.bloquear_presupuesto(current_user.id, db)
+    try:
+        db.refresh(caso)
+        if caso.estado == EstadoCaso.GENERANDO:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El documento ya se está generando"
+            )
+        _verificar_presupuesto_llm(current_user, db, generacion=True)
+    except Exception:
+        db.rollback()
+        raise
+
     # Marcar como GENERANDO y encolar la tarea background
     caso.estado = EstadoCaso.GENERANDO
     db.commit()
     db.refresh(caso)
 
-    background_tasks.add_task(_generar_documento_bg, caso_id, tipo_doc)
+    # La generación queda en la misma traza que la request (span hijo)
+    background_tasks.add_task(trazas.propagar(_generar_documento_bg), caso_id, tipo_doc)
 
     return caso
 
@@ -1023,37 +1118,32 @@ async def obtener_estado_pago(
 
         try:
             # Consultar estado actual en Vita
-            vita_status = await vitawallet_service.consultar_estado_payment_order(
+            # Coalescido: varias pestañas/polls comparten una sola consulta a Vita
+            vita_status = await vitawallet_service.consultar_estado_coalescido(
                 ultimo_pago.vita_public_code
             )
 
             logger.info(f"Respuesta Vita polling: {vita_status}")
 
-            # Si Vita confirma que está pagado, procesar
+            # Si Vita confirma que está pagado, procesar (solo una vez aunque
+            # el webhook llegue al mismo tiempo)
             if vita_status.get("status") in ["paid", "completed"]:
                 logger.info(f"Vita confirma pago exitoso para {ultimo_pago.vita_public_code}")
 
-                # Actualizar estado del pago
-                ultimo_pago.estado = EstadoPago.EXITOSO
-                ultimo_pago.fecha_pago = datetime.utcnow()
-                db.commit()
-
-                # Procesar beneficios (desbloquear documento, etc.)
-                try:
-                    from ..services.pago_service import procesar_pago_exitoso
-                    beneficios = procesar_pago_exitoso(ultimo_pago.id, db)
+                beneficios = pago_service.confirmar_pago(ultimo_pago.id, db)
+                if beneficios is not None:
                     logger.info(f"Beneficios procesados via polling: {beneficios}")
-                except Exception as e:
-                    logger.error(f"Error procesando beneficios via polling: {str(e)}")
 
                 # Refrescar caso para obtener estado actualizado
                 db.refresh(caso)
 
             elif vita_status.get("status") in ["expired", "cancelled", "failed"]:
                 logger.info(f"Vita reporta pago fallido/expirado: {vita_status.get('status')}")
-                ultimo_pago.estado = EstadoPago.FALLIDO
-                ultimo_pago.notas_admin = f"Estado Vita: {vita_status.get('status')}"
-                db.commit()
+                pago_service.marcar_pago_fallido(
+                    ultimo_pago.id,
+                    f"Estado Vita: {vita_status.get('status')}",
+                    db
+                )
 
         except Exception as e:
             # Si falla el polling, continuamos con el estado de la BD
@@ -1258,11 +1348,30 @@ def descargar_pdf(
         )
 
 
-@router.post("/{caso_id}/solicitar-reembolso")
+# Formulario de solicitar-reembolso (se parsea en el endpoint, con límites)
+_FORMULARIO_REEMBOLSO = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["motivo"],
+                    "properties": {
+                        "motivo": {"type": "string"},
+                        "evidencia": {"type": "string", "format": "binary"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/{caso_id}/solicitar-reembolso", openapi_extra=_FORMULARIO_REEMBOLSO)
 async def solicitar_reembolso(
     caso_id: int,
-    motivo: str = Form(...),
-    evidencia: UploadFile = File(None),  # Opcional
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1274,8 +1383,11 @@ async def solicitar_reembolso(
 
     Requisitos:
     - Caso debe estar pagado
-    - Debe proporcionar motivo del rechazo
-    - Evidencia es opcional (recomendada)
+    - Debe proporcionar motivo del rechazo (campo de formulario 'motivo')
+    - Evidencia es opcional (recomendada, campo 'evidencia', máx. 10 MB)
+
+    El cuerpo se lee después de validar el caso y con límite de tamaño: un
+    Content-Length excesivo se rechaza (413) sin recibir el archivo.
     """
 
     # Verificar que el caso existe y pertenece al usuario
@@ -1300,59 +1412,35 @@ async def solicitar_reembolso(
         )
 
     try:
-        evidencia_url = None
-
-        # Guardar archivo de evidencia (si se proporcionó)
-        if evidencia and evidencia.filename:
-            MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
-
-            ALLOWED_MAGIC = {
-                b'\x25\x50\x44\x46': ['.pdf'],           # PDF (%PDF)
-                b'\xff\xd8\xff':      ['.jpg', '.jpeg'],  # JPEG
-                b'\x89\x50\x4e\x47': ['.png'],            # PNG
-            }
-
-            content = await evidencia.read()
-
-            if len(content) > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="El archivo no puede superar 10 MB"
-                )
-
-            detected_exts = None
-            for magic, exts in ALLOWED_MAGIC.items():
-                if content.startswith(magic):
-                    detected_exts = exts
-                    break
-
-            if not detected_exts:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Tipo de archivo no permitido. Solo se aceptan PDF, JPG y PNG"
-                )
-
-            ext = os.path.splitext(evidencia.filename)[1].lower()
-            if ext not in detected_exts:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="La extensión del archivo no corresponde con su contenido"
-                )
-
-            upload_dir = "uploads/evidencias_reembolso"
-            os.makedirs(upload_dir, exist_ok=True)
+        formulario = await almacenamiento_service.leer_formulario(request)
+    except almacenamiento_service.CuerpoDemasiadoGrande as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except MultiPartException as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Formulario inválido: {e.message}"
+        )
 
-            # Generar nombre único para el archivo
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            file_extension = os.path.splitext(evidencia.filename)[1]
-            filename = f"caso_{caso_id}_{timestamp}{file_extension}"
-            file_path = os.path.join(upload_dir, filename)
+    try:
+        motivo = formulario.get("motivo")
+        if not isinstance(motivo, str) or not motivo.strip():
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Debe indicar el motivo del rechazo"
+            )
 
-            # Guardar archivo
-            with open(file_path, "wb") as buffer:
-                buffer.write(content)
+        evidencia_url = None
 
-            evidencia_url = f"/{file_path}"
+        # Guardar archivo de evidencia (si se proporcionó)
+        evidencia = formulario.get("evidencia")
+        if isinstance(evidencia, UploadFile) and evidencia.filename:
+            # Magic bytes en el primer bloque y ruta por SHA-256
+            # (mismo archivo = mismo almacenamiento)
+            guardado = await almacenamiento_service.guardar_evidencia(evidencia)
+            evidencia_url = almacenamiento_service.obtener_backend().url(guardado.clave)
 
         # Registrar solicitud de reembolso
         resultado = pago_service.solicitar_reembolso(caso_id, motivo, evidencia_url, db)
@@ -1365,16 +1453,74 @@ async def solicitar_reembolso(
         }
 
     except ValueError as e:
+        # Incluye ArchivoNoPermitido (tamaño, tipo o extensión)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error procesando solicitud de reembolso: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error procesando solicitud: {str(e)}"
         )
+    finally:
+        # Borra los temporales del parser
+        await formulario.close()
+
+
+@router.get("/{caso_id}/evidencia")
+async def obtener_evidencia_reembolso(
+    caso_id: int,
+    request: Request,
+    preview: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Sirve la evidencia de reembolso del caso (dueño del caso o administrador)
+
+    - Soporta Range, If-None-Match e If-Modified-Since (304)
+    - Evidencias direccionadas por contenido: Cache-Control immutable
+    - ?preview=true: JPEG reducido para imágenes (revisión en el panel admin);
+      para PDF se sirve el original
+    """
+    consulta = db.query(Caso.evidencia_rechazo_url).filter(Caso.id == caso_id)
+    if not current_user.is_admin:
+        consulta = consulta.filter(Caso.user_id == current_user.id)
+    fila = consulta.first()
+
+    clave = almacenamiento_service.clave_desde_url(fila.evidencia_rechazo_url) if fila else None
+    ruta = almacenamiento_service.obtener_backend().ruta_local(clave) if clave else None
+    if not ruta or not ruta.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evidencia no encontrada"
+        )
+
+    sha256 = almacenamiento_service.hash_de_clave(clave)
+
+    if preview:
+        ruta_preview = await almacenamiento_service.obtener_preview(clave)
+        if ruta_preview:
+            return respuesta_archivo(
+                request,
+                ruta_preview,
+                media_type="image/jpeg",
+                etag=f"{sha256}-preview" if sha256 else None,
+                inmutable=sha256 is not None,
+            )
+
+    return respuesta_archivo(
+        request,
+        ruta,
+        media_type=almacenamiento_service.content_type_de(clave),
+        etag=sha256,
+        inmutable=sha256 is not None,
+        filename=f"evidencia_caso_{caso_id}{ruta.suffix}",
+    )
 
 
 @router.get("/historial-pagos")
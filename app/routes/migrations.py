@@ -38,6 +38,8 @@ async def apply_migrations(
     - Eliminar campo representante_legal
     - Agregar campo documento_desbloqueado
     - Agregar campo fecha_pago
+    - Extensión pg_trgm e índice de búsqueda del catálogo de entidades
+    - Agregar campo reintentar_generacion_en
     """
 
     # Validar clave secreta (usando la SECRET_KEY del .env)
@@ -183,6 +185,42 @@ async def apply_migrations(
                 results["migrations_skipped"].append("vita_public_code ya existe en pagos")
                 logger.info("Campo 'vita_public_code' ya existe, saltando...")
 
+            # =========================================================
+            # MIGRACIÓN 5: Catálogo de entidades - búsqueda por trigramas
+            # =========================================================
+
+            # 5.1. Extensión pg_trgm + índice GIN sobre el nombre de la entidad
+            # (las tablas del catálogo las crea create_all al arrancar)
+            logger.info("Creando extensión pg_trgm e índice de trigramas...")
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_entidades_publicas_nombre_trgm
+                ON entidades_publicas USING gin (nombre gin_trgm_ops)
+            """))
+            conn.commit()
+            results["migrations_applied"].append("pg_trgm e índice idx_entidades_publicas_nombre_trgm verificados")
+            logger.info("Índice de trigramas para entidades_publicas listo")
+
+            # =========================================================
+            # MIGRACIÓN 6: Fallo rápido de generación (LLM no disponible)
+            # =========================================================
+
+            # 6.1. Agregar campo reintentar_generacion_en a casos
+            if not column_exists(inspector, 'casos', 'reintentar_generacion_en'):
+                logger.info("Agregando campo 'reintentar_generacion_en'...")
+                conn.execute(text("""
+                    ALTER TABLE casos
+                    ADD COLUMN reintentar_generacion_en TIMESTAMP
+                """))
+                conn.commit()
+                results["migrations_applied"].append("reintentar_generacion_en agregado")
+                logger.info("Campo 'reintentar_generacion_en' agregado exitosamente")
+                # Refrescar inspector
+                inspector = inspect(engine)
+            else:
+                results["migrations_skipped"].append("reintentar_generacion_en ya existe")
+                logger.info("Campo 'reintentar_generacion_en' ya existe, saltando...")
+
             # Verificación final
             final_inspector = inspect(engine)
             final_columns = [col['name'] for col in final_inspector.get_columns('casos')]
@@ -1,23 +1,36 @@
 """
 Rutas para acceder a datos de referencia colombianos
 """
-from fastapi import APIRouter, Query
-from typing import List, Dict, Optional
+from fastapi import APIRouter, Query, Request
+from typing import Optional
 from ..core.datos_colombia import (
-    DERECHOS_FUNDAMENTALES,
-    ENTIDADES_PUBLICAS,
     DEPARTAMENTOS,
     CIUDADES_PRINCIPALES,
-    obtener_derechos_por_categoria,
-    obtener_entidades_por_tipo,
-    buscar_entidad
 )
+from ..core.respuestas_precomputadas import (
+    CuerpoPrecomputado,
+    respuesta_precomputada,
+    CACHE_CONTROL_ESTATICO,
+    CACHE_CONTROL_CATALOGO,
+)
+from ..services.catalogo_service import obtener_catalogo
 
 router = APIRouter(prefix="/api/referencias", tags=["referencias"])
 
+# Listas inmutables: se serializan y comprimen una sola vez al importar el módulo
+_CUERPO_DEPARTAMENTOS = CuerpoPrecomputado({
+    "departamentos": DEPARTAMENTOS,
+    "total": len(DEPARTAMENTOS)
+})
+_CUERPO_CIUDADES = CuerpoPrecomputado({
+    "ciudades": CIUDADES_PRINCIPALES,
+    "total": len(CIUDADES_PRINCIPALES)
+})
+
 
 @router.get("/derechos-fundamentales")
 def obtener_derechos(
+    request: Request,
     categoria: Optional[str] = Query(None, description="Filtrar por: fundamentales, conexidad")
 ):
     """
@@ -26,14 +39,16 @@ def obtener_derechos(
     - **categoria**: Opcional - 'fundamentales' para derechos fundamentales puros,
                     'conexidad' para derechos por conexidad
     """
-    return {
-        "derechos": obtener_derechos_por_categoria(categoria),
-        "total": len(obtener_derechos_por_categoria(categoria))
-    }
+    return respuesta_precomputada(
+        request,
+        obtener_catalogo().cuerpo_derechos(categoria),
+        CACHE_CONTROL_CATALOGO
+    )
 
 
 @router.get("/entidades-publicas")
 def obtener_entidades(
+    request: Request,
     tipo: Optional[str] = Query(
         None,
         description="Tipo de entidad: EPS, MINISTERIOS, SUPERINTENDENCIAS, etc."
@@ -45,30 +60,28 @@ def obtener_entidades(
     - **tipo**: Opcional - EPS, MINISTERIOS, SUPERINTENDENCIAS, ENTIDADES_AUTONOMAS,
                FUERZAS_PUBLICAS, EDUCACION, GOBIERNOS_TERRITORIALES, PENSIONES
     """
-    if tipo:
-        entidades = obtener_entidades_por_tipo(tipo)
-        return {
-            "tipo": tipo,
-            "entidades": entidades,
-            "total": len(entidades)
-        }
-    else:
-        return {
-            "categorias": ENTIDADES_PUBLICAS,
-            "total_categorias": len(ENTIDADES_PUBLICAS)
-        }
+    return respuesta_precomputada(
+        request,
+        obtener_catalogo().cuerpo_entidades(tipo),
+        CACHE_CONTROL_CATALOGO
+    )
 
 
 @router.get("/entidades-publicas/buscar")
 def buscar_entidades(
-    q: str = Query(..., description="Término de búsqueda", min_length=2)
+    q: str = Query(..., description="Término de búsqueda", min_length=2),
+    limite: int = Query(20, ge=1, le=100, description="Máximo de resultados")
 ):
     """
     Busca entidades públicas por término.
 
+    La búsqueda ignora tildes y mayúsculas, coincide por prefijo de cada palabra
+    y tolera errores de digitación. Los resultados vienen ordenados por relevancia.
+
     - **q**: Término de búsqueda (mínimo 2 caracteres)
+    - **limite**: Máximo de resultados (por defecto 20)
     """
-    resultados = buscar_entidad(q)
+    resultados = obtener_catalogo().buscar(q, limite=limite)
     return {
         "query": q,
         "resultados": resultados,
@@ -77,25 +90,19 @@ def buscar_entidades(
 
 
 @router.get("/departamentos")
-def obtener_departamentos():
+def obtener_departamentos(request: Request):
     """
     Obtiene la lista de departamentos de Colombia.
     """
-    return {
-        "departamentos": DEPARTAMENTOS,
-        "total": len(DEPARTAMENTOS)
-    }
+    return respuesta_precomputada(request, _CUERPO_DEPARTAMENTOS, CACHE_CONTROL_ESTATICO)
 
 
 @router.get("/ciudades")
-def obtener_ciudades():
+def obtener_ciudades(request: Request):
     """
     Obtiene la lista de ciudades principales de Colombia.
     """
-    return {
-        "ciudades": CIUDADES_PRINCIPALES,
-        "total": len(CIUDADES_PRINCIPALES)
-    }
+    return respuesta_precomputada(request, _CUERPO_CIUDADES, CACHE_CONTROL_ESTATICO)
 
 
 @router.get("/validar/cedula/{cedula}")
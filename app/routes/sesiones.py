@@ -1,15 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from livekit import api
-from datetime import datetime, timedelta, date
-import uuid
+from datetime import datetime, date
 
 from ..core.config import settings
 from ..core.database import get_db
 from ..models.user import User
-from ..models.caso import Caso, TipoDocumento, EstadoCaso
+from ..models.caso import Caso, EstadoCaso
 from .auth import get_current_user
-from ..services import sesion_service, nivel_service
+from ..services import sesion_service, nivel_service, livekit_service, caso_service
 
 router = APIRouter(prefix="/sesiones", tags=["Sesiones"])
 
@@ -50,46 +48,9 @@ async def iniciar_sesion(
                 }
             )
 
-        # 1. Crear nuevo caso (sin iniciar sesión de LiveKit aún)
-        session_id = str(uuid.uuid4())
-
-        # Crear el caso primero para obtener el ID
-        nuevo_caso = Caso(
-            user_id=current_user.id,
-            tipo_documento=TipoDocumento.TUTELA,
-            estado=EstadoCaso.BORRADOR,
-            session_id=session_id,
-            room_name=None,  # Se asignará después de obtener el ID
-            # ❌ NO marcar fecha_inicio_sesion aquí (se marca al conectar)
-            # fecha_inicio_sesion=datetime.utcnow(),
-            # ✅ Auto-llenar TODOS los datos del perfil del usuario
-            nombre_solicitante=f"{current_user.nombre} {current_user.apellido}",
-            email_solicitante=current_user.email,
-            identificacion_solicitante=current_user.identificacion if current_user.identificacion else None,
-            direccion_solicitante=current_user.direccion if current_user.direccion else None,
-            telefono_solicitante=current_user.telefono if current_user.telefono else None
-        )
-
-        db.add(nuevo_caso)
-        db.commit()  # Commit para obtener el ID
-        db.refresh(nuevo_caso)
-
-        # Ahora que tenemos el ID, actualizar el room_name en formato esperado por el agente
-        nuevo_caso.room_name = f"caso-{nuevo_caso.id}"  # ✅ Formato: caso-123
-        db.commit()
-        db.refresh(nuevo_caso)
-
-        # 2. ✅ NO generar token de LiveKit aquí
-        # El token se generará cuando el usuario presione "Iniciar sesión"
-        # mediante el endpoint /sesiones/{caso_id}/conectar
-
-        return {
-            "caso_id": nuevo_caso.id,
-            "session_id": session_id,
-            "room_name": nuevo_caso.room_name,
-            "tipo_documento": nuevo_caso.tipo_documento.value,
-            "nombre_solicitante": nuevo_caso.nombre_solicitante
-        }
+        # Crear el caso con un solo INSERT (id y room_name "caso-{id}" en el mismo statement)
+        # ❌ NO marca fecha_inicio_sesion ni genera token (eso se hace en /conectar)
+        return caso_service.crear_caso_sesion(current_user, db)
 
     except Exception as e:
         db.rollback()
@@ -115,6 +76,9 @@ async def conectar_sesion(
     - Retorna token y URL para que el frontend se conecte
 
     Este endpoint separa la creación del caso (POST /iniciar) de la conexión a LiveKit
+
+    Reconexiones: el token se reutiliza mientras esté vigente (sin firmar de
+    nuevo) y fecha_inicio_sesion solo se escribe la primera vez.
     """
     caso = db.query(Caso).filter(
         Caso.id == caso_id,
@@ -141,25 +105,19 @@ async def conectar_sesion(
                 detail="LiveKit credentials not configured"
             )
 
-        token = api.AccessToken(settings.LIVEKIT_API_KEY, settings.LIVEKIT_API_SECRET)
-        token.with_identity(f"user-{caso.id}")
-        token.with_name(f"{current_user.nombre} {current_user.apellido}")
-        token.with_grants(api.VideoGrants(
-            room_join=True,
-            room=caso.room_name,
-        ))
-        token.with_metadata(f"caso_id:{caso.id}")  # Metadata importante para el agente
-        token.with_ttl(timedelta(hours=2))
-
-        access_token = token.to_jwt()
+        # Token cacheado por (caso, identidad): las reconexiones no vuelven a firmar
+        user_name = f"{current_user.nombre} {current_user.apellido}"
+        access_token, user_identity = await livekit_service.obtener_token_sesion(
+            caso.id, caso.room_name, user_name
+        )
 
         return {
             "caso_id": caso.id,
             "room_name": caso.room_name,
             "livekit_url": settings.LIVEKIT_URL,
             "access_token": access_token,
-            "user_identity": f"user-{caso.id}",
-            "user_name": f"{current_user.nombre} {current_user.apellido}"
+            "user_identity": user_identity,
+            "user_name": user_name
         }
 
     except Exception as e:
@@ -184,27 +142,13 @@ async def finalizar_sesion(
     - Calcula duración real de la sesión (máx 15 min por frontend)
     - Registra minutos consumidos en sesiones_diarias (solo estadísticas)
     - Los minutos NO bloquean sesiones futuras
+    - Idempotente: si el webhook de LiveKit ya cerró la sesión, no se cuenta dos veces
     """
-    caso = db.query(Caso).filter(Caso.id == caso_id).first()
-    if not caso:
+    try:
+        resultado = sesion_service.finalizar_sesion_caso(caso_id, db)
+    except ValueError:
         raise HTTPException(status_code=404, detail="Caso no encontrado")
-
-    # Verificar si ya fue finalizada anteriormente
-    ya_fue_finalizada = caso.fecha_fin_sesion is not None
-
-    caso.fecha_fin_sesion = datetime.utcnow()
-
-    # Calcular duración en minutos
-    duracion_minutos = 0
-    if caso.fecha_inicio_sesion:
-        duracion_segundos = (caso.fecha_fin_sesion - caso.fecha_inicio_sesion).total_seconds()
-        duracion_minutos = int(duracion_segundos / 60)
-
-        # 📊 Registrar fin de sesión con minutos consumidos
-        # Solo se contará como sesión si es la primera vez que se finaliza y duró >1 min
-        sesion_service.registrar_fin_sesion(caso.id, duracion_minutos, db, ya_fue_finalizada)
-
-    db.commit()
+    duracion_minutos = resultado["duracion_minutos"]
 
     return {
         "message": "Sesión finalizada",
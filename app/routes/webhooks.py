@@ -1,22 +1,22 @@
 """
-Endpoints para recibir webhooks de pasarelas de pago
+Endpoints para recibir webhooks de pasarelas de pago y LiveKit
 
 Este módulo maneja las notificaciones (IPN) de:
 - Vita Wallet: Confirmaciones de pago
+- LiveKit: Fin de sesión de avatar (room_finished, participant_left)
 """
 
-from fastapi import APIRouter, Request, HTTPException, status, Header
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, HTTPException, status, Header
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime
 import logging
 import json
 
+from ..core.config import settings
 from ..core.database import get_db
-from ..models.pago import Pago, EstadoPago, MetodoPago
-from ..models.caso import Caso, EstadoCaso
 from ..services.vitawallet_service import vitawallet_service
-from ..services.pago_service import procesar_pago_exitoso
+from ..services import webhook_service, livekit_service
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
 logger = logging.getLogger(__name__)
@@ -31,8 +31,10 @@ async def vita_webhook_verificacion():
 @router.post("/vita")
 async def webhook_vita(
     request: Request,
+    background_tasks: BackgroundTasks,
     authorization: Optional[str] = Header(None),
-    x_date: Optional[str] = Header(None, alias="X-Date")
+    x_date: Optional[str] = Header(None, alias="X-Date"),
+    db: Session = Depends(get_db)
 ):
     """
     Recibe notificaciones de pago de Vita Wallet (IPN)
@@ -43,235 +45,192 @@ async def webhook_vita(
 
     Body: Evento con datos de la transacción
 
-    Flujo:
+    Flujo (ack rápido):
     1. Extraer y validar firma HMAC-SHA256
-    2. Parsear evento
-    3. Buscar pago por public_code o transaction_id
-    4. Procesar según estado (completed, denied, failed, etc.)
-    5. Retornar 200 OK
+    2. Registrar el evento en webhook_events (idempotente por event_id)
+    3. Retornar 200 OK
+
+    La aplicación del evento (buscar el pago, desbloquear documento, etc.)
+    la hace webhook_service en background. Una entrega duplicada solo cuesta
+    un INSERT que no inserta nada.
     """
-    # Obtener sesión de BD
-    from ..core.database import SessionLocal
-    db = SessionLocal()
+    # Leer body raw para validación de firma
+    body_bytes = await request.body()
 
     try:
-        # Leer body raw para validación de firma
-        body_bytes = await request.body()
-        body_str = body_bytes.decode('utf-8')
-
-        try:
-            body = json.loads(body_str)
-        except json.JSONDecodeError:
-            logger.error(f"Webhook Vita: Body no es JSON válido")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Body debe ser JSON válido"
-            )
-
-        logger.info(f"Webhook Vita recibido: event_type={body.get('event_type')}")
-
-        # Extraer firma del header Authorization
-        signature = vitawallet_service.extraer_signature_de_header(authorization)
-
-        if not signature:
-            logger.warning("Webhook Vita: No se encontró firma en Authorization header")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Firma no encontrada en header Authorization"
-            )
-
-        if not x_date:
-            logger.warning("Webhook Vita: No se encontró header X-Date")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Header X-Date requerido"
-            )
-
-        # Validar firma HMAC-SHA256 (siempre, en todos los entornos)
-        is_valid = vitawallet_service.verificar_firma_webhook(
-            x_date=x_date,
-            body=body,
-            signature_recibida=signature
+        body = json.loads(body_bytes.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        logger.error("Webhook Vita: Body no es JSON válido")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body debe ser JSON válido"
         )
 
-        if not is_valid:
-            logger.error(
-                f"Webhook Vita: Firma inválida "
-                f"(entorno={vitawallet_service.environment})"
-            )
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Firma de webhook inválida"
-            )
-
-        # Parsear evento
-        evento = vitawallet_service.parsear_evento_webhook(body)
-
-        # Extraer public_code del body (viene en diferentes lugares según el evento)
-        public_code = None
-        if "data" in body:
-            data = body["data"]
-            if isinstance(data, dict):
-                # 1. Directo en data.public_code (payment_order.paid)
-                public_code = data.get("public_code")
-                # 2. En data.order (transaction.completed)
-                if not public_code:
-                    public_code = data.get("order")
-                # 3. En data.payment_order.public_code (payment_order_attempt.paid)
-                if not public_code and "payment_order" in data:
-                    public_code = data.get("payment_order", {}).get("public_code")
-                # 4. En data.attributes.public_code (formato alternativo)
-                if not public_code:
-                    public_code = data.get("attributes", {}).get("public_code")
-
-        logger.info(
-            f"Evento parseado: type={evento['event_type']}, "
-            f"status={evento['status']}, "
-            f"transaction_id={evento['transaction_id']}, "
-            f"public_code={public_code}"
+    if not isinstance(body, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body debe ser un objeto JSON"
         )
 
-        # Log del body completo para debug
-        logger.debug(f"Webhook body completo: {body}")
-
-        # Buscar el pago asociado
-        pago = None
-
-        # 1. Buscar por public_code (payment orders de Vita)
-        if public_code:
-            pago = db.query(Pago).filter(
-                Pago.vita_public_code == public_code
-            ).first()
-            if pago:
-                logger.info(f"Pago encontrado por public_code: {pago.id}")
-
-        # 2. Si no, buscar por transaction_id (referencia_pago)
-        if not pago and evento.get("transaction_id"):
-            pago = db.query(Pago).filter(
-                Pago.referencia_pago == str(evento["transaction_id"])
-            ).first()
-            if pago:
-                logger.info(f"Pago encontrado por transaction_id: {pago.id}")
-
-        # 3. Si no, buscar por descripción (que contiene el caso_id)
-        if not pago and evento.get("description"):
-            # La descripción tiene formato "Pago Tutela - Caso #123"
-            desc = evento["description"]
-            if "Caso #" in desc:
-                try:
-                    caso_id = int(desc.split("Caso #")[1].split()[0])
-                    # Buscar pago pendiente para ese caso
-                    pago = db.query(Pago).filter(
-                        Pago.caso_id == caso_id,
-                        Pago.estado == EstadoPago.PENDIENTE,
-                        Pago.metodo_pago == MetodoPago.VITA_WALLET
-                    ).order_by(Pago.created_at.desc()).first()
-
-                    if pago:
-                        logger.info(f"Pago encontrado por caso_id: {pago.id}")
-                except (ValueError, IndexError):
-                    pass
-
-        if not pago:
-            logger.warning(
-                f"Webhook Vita: No se encontró pago para transaction_id={evento.get('transaction_id')}"
-            )
-            # Retornamos 200 para que Vita no reintente
-            # pero registramos el evento huérfano
-            return {
-                "status": "warning",
-                "message": "Pago no encontrado, evento ignorado",
-                "event_id": evento.get("event_id")
-            }
+    # Extraer firma del header Authorization
+    signature = vitawallet_service.extraer_signature_de_header(authorization)
 
-        # Verificar idempotencia - si ya procesamos este pago, ignorar
-        if pago.estado == EstadoPago.EXITOSO:
-            logger.info(f"Pago {pago.id} ya está en estado EXITOSO, ignorando webhook")
-            return {
-                "status": "ok",
-                "message": "Pago ya procesado anteriormente",
-                "pago_id": pago.id
-            }
+    if not signature:
+        logger.warning("Webhook Vita: No se encontró firma en Authorization header")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Firma no encontrada en header Authorization"
+        )
 
-        if pago.estado == EstadoPago.REEMBOLSADO:
-            logger.info(f"Pago {pago.id} está REEMBOLSADO, ignorando webhook")
-            return {
-                "status": "ok",
-                "message": "Pago ya reembolsado",
-                "pago_id": pago.id
-            }
+    if not x_date:
+        logger.warning("Webhook Vita: No se encontró header X-Date")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Header X-Date requerido"
+        )
 
-        # Procesar según el estado del evento
-        if vitawallet_service.es_pago_exitoso(evento):
-            # PAGO EXITOSO
-            logger.info(f"Procesando pago exitoso: pago_id={pago.id}")
+    # Validar firma HMAC-SHA256 (siempre, en todos los entornos)
+    is_valid = vitawallet_service.verificar_firma_webhook(
+        x_date=x_date,
+        body=body,
+        signature_recibida=signature
+    )
 
-            pago.estado = EstadoPago.EXITOSO
-            pago.fecha_pago = datetime.utcnow()
+    if not is_valid:
+        logger.error(
+            f"Webhook Vita: Firma inválida "
+            f"(entorno={vitawallet_service.environment})"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Firma de webhook inválida"
+        )
 
-            # Si tenemos el transaction_id de Vita, guardarlo
-            if evento.get("transaction_id"):
-                pago.referencia_pago = str(evento["transaction_id"])
+    event_id = webhook_service.obtener_event_id(body, body_bytes)
 
-            db.commit()
+    try:
+        registro_id = webhook_service.registrar_evento(
+            proveedor=webhook_service.PROVEEDOR_VITA,
+            event_id=event_id,
+            event_type=body.get("event_type"),
+            payload=body,
+            db=db
+        )
+    except Exception as e:
+        # Sin registro no hay ack: Vita reintentará la entrega
+        logger.error(f"Webhook Vita: Error registrando evento {event_id}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No se pudo registrar el evento"
+        )
 
-            # Procesar beneficios (desbloquear documento, actualizar nivel, etc.)
-            try:
-                beneficios = procesar_pago_exitoso(pago.id, db)
-                logger.info(f"Beneficios procesados: {beneficios}")
-            except Exception as e:
-                logger.error(f"Error procesando beneficios: {str(e)}")
-                # El pago ya está marcado como exitoso, los beneficios se pueden
-                # procesar manualmente si fallan
+    if registro_id is None:
+        logger.info(f"Webhook Vita duplicado ignorado: event_id={event_id}")
+        return {
+            "status": "ok",
+            "message": "Evento ya recibido anteriormente",
+            "event_id": event_id
+        }
 
-            return {
-                "status": "ok",
-                "message": "Pago procesado exitosamente",
-                "pago_id": pago.id,
-                "caso_id": pago.caso_id
-            }
+    logger.info(f"Webhook Vita registrado: event_id={event_id}, type={body.get('event_type')}")
 
-        elif vitawallet_service.es_pago_fallido(evento):
-            # PAGO FALLIDO
-            logger.info(f"Procesando pago fallido: pago_id={pago.id}, status={evento['status']}")
+    # Aplicar en background (después de enviar la respuesta)
+    background_tasks.add_task(webhook_service.procesar_eventos_pendientes)
 
-            pago.estado = EstadoPago.FALLIDO
-            pago.notas_admin = f"Fallido via webhook: {evento['status']} - {evento.get('event_type')}"
+    return {
+        "status": "ok",
+        "message": "Evento recibido",
+        "event_id": event_id
+    }
 
-            db.commit()
 
-            return {
-                "status": "ok",
-                "message": "Pago marcado como fallido",
-                "pago_id": pago.id
-            }
+@router.post("/livekit")
+async def webhook_livekit(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Recibe eventos de LiveKit (firmados con un JWT en Authorization)
 
-        else:
-            # Estado no reconocido o pendiente
-            logger.info(
-                f"Evento con estado no procesable: {evento['status']}, "
-                f"event_type={evento['event_type']}"
-            )
+    - room_finished: cierra la sesión del caso
+    - participant_left (identidad user-*): cierra la sesión y elimina el room
+      de inmediato, sin esperar la limpieza periódica
 
-            return {
-                "status": "ok",
-                "message": "Evento recibido pero no requiere acción",
-                "event_type": evento["event_type"],
-                "status": evento["status"]
-            }
+    Igual que Vita: se verifica, se registra en webhook_events (idempotente por
+    el id del evento) y se aplica en background. La sesión se finaliza con
+    sesion_service.finalizar_sesion_caso (fecha_fin_sesion, duración y
+    sesiones_diarias en una sola transacción).
+    """
+    from livekit import api as lk_api
+    from google.protobuf.json_format import MessageToDict
+
+    if not authorization:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Header Authorization requerido"
+        )
+
+    body_bytes = await request.body()
+    receptor = lk_api.WebhookReceiver(
+        lk_api.TokenVerifier(settings.LIVEKIT_API_KEY, settings.LIVEKIT_API_SECRET)
+    )
+    try:
+        evento = receptor.receive(
+            body_bytes.decode("utf-8"),
+            authorization.removeprefix("Bearer ").strip()
+        )
+    except Exception as e:
+        logger.warning(f"Webhook LiveKit: Firma inválida: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Firma de webhook inválida"
+        )
 
-    except HTTPException:
-        raise
+    payload = MessageToDict(evento)
+    event_id = evento.id or webhook_service.obtener_event_id(payload, body_bytes)
+
+    if evento.event not in webhook_service.EVENTOS_FIN_SESION_LIVEKIT:
+        # Eventos que no afectan la sesión: ack sin registrarlos
+        return {"status": "ok", "message": "Evento ignorado", "event_id": event_id}
+
+    try:
+        registro_id = webhook_service.registrar_evento(
+            proveedor=webhook_service.PROVEEDOR_LIVEKIT,
+            event_id=event_id,
+            event_type=evento.event,
+            payload=payload,
+            db=db
+        )
     except Exception as e:
-        logger.error(f"Error procesando webhook Vita: {str(e)}", exc_info=True)
-        # Retornamos 200 para evitar reintentos infinitos de Vita
-        # pero registramos el error
+        logger.error(f"Webhook LiveKit: Error registrando evento {event_id}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No se pudo registrar el evento"
+        )
+
+    if registro_id is None:
+        logger.info(f"Webhook LiveKit duplicado ignorado: event_id={event_id}")
         return {
-            "status": "error",
-            "message": f"Error interno: {str(e)}"
+            "status": "ok",
+            "message": "Evento ya recibido anteriormente",
+            "event_id": event_id
         }
-    finally:
-        db.close()
+
+    logger.info(f"Webhook LiveKit registrado: event_id={event_id}, type={evento.event}, room={evento.room.name}")
+
+    # El usuario salió: cerrar el room ya (el avatar deja de consumir)
+    if evento.event == "participant_left" and webhook_service.es_fin_de_sesion_livekit(payload):
+        background_tasks.add_task(livekit_service.eliminar_room, evento.room.name)
+
+    background_tasks.add_task(webhook_service.procesar_eventos_pendientes)
+
+    return {
+        "status": "ok",
+        "message": "Evento recibido",
+        "event_id": event_id
+    }
 
 
 @router.get("/vita/health")
@@ -284,7 +243,8 @@ async def vita_webhook_health():
     return {
         "status": "ok",
         "service": "vita_webhook",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        "vita_api": vitawallet_service.breaker.resumen()
     }
 
 
@@ -85,6 +85,7 @@ class CasoResponse(CasoBase):
     documento_generado: Optional[str] = None
     documento_desbloqueado: bool = False
     fecha_pago: Optional[datetime] = None
+    reintentar_generacion_en: Optional[datetime] = None
     analisis_fortaleza: Optional[Dict[str, Any]] = None
     analisis_calidad: Optional[Dict[str, Any]] = None
     analisis_jurisprudencia: Optional[Dict[str, Any]] = None
@@ -0,0 +1,118 @@
+"""
+Esquema de la extracción de datos de la conversación (salida del LLM)
+
+El mismo modelo sirve para:
+- Restringir la respuesta del modelo (structured outputs, JSON Schema estricto)
+- Validar campo por campo una respuesta parcial: los válidos se conservan y
+  solo los faltantes o inválidos se vuelven a pedir
+- Completar con valores por defecto lo que siga faltando
+"""
+import unicodedata
+from typing import Dict, Iterable, List, Literal, Tuple
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+TipoDocumentoExtraido = Literal["TUTELA", "DERECHO_PETICION"]
+
+
+class ExtraccionConversacion(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    tipo_documento: TipoDocumentoExtraido = "TUTELA"
+    razon_tipo_documento: str = ""
+    hechos: str = ""
+    ciudad_de_los_hechos: str = ""
+    derechos_vulnerados: str = ""
+    entidad_accionada: str = ""
+    direccion_entidad: str = ""
+    pretensiones: str = ""
+    fundamentos_derecho: str = ""
+    pruebas: str = ""
+    actua_en_representacion: bool = False
+    nombre_representado: str = ""
+    identificacion_representado: str = ""
+    relacion_representado: str = ""
+    tipo_representado: str = ""
+    hubo_derecho_peticion_previo: bool = False
+    detalle_derecho_peticion_previo: str = ""
+    tiene_perjuicio_irremediable: bool = False
+    es_procedente_tutela: bool = False
+    razon_improcedencia: str = ""
+    # Por defecto derecho de petición (subsidiariedad)
+    tipo_documento_recomendado: TipoDocumentoExtraido = "DERECHO_PETICION"
+
+    @field_validator("tipo_documento", "tipo_documento_recomendado", mode="before")
+    @classmethod
+    def normalizar_tipo(cls, v):
+        if isinstance(v, str):
+            # "Derecho de petición" -> "DERECHO_PETICION"
+            sin_tildes = unicodedata.normalize("NFKD", v).encode("ascii", "ignore").decode()
+            return sin_tildes.strip().upper().replace(" ", "_").replace("_DE_", "_")
+        return v
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def nulo_a_vacio(cls, v, info):
+        if v is None and cls.model_fields[info.field_name].annotation is str:
+            return ""
+        return v
+
+
+CAMPOS = tuple(ExtraccionConversacion.model_fields)
+
+
+def esquema_estricto(campos: Iterable[str] = CAMPOS) -> dict:
+    """
+    JSON Schema para structured outputs en modo estricto (solo los campos
+    pedidos, todos requeridos, sin propiedades adicionales ni defaults).
+    """
+    completo = ExtraccionConversacion.model_json_schema()["properties"]
+    propiedades = {}
+    for campo in campos:
+        propiedad = {k: v for k, v in completo[campo].items() if k not in ("default", "title")}
+        propiedades[campo] = propiedad
+    return {
+        "type": "object",
+        "properties": propiedades,
+        "required": list(propiedades),
+        "additionalProperties": False,
+    }
+
+
+def formato_respuesta(campos: Iterable[str] = CAMPOS) -> dict:
+    """response_format de chat.completions para los campos pedidos."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "extraccion_conversacion",
+            "strict": True,
+            "schema": esquema_estricto(campos),
+        },
+    }
+
+
+def validar_parcial(datos: dict, campos: Iterable[str] = CAMPOS) -> Tuple[Dict, List[str]]:
+    """
+    Valida cada campo por separado.
+
+    Returns:
+        (valores válidos ya normalizados, campos faltantes o inválidos)
+    """
+    validos = {}
+    pendientes = []
+    for campo in campos:
+        if campo not in datos:
+            pendientes.append(campo)
+            continue
+        try:
+            modelo = ExtraccionConversacion.model_validate({campo: datos[campo]})
+        except ValidationError:
+            pendientes.append(campo)
+            continue
+        validos[campo] = getattr(modelo, campo)
+    return validos, pendientes
+
+
+def completar_con_defaults(validos: dict) -> dict:
+    """Extracción completa: los campos que sigan faltando toman su valor por defecto."""
+    return ExtraccionConversacion.model_validate(validos).model_dump()
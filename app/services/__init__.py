@@ -16,10 +16,20 @@ from . import limpieza_service
 # Vita Wallet - Pasarela de pagos
 from . import vitawallet_service
 
+# Webhooks de pasarelas (ledger + procesamiento asíncrono)
+from . import webhook_service
+from . import reconciliacion_service
+
+# Catálogo de referencias (entidades públicas y derechos)
+from . import catalogo_service
+
 __all__ = [
     "nivel_service",
     "sesion_service",
     "pago_service",
     "limpieza_service",
     "vitawallet_service",
+    "catalogo_service",
+    "webhook_service",
+    "reconciliacion_service",
 ]
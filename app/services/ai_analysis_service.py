@@ -3,10 +3,7 @@ Servicio de análisis de calidad y validación de documentos legales generados c
 """
 import re
 from typing import Dict, List, Tuple
-from openai import OpenAI
-from ..core.config import settings
-
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+from . import llm_service
 
 
 def validar_jurisprudencia(documento: str) -> Dict:
@@ -80,7 +77,8 @@ Responde en formato JSON:
 }}
 """
 
-        response = client.chat.completions.create(
+        response = llm_service.completar(
+            "validar_jurisprudencia",
             model="gpt-5.1-2025-11-13",
             messages=[
                 {
@@ -226,7 +224,8 @@ Responde en formato JSON:
         else:
             system_message = "Eres un revisor experto de documentos legales en Colombia. Evalúas la calidad de acciones de tutela."
 
-        response = client.chat.completions.create(
+        response = llm_service.completar(
+            "analizar_calidad_documento",
             model="gpt-5.1-2025-11-13",
             messages=[
                 {
@@ -374,7 +373,8 @@ Responde en formato JSON:
     try:
         system_message = "Eres un abogado constitucionalista experto que evalúa la viabilidad de acciones de tutela en Colombia." if tipo_documento == "TUTELA" else "Eres un abogado experto en derecho administrativo colombiano que evalúa la viabilidad de derechos de petición."
 
-        response = client.chat.completions.create(
+        response = llm_service.completar(
+            "analizar_fortaleza_caso",
             model="gpt-5.1-2025-11-13",
             messages=[
                 {
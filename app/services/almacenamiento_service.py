@@ -0,0 +1,372 @@
+"""
+Almacenamiento de archivos subidos (evidencias de reembolso)
+
+- Límite de recepción (leer_formulario): un Content-Length mayor al límite se
+  rechaza antes de leer el cuerpo, y el parseo multipart corta el stream apenas
+  lo supera (clientes sin Content-Length o que mienten)
+- Copia por bloques desde el temporal del parser al almacenamiento: acota la
+  memoria al hashear y guardar (la recepción ya la acota leer_formulario)
+- Tipo validado por magic bytes en el primer bloque (y extensión coherente)
+- Direccionado por contenido: la ruta es el SHA-256 del archivo, así que
+  subir dos veces el mismo documento no duplica el almacenamiento
+- Backend intercambiable: disco local hoy (STORAGE_BACKEND=local); un object
+  store (S3/GCS) se agrega implementando BackendAlmacenamiento
+- Privado: ALMACENAMIENTO_DIR no se monta como estático; los archivos se sirven
+  solo por GET /casos/{id}/evidencia (autenticado)
+
+El disco se escribe con asyncio.to_thread (sin bloquear el event loop).
+
+Las imágenes tienen vistas previas reducidas (JPEG) generadas bajo demanda
+y guardadas en previews/; requieren Pillow (si no está, se sirve el original).
+"""
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, Dict, NamedTuple, Optional
+
+from fastapi import Request
+from starlette.datastructures import FormData, UploadFile
+from starlette.formparsers import FormParser, MultiPartParser
+
+from ..core.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow es opcional: sin él no hay vistas previas
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BLOQUE = 256 * 1024  # 256 KB
+
+MAX_TAMANO_EVIDENCIA = 10 * 1024 * 1024  # 10 MB
+
+# Holgura del cuerpo sobre el archivo: encabezados multipart y campos de texto
+MARGEN_FORMULARIO = 64 * 1024
+MAX_TAMANO_CAMPO = 16 * 1024  # cada campo de texto (ej: motivo)
+MAX_CAMPOS = 10
+
+# Magic bytes -> (extensiones aceptadas, content type)
+TIPOS_PERMITIDOS = {
+    b'\x25\x50\x44\x46': (['.pdf'], "application/pdf"),          # PDF (%PDF)
+    b'\xff\xd8\xff':      (['.jpg', '.jpeg'], "image/jpeg"),     # JPEG
+    b'\x89\x50\x4e\x47': (['.png'], "image/png"),                # PNG
+}
+
+PREFIJO_EVIDENCIAS = "evidencias"
+PREFIJO_PREVIEWS = "previews"
+
+# Ancho máximo de las vistas previas (px)
+ANCHO_PREVIEW = 800
+CALIDAD_PREVIEW = 80
+
+_PATRON_CONTENIDO = re.compile(r"^[0-9a-f]{64}$")
+
+TIPOS_CON_PREVIEW = {"image/jpeg", "image/png"}
+
+
+class ArchivoNoPermitido(ValueError):
+    """Archivo rechazado (tamaño, tipo o extensión); el mensaje es apto para el usuario."""
+
+
+class CuerpoDemasiadoGrande(ArchivoNoPermitido):
+    """El cuerpo de la solicitud supera el límite (HTTP 413)."""
+
+
+class ArchivoGuardado(NamedTuple):
+    clave: str            # Ruta relativa dentro del almacenamiento (ej: evidencias/ab/cd/<sha256>.pdf)
+    sha256: str
+    tamano: int
+    content_type: str
+    duplicado: bool       # True si el contenido ya existía
+
+
+def detectar_tipo(primer_bloque: bytes) -> Optional[tuple]:
+    """(extensiones, content_type) según los magic bytes, o None si no es un tipo permitido."""
+    for magic, tipo in TIPOS_PERMITIDOS.items():
+        if primer_bloque.startswith(magic):
+            return tipo
+    return None
+
+
+def clave_por_contenido(sha256: str, extension: str, prefijo: str = PREFIJO_EVIDENCIAS) -> str:
+    """evidencias/ab/cd/abcd...ef.pdf (dos niveles para no llenar un solo directorio)."""
+    return f"{prefijo}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def clave_desde_url(url: str) -> Optional[str]:
+    """
+    '/uploads/evidencias/..' -> 'evidencias/..' (también URLs antiguas de evidencias_reembolso).
+
+    evidencia_rechazo_url conserva el formato '/uploads/<clave>' como referencia
+    interna; /uploads ya no sirve archivos (solo redirige al endpoint autenticado).
+    """
+    if not url or not url.startswith("/uploads/"):
+        return None
+    return url[len("/uploads/"):]
+
+
+def hash_de_clave(clave: str) -> Optional[str]:
+    """SHA-256 si la clave es direccionada por contenido; None para archivos antiguos."""
+    nombre = Path(clave).stem
+    return nombre if _PATRON_CONTENIDO.match(nombre) else None
+
+
+def content_type_de(clave: str) -> str:
+    return mimetypes.guess_type(clave)[0] or "application/octet-stream"
+
+
+class BackendAlmacenamiento:
+    """Interfaz de almacenamiento. Las claves son rutas relativas con '/'."""
+
+    async def guardar(self, bloques: AsyncIterator[bytes], clave_final) -> ArchivoGuardado:
+        """
+        Guarda el contenido recibido por bloques.
+
+        Args:
+            bloques: Iterador asíncrono de bloques (ya validados)
+            clave_final: Función (sha256) -> clave, conocida solo al terminar de leer
+        """
+        raise NotImplementedError
+
+    def url(self, clave: str) -> str:
+        """URL pública (o firmada) del archivo."""
+        raise NotImplementedError
+
+    def ruta_local(self, clave: str) -> Optional[Path]:
+        """Ruta en disco si el backend es local (permite servir con sendfile); None si no."""
+        return None
+
+
+class AlmacenamientoLocal(BackendAlmacenamiento):
+    """
+    Disco local bajo ALMACENAMIENTO_DIR (privado, no se sirve como estático).
+
+    Las evidencias guardadas antes en UPLOADS_DIR se siguen leyendo de ahí
+    (directorio_legado) hasta que se muevan.
+    """
+
+    def __init__(self, directorio: str, directorio_legado: Optional[str] = None):
+        self.directorio = Path(directorio)
+        self.directorio_legado = Path(directorio_legado) if directorio_legado else None
+        self._tmp = self.directorio / ".tmp"
+
+    @staticmethod
+    def _resolver(base: Path, clave: str) -> Optional[Path]:
+        ruta = (base / clave).resolve()
+        # Evita salir del directorio con claves manipuladas (../)
+        if base.resolve() not in ruta.parents:
+            return None
+        return ruta
+
+    def ruta_local(self, clave: str) -> Optional[Path]:
+        ruta = self._resolver(self.directorio, clave)
+        if ruta is not None and self.directorio_legado is not None and not ruta.exists():
+            legado = self._resolver(self.directorio_legado, clave)
+            if legado is not None and legado.exists():
+                return legado
+        return ruta
+
+    def url(self, clave: str) -> str:
+        return f"/uploads/{clave}"
+
+    async def guardar(self, bloques: AsyncIterator[bytes], clave_final) -> ArchivoGuardado:
+        await asyncio.to_thread(self._tmp.mkdir, parents=True, exist_ok=True)
+        fd, ruta_tmp = await asyncio.to_thread(tempfile.mkstemp, dir=self._tmp)
+        archivo = os.fdopen(fd, "wb")
+
+        digest = hashlib.sha256()
+        tamano = 0
+        try:
+            async for bloque in bloques:
+                digest.update(bloque)
+                tamano += len(bloque)
+                await asyncio.to_thread(archivo.write, bloque)
+            await asyncio.to_thread(archivo.close)
+
+            sha256 = digest.hexdigest()
+            clave = clave_final(sha256)
+            duplicado = await asyncio.to_thread(self._mover, Path(ruta_tmp), clave)
+        except BaseException:
+            archivo.close()
+            await asyncio.to_thread(_eliminar, Path(ruta_tmp))
+            raise
+
+        return ArchivoGuardado(clave, sha256, tamano, "", duplicado)
+
+    def _mover(self, ruta_tmp: Path, clave: str) -> bool:
+        """Mueve el temporal a su ruta final; si el contenido ya existe, lo descarta."""
+        destino = self.directorio / clave
+        if destino.exists():
+            ruta_tmp.unlink(missing_ok=True)
+            return True
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(ruta_tmp, destino)  # atómico: nunca se ve un archivo a medio escribir
+        return False
+
+
+def _eliminar(ruta: Path):
+    ruta.unlink(missing_ok=True)
+
+
+_BACKENDS: Dict[str, type] = {
+    "local": AlmacenamientoLocal,
+}
+
+_backend: Optional[BackendAlmacenamiento] = None
+
+
+def obtener_backend() -> BackendAlmacenamiento:
+    global _backend
+    if _backend is None:
+        clase = _BACKENDS.get(settings.STORAGE_BACKEND)
+        if clase is None:
+            raise RuntimeError(f"STORAGE_BACKEND no soportado: {settings.STORAGE_BACKEND}")
+        _backend = clase(settings.ALMACENAMIENTO_DIR, directorio_legado=settings.UPLOADS_DIR)
+    return _backend
+
+
+def _mensaje_limite(max_tamano: int) -> str:
+    return f"El archivo no puede superar {max_tamano // (1024 * 1024)} MB"
+
+
+async def _stream_limitado(request: Request, limite: int, max_tamano: int) -> AsyncIterator[bytes]:
+    recibido = 0
+    async for bloque in request.stream():
+        recibido += len(bloque)
+        if recibido > limite:
+            raise CuerpoDemasiadoGrande(_mensaje_limite(max_tamano))
+        yield bloque
+
+
+async def leer_formulario(request: Request, max_tamano: int = MAX_TAMANO_EVIDENCIA) -> FormData:
+    """
+    Parsea el formulario de una subida con límites aplicados a la recepción.
+
+    FastAPI/Starlette parsean Form/File antes de llamar al endpoint y sin
+    límite para los archivos; las rutas con subidas leen el cuerpo con esta
+    función en su lugar:
+    - Content-Length > max_tamano + MARGEN_FORMULARIO: rechazo sin leer el cuerpo
+    - El stream se corta al superar ese total (sin Content-Length, o si miente)
+    - A lo sumo un archivo, MAX_CAMPOS campos de hasta MAX_TAMANO_CAMPO
+
+    El llamador debe cerrar el formulario (await formulario.close()).
+
+    Raises:
+        CuerpoDemasiadoGrande: Si el cuerpo supera el límite
+        MultiPartException: Si el multipart es inválido o excede campos/archivos
+    """
+    limite = max_tamano + MARGEN_FORMULARIO
+    longitud = request.headers.get("content-length", "")
+    if longitud.isdigit() and int(longitud) > limite:
+        raise CuerpoDemasiadoGrande(_mensaje_limite(max_tamano))
+
+    stream = _stream_limitado(request, limite, max_tamano)
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        parser = MultiPartParser(
+            request.headers, stream,
+            max_files=1, max_fields=MAX_CAMPOS, max_part_size=MAX_TAMANO_CAMPO,
+        )
+    else:
+        parser = FormParser(request.headers, stream)
+    return await parser.parse()
+
+
+async def guardar_evidencia(archivo: UploadFile, max_tamano: int = MAX_TAMANO_EVIDENCIA) -> ArchivoGuardado:
+    """
+    Valida y guarda una evidencia subida (ya recibida con leer_formulario).
+
+    Se copia por bloques del temporal del parser al almacenamiento: la memoria
+    usada no depende del tamaño del archivo. El corte por tamaño de aquí es una
+    segunda barrera; la recepción la limita leer_formulario.
+
+    Raises:
+        ArchivoNoPermitido: Si supera max_tamano, el tipo no es PDF/JPG/PNG
+                            o la extensión no corresponde al contenido
+    """
+    primer_bloque = await archivo.read(TAMANO_BLOQUE)
+
+    tipo = detectar_tipo(primer_bloque)
+    if not tipo:
+        raise ArchivoNoPermitido("Tipo de archivo no permitido. Solo se aceptan PDF, JPG y PNG")
+    extensiones, content_type = tipo
+
+    extension = os.path.splitext(archivo.filename or "")[1].lower()
+    if extension not in extensiones:
+        raise ArchivoNoPermitido("La extensión del archivo no corresponde con su contenido")
+
+    async def bloques() -> AsyncIterator[bytes]:
+        leido = 0
+        bloque = primer_bloque
+        while bloque:
+            leido += len(bloque)
+            if leido > max_tamano:
+                raise ArchivoNoPermitido(_mensaje_limite(max_tamano))
+            yield bloque
+            bloque = await archivo.read(TAMANO_BLOQUE)
+
+    # .jpeg y .jpg se guardan igual para que el mismo contenido deduplique
+    extension_canonica = extensiones[0]
+    guardado = await obtener_backend().guardar(
+        bloques(), lambda sha256: clave_por_contenido(sha256, extension_canonica)
+    )
+    guardado = guardado._replace(content_type=content_type)
+
+    logger.info(
+        f"📎 Evidencia guardada: {guardado.clave} ({guardado.tamano} bytes"
+        f"{', duplicada' if guardado.duplicado else ''})"
+    )
+    return guardado
+
+
+def _generar_preview(origen: Path, destino: Path, ancho: int):
+    """Reduce la imagen a `ancho` px (respetando orientación EXIF) y la guarda como JPEG."""
+    with Image.open(origen) as imagen:
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen.thumbnail((ancho, ancho * 4))
+        if imagen.mode not in ("RGB", "L"):
+            imagen = imagen.convert("RGB")
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        fd, ruta_tmp = tempfile.mkstemp(dir=destino.parent, suffix=".jpg")
+        try:
+            with os.fdopen(fd, "wb") as archivo:
+                imagen.save(archivo, "JPEG", quality=CALIDAD_PREVIEW, optimize=True, progressive=True)
+            os.replace(ruta_tmp, destino)
+        except BaseException:
+            Path(ruta_tmp).unlink(missing_ok=True)
+            raise
+
+
+async def obtener_preview(clave: str, ancho: int = ANCHO_PREVIEW) -> Optional[Path]:
+    """
+    Vista previa JPEG reducida de una imagen (se genera la primera vez y queda en disco).
+
+    Returns:
+        Ruta de la vista previa, o None si no aplica (PDF, sin Pillow, backend no local)
+    """
+    if Image is None or content_type_de(clave) not in TIPOS_CON_PREVIEW:
+        return None
+
+    backend = obtener_backend()
+    origen = backend.ruta_local(clave)
+    if origen is None:
+        return None
+
+    destino = backend.ruta_local(f"{PREFIJO_PREVIEWS}/{Path(clave).stem}_{ancho}.jpg")
+    if destino is None:
+        return None
+    if await asyncio.to_thread(destino.exists):
+        return destino
+
+    try:
+        await asyncio.to_thread(_generar_preview, origen, destino, ancho)
+    except Exception as e:
+        logger.warning(f"No se pudo generar vista previa de {clave}: {e}")
+        return None
+    return destino
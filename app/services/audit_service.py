@@ -16,6 +16,7 @@ ACCION_APROBAR_REEMBOLSO = "APROBAR_REEMBOLSO"
 ACCION_RECHAZAR_REEMBOLSO = "RECHAZAR_REEMBOLSO"
 ACCION_PROCESAR_REEMBOLSO = "PROCESAR_REEMBOLSO"
 ACCION_DESBLOQUEAR_DOCUMENTO = "DESBLOQUEAR_DOCUMENTO"
+ACCION_IMPORTAR_CATALOGO = "IMPORTAR_CATALOGO"
 
 
 def registrar_auditoria(
@@ -0,0 +1,90 @@
+"""
+Servicio de creación de casos
+
+El caso de una sesión nueva se crea con un solo INSERT ... RETURNING: el id
+se toma de la secuencia en un CTE y room_name ("caso-{id}") se calcula en el
+mismo statement (antes: INSERT, commit, refresh, UPDATE room_name, commit,
+refresh). Es el camino crítico de cada consulta.
+"""
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, cast, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from ..models.caso import Caso, TipoDocumento, EstadoCaso
+from ..models.user import User
+from .livekit_service import PREFIJO_ROOM_CASO
+
+
+def room_name_de_caso(caso_id: int) -> str:
+    """Nombre del room LiveKit del caso (formato esperado por el agente: caso-123)."""
+    return f"{PREFIJO_ROOM_CASO}{caso_id}"
+
+
+def datos_solicitante(usuario: User) -> dict:
+    """
+    Datos del solicitante pre-llenados desde el perfil.
+
+    Se toman del usuario que ya cargó la autenticación, sin consultas extra.
+    """
+    return {
+        "nombre_solicitante": f"{usuario.nombre} {usuario.apellido}",
+        "email_solicitante": usuario.email,
+        "identificacion_solicitante": usuario.identificacion or None,
+        "direccion_solicitante": usuario.direccion or None,
+        "telefono_solicitante": usuario.telefono or None,
+    }
+
+
+def crear_caso_sesion(
+    usuario: User,
+    db: Session,
+    fecha_inicio_sesion: Optional[datetime] = None,
+) -> dict:
+    """
+    Crea el caso de una sesión nueva (BORRADOR, tutela) con un solo statement y un commit.
+
+    Args:
+        usuario: Usuario autenticado (fuente de los datos del solicitante)
+        db: Sesión de base de datos
+        fecha_inicio_sesion: Solo el flujo legacy (/livekit/token) la marca al crear
+
+    Returns:
+        dict: caso_id, room_name, session_id, tipo_documento, nombre_solicitante
+    """
+    session_id = str(uuid.uuid4())
+    valores = {
+        "user_id": usuario.id,
+        "tipo_documento": TipoDocumento.TUTELA,
+        "estado": EstadoCaso.BORRADOR,
+        "session_id": session_id,
+        "fecha_inicio_sesion": fecha_inicio_sesion,
+        **datos_solicitante(usuario),
+    }
+
+    columnas = Caso.__table__.c
+    nuevo_id = select(
+        func.nextval(func.pg_get_serial_sequence("casos", "id")).label("id")
+    ).cte("nuevo_caso_id")
+
+    seleccion = select(
+        nuevo_id.c.id,
+        literal(PREFIJO_ROOM_CASO) + cast(nuevo_id.c.id, String),
+        *(literal(valor, type_=columnas[nombre].type) for nombre, valor in valores.items()),
+    )
+    caso_id = db.execute(
+        insert(Caso)
+        .from_select(["id", "room_name", *valores], seleccion)
+        .returning(Caso.id)
+    ).scalar_one()
+    db.commit()
+
+    return {
+        "caso_id": caso_id,
+        "room_name": room_name_de_caso(caso_id),
+        "session_id": session_id,
+        "tipo_documento": TipoDocumento.TUTELA.value,
+        "nombre_solicitante": valores["nombre_solicitante"],
+    }
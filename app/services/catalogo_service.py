@@ -0,0 +1,516 @@
+"""
+Servicio del catálogo de referencias (entidades públicas y derechos fundamentales).
+
+El catálogo vive en base de datos y cada worker sirve un snapshot en memoria:
+- Importación masiva CSV/JSON con COPY a una tabla temporal + upsert
+- Cada importación registra una nueva versión en catalogo_versiones
+- Cada worker revisa la versión cada CATALOGO_RECARGA_SEGUNDOS (job por worker
+  del scheduler) y recarga el snapshot sin reiniciar (hot reload), fuera del
+  camino de los requests
+- Si la BD no tiene catálogo todavía, se sirven los datos de datos_colombia
+"""
+import csv
+import io
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..core.database import SessionLocal
+from ..core.datos_colombia import DERECHOS_FUNDAMENTALES, ENTIDADES_PUBLICAS
+from ..core.indice_entidades import IndiceEntidades, tokenizar
+from ..core.respuestas_precomputadas import CuerpoPrecomputado
+from ..models.catalogo import EntidadPublica, DerechoFundamental, CatalogoVersion
+
+logger = logging.getLogger(__name__)
+
+# Columnas aceptadas en la importación (el orden es el del CSV sin encabezado)
+COLUMNAS_ENTIDAD = ("nombre", "tipo", "direccion", "ciudad", "nit")
+COLUMNAS_OBLIGATORIAS = ("nombre", "tipo")
+
+FORMATOS_IMPORTACION = ("csv", "json")
+
+# Advisory lock de la siembra inicial (un solo worker siembra)
+LOCK_SIEMBRA = "catalogo:siembra"
+
+
+class CatalogoSnapshot:
+    """
+    Vista inmutable del catálogo en una versión dada.
+    Se reemplaza completa al recargar (los lectores nunca ven un estado a medias).
+    """
+
+    def __init__(self, version: int, entidades: List[dict], derechos: List[dict]):
+        self.version = version
+        self.derechos = derechos
+        self.total_entidades = len(entidades)
+
+        # {tipo: [nombres]} conservando el orden de carga
+        self.entidades_por_tipo: Dict[str, List[str]] = {}
+        for entidad in entidades:
+            self.entidades_por_tipo.setdefault(entidad["tipo"], []).append(entidad["nombre"])
+
+        # Detalle por nombre normalizado (para autollenar dirección/NIT)
+        self._detalles: Dict[str, dict] = {}
+        for entidad in entidades:
+            clave = " ".join(tokenizar(entidad["nombre"]))
+            actual = self._detalles.get(clave)
+            if actual is None or (not actual.get("direccion") and entidad.get("direccion")):
+                self._detalles[clave] = entidad
+
+        self.indice = IndiceEntidades(
+            (entidad["nombre"], entidad["tipo"]) for entidad in entidades
+        )
+
+        # Cuerpos HTTP ya serializados/comprimidos de esta versión
+        self._respuestas: Dict[Hashable, CuerpoPrecomputado] = {}
+
+    def respuesta(self, clave: Hashable, construir: Callable[[], object]) -> CuerpoPrecomputado:
+        """
+        Cuerpo precomputado para la clave dada (se construye una vez por versión).
+        Al recargar el catálogo se descartan junto con el snapshot anterior.
+        """
+        cuerpo = self._respuestas.get(clave)
+        if cuerpo is None:
+            cuerpo = CuerpoPrecomputado(construir())
+            self._respuestas[clave] = cuerpo
+        return cuerpo
+
+    def cuerpo_derechos(self, categoria: Optional[str] = None) -> CuerpoPrecomputado:
+        if categoria not in ("fundamentales", "conexidad"):
+            categoria = None
+
+        def construir():
+            derechos = self.obtener_derechos(categoria)
+            return {"derechos": derechos, "total": len(derechos)}
+
+        return self.respuesta(("derechos", categoria), construir)
+
+    def cuerpo_entidades(self, tipo: Optional[str] = None) -> CuerpoPrecomputado:
+        if tipo:
+            tipo = tipo.upper()
+            if tipo not in self.entidades_por_tipo:
+                # Tipo desconocido: se responde la lista plana sin cachear la clave
+                entidades = self.obtener_entidades()
+                return CuerpoPrecomputado({"tipo": tipo, "entidades": entidades, "total": len(entidades)})
+
+            def construir():
+                entidades = self.entidades_por_tipo[tipo]
+                return {"tipo": tipo, "entidades": entidades, "total": len(entidades)}
+
+            return self.respuesta(("entidades", tipo), construir)
+
+        return self.respuesta(("entidades", None), lambda: {
+            "categorias": self.entidades_por_tipo,
+            "total_categorias": len(self.entidades_por_tipo),
+        })
+
+    def precalentar(self):
+        """Serializa y comprime de antemano las respuestas de referencias."""
+        for categoria in (None, "fundamentales", "conexidad"):
+            self.cuerpo_derechos(categoria)
+        self.cuerpo_entidades()
+        for tipo in self.entidades_por_tipo:
+            self.cuerpo_entidades(tipo)
+
+    def obtener_derechos(self, categoria: Optional[str] = None) -> List[dict]:
+        """Derechos filtrados por 'fundamentales' o 'conexidad' (mismo criterio que datos_colombia)."""
+        if categoria == "fundamentales":
+            return [d for d in self.derechos if "nota" not in d]
+        elif categoria == "conexidad":
+            return [d for d in self.derechos if "nota" in d]
+        return self.derechos
+
+    def obtener_entidades(self, tipo: Optional[str] = None) -> List[str]:
+        """Nombres de un tipo de entidad, o todos como lista plana."""
+        if tipo and tipo.upper() in self.entidades_por_tipo:
+            return self.entidades_por_tipo[tipo.upper()]
+
+        todas = []
+        for nombres in self.entidades_por_tipo.values():
+            todas.extend(nombres)
+        return todas
+
+    def buscar(self, termino: str, limite: Optional[int] = 20) -> List[dict]:
+        return self.indice.buscar(termino, limite=limite)
+
+    def detalle_entidad(self, nombre: str) -> Optional[dict]:
+        """
+        Datos de una entidad (dirección, ciudad, NIT) a partir del nombre mencionado.
+
+        Primero busca coincidencia exacta (sin tildes ni mayúsculas); si no la hay,
+        solo acepta el resultado de la búsqueda cuando es único (evita autollenar
+        con la entidad equivocada).
+        """
+        if not nombre:
+            return None
+
+        detalle = self._detalles.get(" ".join(tokenizar(nombre)))
+        if detalle:
+            return detalle
+
+        resultados = self.buscar(nombre, limite=2)
+        if len(resultados) == 1:
+            return self._detalles.get(" ".join(tokenizar(resultados[0]["entidad"])))
+        return None
+
+
+# Snapshot activo del worker y control de recarga
+_snapshot: Optional[CatalogoSnapshot] = None
+_lock_recarga = threading.Lock()
+
+
+def _snapshot_desde_literales() -> CatalogoSnapshot:
+    """Snapshot de respaldo (versión 0) con los datos de datos_colombia."""
+    entidades = [
+        {"nombre": nombre, "tipo": tipo, "direccion": None, "ciudad": None, "nit": None}
+        for tipo, nombres in ENTIDADES_PUBLICAS.items()
+        for nombre in nombres
+    ]
+    return CatalogoSnapshot(0, entidades, DERECHOS_FUNDAMENTALES)
+
+
+def _version_actual(db: Session) -> int:
+    return db.query(func.max(CatalogoVersion.id)).scalar() or 0
+
+
+def _cargar_snapshot(db: Session, version: int) -> CatalogoSnapshot:
+    """Lee el catálogo activo de la BD (solo columnas, sin instanciar modelos)."""
+    if version == 0:
+        return _snapshot_desde_literales()
+
+    filas = (
+        db.query(
+            EntidadPublica.nombre,
+            EntidadPublica.tipo,
+            EntidadPublica.direccion,
+            EntidadPublica.ciudad,
+            EntidadPublica.nit,
+        )
+        .filter(EntidadPublica.activo == True)  # noqa: E712
+        .order_by(EntidadPublica.tipo, EntidadPublica.id)
+        .all()
+    )
+    entidades = [
+        {"nombre": n, "tipo": t, "direccion": d, "ciudad": c, "nit": nit}
+        for n, t, d, c, nit in filas
+    ]
+
+    derechos = []
+    for d in db.query(DerechoFundamental).order_by(DerechoFundamental.orden, DerechoFundamental.id).all():
+        derecho = {"articulo": d.articulo, "derecho": d.derecho, "descripcion": d.descripcion}
+        if d.nota:
+            derecho["nota"] = d.nota
+        derechos.append(derecho)
+
+    if not derechos:
+        derechos = DERECHOS_FUNDAMENTALES
+
+    return CatalogoSnapshot(version, entidades, derechos)
+
+
+def recargar_catalogo(forzar: bool = False) -> CatalogoSnapshot:
+    """
+    Verifica la versión en BD y recarga el snapshot si cambió.
+
+    Args:
+        forzar: Recargar aunque la versión no haya cambiado
+    """
+    global _snapshot
+
+    db = SessionLocal()
+    try:
+        version = _version_actual(db)
+        if forzar or _snapshot is None or version != _snapshot.version:
+            inicio = time.monotonic()
+            nuevo = _cargar_snapshot(db, version)
+            nuevo.precalentar()
+            _snapshot = nuevo
+            logger.info(
+                f"📚 Catálogo v{version} cargado: {nuevo.total_entidades} entidades, "
+                f"{len(nuevo.derechos)} derechos ({(time.monotonic() - inicio) * 1000:.0f} ms)"
+            )
+    except Exception as e:
+        logger.error(f"❌ Error recargando catálogo: {str(e)}")
+        if _snapshot is None:
+            _snapshot = _snapshot_desde_literales()
+            _snapshot.precalentar()
+    finally:
+        db.close()
+
+    return _snapshot
+
+
+def obtener_catalogo() -> CatalogoSnapshot:
+    """
+    Snapshot vigente del catálogo.
+
+    Nunca recarga en el request: de eso se encarga el job recarga_catalogo.
+    Solo si el worker aún no tiene snapshot (la carga del arranque falló o no
+    ha terminado) se carga aquí una vez.
+    """
+    snapshot = _snapshot
+    if snapshot is not None:
+        return snapshot
+
+    with _lock_recarga:
+        if _snapshot is None:
+            recargar_catalogo()
+    return _snapshot
+
+
+def _filas_a_csv(filas: List[dict]) -> io.StringIO:
+    """Convierte filas JSON al CSV (sin encabezado) que consume COPY."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i, fila in enumerate(filas):
+        if not isinstance(fila, dict):
+            raise ValueError(f"Fila {i + 1}: se esperaba un objeto")
+        writer.writerow([
+            "" if fila.get(columna) is None else str(fila.get(columna))
+            for columna in COLUMNAS_ENTIDAD
+        ])
+    buffer.seek(0)
+    return buffer
+
+
+def _preparar_copy(contenido: bytes, formato: str):
+    """
+    Valida el archivo y retorna (columnas, buffer, opciones_copy).
+
+    - CSV: se envía tal cual a COPY (con encabezado); solo se valida el encabezado
+    - JSON: lista de objetos (o {"entidades": [...]}) convertida a CSV
+    """
+    formato = (formato or "").lower()
+    if formato not in FORMATOS_IMPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}. Use csv o json")
+
+    try:
+        texto = contenido.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("El archivo debe estar codificado en UTF-8")
+
+    if formato == "json":
+        try:
+            datos = json.loads(texto)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON inválido: {str(e)}")
+        if isinstance(datos, dict):
+            datos = datos.get("entidades")
+        if not isinstance(datos, list):
+            raise ValueError("El JSON debe ser una lista de entidades o {\"entidades\": [...]}")
+        return list(COLUMNAS_ENTIDAD), _filas_a_csv(datos), "FORMAT csv"
+
+    primera_linea = texto.split("\n", 1)[0]
+    encabezado = [c.strip().lower() for c in next(csv.reader([primera_linea]), [])]
+    desconocidas = [c for c in encabezado if c not in COLUMNAS_ENTIDAD]
+    if desconocidas:
+        raise ValueError(f"Columnas no reconocidas: {', '.join(desconocidas)}")
+    faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in encabezado]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+
+    return encabezado, io.StringIO(texto), "FORMAT csv, HEADER true"
+
+
+def importar_entidades(
+    contenido: bytes,
+    formato: str,
+    db: Session,
+    reemplazar: bool = False,
+    descripcion: Optional[str] = None,
+) -> dict:
+    """
+    Importa entidades de forma masiva con COPY y publica una nueva versión del catálogo.
+
+    El archivo se copia a una tabla temporal y desde ahí se hace un único
+    INSERT ... ON CONFLICT (nombre, tipo) DO UPDATE, todo en una transacción.
+
+    Args:
+        contenido: Bytes del archivo
+        formato: 'csv' (con encabezado nombre,tipo[,direccion,ciudad,nit]) o 'json'
+        db: Sesión de base de datos
+        reemplazar: Si True, desactiva las entidades que no vienen en el archivo
+        descripcion: Texto libre para el registro de versión
+
+    Returns:
+        Dict con version, filas leídas, upsertadas y desactivadas
+
+    Raises:
+        ValueError: Si el archivo no es válido
+    """
+    columnas, buffer, opciones = _preparar_copy(contenido, formato)
+
+    try:
+        conn = db.connection()
+        conn.execute(text("""
+            CREATE TEMP TABLE entidades_staging (
+                nombre TEXT, tipo TEXT, direccion TEXT, ciudad TEXT, nit TEXT
+            ) ON COMMIT DROP
+        """))
+
+        # COPY directo por el cursor del driver (misma transacción que la sesión)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY entidades_staging ({', '.join(columnas)}) FROM STDIN WITH ({opciones})",
+                buffer,
+            )
+            filas_leidas = cursor.rowcount
+        finally:
+            cursor.close()
+
+        upsertadas = conn.execute(text("""
+            INSERT INTO entidades_publicas
+                (nombre, tipo, direccion, ciudad, nit, activo, created_at, updated_at)
+            SELECT DISTINCT ON (trim(nombre), upper(trim(tipo)))
+                trim(nombre), upper(trim(tipo)),
+                NULLIF(trim(direccion), ''), NULLIF(trim(ciudad), ''), NULLIF(trim(nit), ''),
+                TRUE, now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc'
+            FROM entidades_staging
+            WHERE COALESCE(trim(nombre), '') <> '' AND COALESCE(trim(tipo), '') <> ''
+            ORDER BY trim(nombre), upper(trim(tipo))
+            ON CONFLICT (nombre, tipo) DO UPDATE SET
+                direccion = COALESCE(EXCLUDED.direccion, entidades_publicas.direccion),
+                ciudad = COALESCE(EXCLUDED.ciudad, entidades_publicas.ciudad),
+                nit = COALESCE(EXCLUDED.nit, entidades_publicas.nit),
+                activo = TRUE,
+                updated_at = EXCLUDED.updated_at
+        """)).rowcount
+
+        desactivadas = 0
+        if reemplazar:
+            desactivadas = conn.execute(text("""
+                UPDATE entidades_publicas e
+                SET activo = FALSE, updated_at = now() AT TIME ZONE 'utc'
+                WHERE e.activo
+                  AND NOT EXISTS (
+                      SELECT 1 FROM entidades_staging s
+                      WHERE trim(s.nombre) = e.nombre AND upper(trim(s.tipo)) = e.tipo
+                  )
+            """)).rowcount
+
+        version = CatalogoVersion(
+            descripcion=(descripcion or f"Importación {formato.lower()}")[:300],
+            registros=upsertadas,
+        )
+        db.add(version)
+        db.commit()
+        db.refresh(version)
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(
+        f"📥 Catálogo v{version.id}: {filas_leidas} filas leídas, "
+        f"{upsertadas} entidades upsertadas, {desactivadas} desactivadas"
+    )
+
+    return {
+        "version": version.id,
+        "filas_leidas": filas_leidas,
+        "entidades_upsertadas": upsertadas,
+        "entidades_desactivadas": desactivadas,
+    }
+
+
+def sembrar_catalogo_inicial(db: Session) -> Optional[int]:
+    """
+    Carga los datos de datos_colombia en las tablas si el catálogo nunca se ha importado.
+
+    Varios workers arrancando a la vez siembran una sola vez: la siembra corre
+    en una transacción con pg_advisory_xact_lock y la versión se vuelve a
+    verificar con el lock tomado (los demás esperan y encuentran la versión).
+
+    Returns:
+        Versión creada, o None si el catálogo ya existía
+    """
+    if _version_actual(db) > 0:
+        return None
+
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:clave))"), {"clave": LOCK_SIEMBRA})
+    if _version_actual(db) > 0:
+        db.rollback()  # suelta el lock
+        return None
+
+    # Derechos y entidades en la misma transacción (el commit de importar_entidades libera el lock)
+    db.execute(
+        insert(DerechoFundamental)
+        .values([
+            {
+                "articulo": d["articulo"],
+                "derecho": d["derecho"],
+                "descripcion": d["descripcion"],
+                "nota": d.get("nota"),
+                "orden": i,
+            }
+            for i, d in enumerate(DERECHOS_FUNDAMENTALES)
+        ])
+        .on_conflict_do_nothing(index_elements=["articulo"])
+    )
+
+    filas = [
+        {"nombre": nombre, "tipo": tipo}
+        for tipo, nombres in ENTIDADES_PUBLICAS.items()
+        for nombre in nombres
+    ]
+    resultado = importar_entidades(
+        json.dumps(filas).encode("utf-8"),
+        "json",
+        db,
+        descripcion="Carga inicial desde datos_colombia",
+    )
+    return resultado["version"]
+
+
+def buscar_entidades_db(
+    termino: str,
+    db: Session,
+    limite: int = 20,
+    incluir_inactivas: bool = False,
+) -> List[dict]:
+    """
+    Búsqueda por similitud directamente en BD (índice GIN pg_trgm sobre nombre).
+
+    Pensada para la curaduría desde el panel admin (ve también entidades
+    inactivas y la versión aún no recargada); el autocompletado público usa
+    el snapshot en memoria.
+    """
+    filtro_activo = "" if incluir_inactivas else "AND activo"
+    filas = db.execute(text(f"""
+        SELECT id, nombre, tipo, direccion, ciudad, nit, activo,
+               similarity(nombre, :termino) AS similitud
+        FROM entidades_publicas
+        WHERE (nombre % :termino OR nombre ILIKE :patron) {filtro_activo}
+        ORDER BY similitud DESC, length(nombre)
+        LIMIT :limite
+    """), {"termino": termino, "patron": f"%{termino}%", "limite": limite}).mappings().all()
+
+    return [
+        {**dict(fila), "similitud": round(float(fila["similitud"]), 3)}
+        for fila in filas
+    ]
+
+
+def estado_catalogo(db: Session) -> dict:
+    """Versión en BD vs. versión cargada en este worker, y conteos."""
+    snapshot = obtener_catalogo()
+    ultima = db.query(CatalogoVersion).order_by(CatalogoVersion.id.desc()).first()
+
+    return {
+        "version_bd": ultima.id if ultima else 0,
+        "version_cargada": snapshot.version,
+        "ultima_importacion": {
+            "descripcion": ultima.descripcion,
+            "registros": ultima.registros,
+            "fecha": ultima.created_at.isoformat() if ultima.created_at else None,
+        } if ultima else None,
+        "entidades_activas": snapshot.total_entidades,
+        "tipos": {tipo: len(nombres) for tipo, nombres in snapshot.entidades_por_tipo.items()},
+        "derechos": len(snapshot.derechos),
+    }
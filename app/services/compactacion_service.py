@@ -0,0 +1,279 @@
+"""
+Compactación de transcripciones antes de la extracción de datos
+
+La transcripción de una sesión de 15 minutos llega fragmentada por el STT y
+con mucho relleno del avatar. Antes de enviarla al LLM se compacta:
+
+1. Fragmentos consecutivos del mismo remitente se unen en un solo turno
+2. Se descartan saludos y despedidas, y los acuses del asistente ("Entiendo.",
+   "Perfecto, gracias."); las preguntas se conservan porque dan contexto a
+   respuestas cortas del usuario ("sí", "claro")
+3. Se eliminan repeticiones: oraciones duplicadas dentro de un turno y
+   fragmentos repetidos sin que el otro remitente hable en medio (ej: el avatar
+   repite la pregunta tras un corte de audio). Una respuesta corta que se
+   repite a preguntas distintas ("Sí." ... "Sí.") se conserva
+4. Si aún supera el techo de tokens, los turnos más recientes quedan textuales
+   y los anteriores se resumen por bloques; si los resúmenes siguen excediendo
+   su parte del presupuesto, se resumen a su vez (resumen jerárquico)
+
+El resultado incluye la razón de compresión (tokens finales / originales).
+"""
+import contextvars
+import logging
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional
+
+from ..core import metricas
+from ..core.config import settings
+from . import llm_service
+from .prompts_documentos import estimar_tokens, recortar_texto
+
+logger = logging.getLogger(__name__)
+
+USUARIO = "USUARIO"
+ASISTENTE = "ASISTENTE"
+
+# Parte del techo reservada a los turnos recientes (textuales); el resto, a los resúmenes
+FRACCION_RECIENTE = 0.6
+
+# Tamaño de cada bloque que se resume en una llamada
+TOKENS_BLOQUE_RESUMEN = 2000
+
+# Resúmenes de bloques en paralelo
+CONCURRENCIA_RESUMEN = 4
+
+# Fragmentos hacia atrás en los que se busca un duplicado (solo dentro del
+# mismo turno: un fragmento del otro remitente corta la búsqueda)
+VENTANA_DUPLICADOS = 6
+
+_SALUDO = (
+    r"(hola|buen[oa]s?( d[ií]as| tardes| noches)?|bienvenid[oa]s?|mucho gusto|"
+    r"gracias|muchas gracias|adi[oó]s|chao|hasta luego|que tengas? un buen d[ií]a)"
+)
+_ACUSE = (
+    r"(entiendo|entendido|comprendo|claro|perfecto|muy bien|de acuerdo|listo|vale|ok|okay|"
+    r"excelente|gracias( por (la informaci[oó]n|compartir(lo)?|contarme))?|"
+    r"un momento|d[eé]jame (revisar|anotar)(lo)?|lo tengo|anotado)"
+)
+
+# Fragmento que es solo saludo/acuse. Al usuario solo se le quitan saludos:
+# "claro", "listo", "de acuerdo" pueden ser la respuesta a una pregunta
+_SOLO_RELLENO = re.compile(rf"^(¡?({_SALUDO}|{_ACUSE})[\s,.!¡]*)+$", re.IGNORECASE)
+_SOLO_SALUDO = re.compile(rf"^(¡?{_SALUDO}[\s,.!¡]*)+$", re.IGNORECASE)
+
+# Acuse al inicio de un turno del asistente: "Entiendo. ¿Cuál es la entidad?"
+_RELLENO_INICIAL = re.compile(rf"^(¡?({_SALUDO}|{_ACUSE})[\s,.!¡]+)+", re.IGNORECASE)
+
+_ORACIONES = re.compile(r"(?<=[.!?…])\s+")
+
+PROMPT_RESUMEN = """Resume este fragmento de una conversación entre un usuario y un asistente legal que recopila información para una tutela o un derecho de petición en Colombia.
+
+Conserva TODOS los hechos, fechas, nombres, entidades, cifras, documentos mencionados, respuestas del usuario (incluidas las afirmativas o negativas, con la pregunta a la que responden) y lo que el usuario solicita. Omite saludos y cortesías. Escribe en viñetas breves, en tercera persona."""
+
+
+class Turno(NamedTuple):
+    remitente: str
+    texto: str
+
+
+class ConversacionCompactada(NamedTuple):
+    texto: str
+    turnos_originales: int
+    turnos_finales: int
+    tokens_originales: int
+    tokens_finales: int
+    bloques_resumidos: int
+
+    @property
+    def razon_compresion(self) -> float:
+        """Tokens finales / originales (1.0 = sin compresión)."""
+        return self.tokens_finales / self.tokens_originales if self.tokens_originales else 1.0
+
+
+def _normalizar(texto: str) -> str:
+    """Clave de comparación: minúsculas, sin tildes ni puntuación."""
+    sin_tildes = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^\w\s]", " ", sin_tildes).split())
+
+
+def _sin_oraciones_repetidas(texto: str) -> str:
+    """Quita oraciones consecutivas repetidas (eco del STT)."""
+    resultado: List[str] = []
+    for oracion in _ORACIONES.split(texto):
+        if resultado and _normalizar(oracion) == _normalizar(resultado[-1]):
+            continue
+        resultado.append(oracion)
+    return " ".join(resultado)
+
+
+def _es_repeticion(fragmentos: List[Turno], remitente: str, texto: str) -> bool:
+    """
+    True si el texto ya se dijo en el turno en curso del mismo remitente
+    (fragmentos desde el último del otro remitente, hasta VENTANA_DUPLICADOS).
+    """
+    clave = _normalizar(texto)
+    for fragmento in reversed(fragmentos[-VENTANA_DUPLICADOS:]):
+        if fragmento.remitente != remitente:
+            return False
+        if _normalizar(fragmento.texto) == clave:
+            return True
+    return False
+
+
+def _texto_turno(turno: Turno) -> str:
+    return f"{turno.remitente}: {turno.texto}"
+
+
+def _compactar_turnos(mensajes: list) -> List[Turno]:
+    """
+    Limpia cada fragmento del STT (relleno, ecos, repeticiones recientes) y
+    une los fragmentos consecutivos del mismo remitente en un turno.
+    """
+    fragmentos: List[Turno] = []
+    for mensaje in mensajes:
+        texto = _sin_oraciones_repetidas(" ".join((mensaje.get("texto") or "").split()))
+        remitente = ASISTENTE if mensaje.get("remitente") == "asistente" else USUARIO
+        relleno = _SOLO_RELLENO if remitente == ASISTENTE else _SOLO_SALUDO
+        if not texto or relleno.match(texto):
+            continue
+        if remitente == ASISTENTE:
+            texto = _RELLENO_INICIAL.sub("", texto).strip() or texto
+
+        if _es_repeticion(fragmentos, remitente, texto):
+            continue
+        fragmentos.append(Turno(remitente, texto))
+
+    turnos: List[Turno] = []
+    for fragmento in fragmentos:
+        if turnos and turnos[-1].remitente == fragmento.remitente:
+            turnos[-1] = Turno(fragmento.remitente, f"{turnos[-1].texto} {fragmento.texto}")
+        else:
+            turnos.append(fragmento)
+    return turnos
+
+
+def _agrupar(textos: List[str], max_tokens: int) -> List[str]:
+    """Agrupa textos consecutivos en bloques de hasta max_tokens."""
+    bloques: List[str] = []
+    actual: List[str] = []
+    tokens_actual = 0
+    for texto in textos:
+        tokens = estimar_tokens(texto)
+        if actual and tokens_actual + tokens > max_tokens:
+            bloques.append("\n\n".join(actual))
+            actual, tokens_actual = [], 0
+        actual.append(texto)
+        tokens_actual += tokens
+    if actual:
+        bloques.append("\n\n".join(actual))
+    return bloques
+
+
+def _resumir_en_paralelo(bloques: List[str], resumir: Callable[[str], str]) -> List[str]:
+    if len(bloques) == 1:
+        return [resumir(bloques[0])]
+    # Cada hilo corre con el contexto actual (atribución de costo, traza)
+    with ThreadPoolExecutor(max_workers=min(CONCURRENCIA_RESUMEN, len(bloques))) as pool:
+        futuros = [pool.submit(contextvars.copy_context().run, resumir, bloque) for bloque in bloques]
+        return [futuro.result() for futuro in futuros]
+
+
+def _resumen_jerarquico(textos: List[str], presupuesto: int, resumir: Callable[[str], str]) -> tuple:
+    """
+    Resume los textos por bloques hasta que quepan en el presupuesto.
+
+    Returns:
+        (resumen, cantidad de bloques resumidos)
+    """
+    resumenes = _resumir_en_paralelo(_agrupar(textos, TOKENS_BLOQUE_RESUMEN), resumir)
+    bloques_resumidos = len(resumenes)
+    while len(resumenes) > 1 and estimar_tokens("\n\n".join(resumenes)) > presupuesto:
+        resumenes = _resumir_en_paralelo(_agrupar(resumenes, TOKENS_BLOQUE_RESUMEN), resumir)
+        bloques_resumidos += len(resumenes)
+    return recortar_texto("\n\n".join(resumenes), presupuesto), bloques_resumidos
+
+
+def resumir_con_llm(fragmento: str) -> str:
+    """Resumidor por defecto: modelo económico (LLM_MODELO_RESUMEN)."""
+    respuesta = llm_service.completar(
+        "resumir_conversacion",
+        model=settings.LLM_MODELO_RESUMEN,
+        messages=[
+            {"role": "system", "content": PROMPT_RESUMEN},
+            {"role": "user", "content": fragmento},
+        ],
+        max_completion_tokens=800,
+    )
+    return respuesta.choices[0].message.content.strip()
+
+
+def compactar_conversacion(
+    mensajes: list,
+    max_tokens: Optional[int] = None,
+    resumir: Optional[Callable[[str], str]] = resumir_con_llm,
+) -> ConversacionCompactada:
+    """
+    Compacta la transcripción de una sesión para el prompt de extracción.
+
+    Args:
+        mensajes: [{"remitente": "usuario|asistente", "texto": "..."}] en orden
+        max_tokens: Techo de la conversación compactada (por defecto LLM_PRESUPUESTO_TOKENS_CONVERSACION)
+        resumir: Función texto -> resumen para los turnos antiguos; None = solo
+                 recorte extractivo (sin llamadas al LLM)
+    """
+    techo = max_tokens or settings.LLM_PRESUPUESTO_TOKENS_CONVERSACION
+    tokens_originales = sum(
+        estimar_tokens(_texto_turno(Turno(m.get("remitente", ""), m.get("texto") or ""))) for m in mensajes
+    )
+
+    turnos = _compactar_turnos(mensajes)
+    textos = [_texto_turno(turno) for turno in turnos]
+    texto = "\n\n".join(textos)
+    bloques_resumidos = 0
+
+    if estimar_tokens(texto) > techo:
+        # Turnos recientes textuales (desde el final) hasta FRACCION_RECIENTE del techo
+        presupuesto_reciente = int(techo * FRACCION_RECIENTE)
+        inicio_reciente, usados = len(textos), 0
+        while inicio_reciente > 0:
+            tokens = estimar_tokens(textos[inicio_reciente - 1])
+            if usados + tokens > presupuesto_reciente:
+                break
+            inicio_reciente -= 1
+            usados += tokens
+
+        antiguos, recientes = textos[:inicio_reciente], textos[inicio_reciente:]
+        presupuesto_resumen = techo - usados
+        resumen = None
+        if resumir is not None:
+            try:
+                resumen, bloques_resumidos = _resumen_jerarquico(antiguos, presupuesto_resumen, resumir)
+            except Exception as e:
+                logger.warning(f"[Compactación] No se pudo resumir, se recorta el texto: {e}")
+        if resumen is None:
+            # Sin resumidor: los turnos del usuario son los que traen los datos
+            solo_usuario = [t for t in antiguos if t.startswith(f"{USUARIO}:")]
+            resumen = recortar_texto("\n\n".join(solo_usuario), presupuesto_resumen)
+
+        texto = (
+            f"RESUMEN DE LA PRIMERA PARTE DE LA CONVERSACIÓN:\n{resumen}\n\n"
+            f"CONTINUACIÓN (TEXTUAL):\n\n" + "\n\n".join(recientes)
+        )
+
+    resultado = ConversacionCompactada(
+        texto=texto,
+        turnos_originales=len(mensajes),
+        turnos_finales=len(turnos),
+        tokens_originales=tokens_originales,
+        tokens_finales=estimar_tokens(texto),
+        bloques_resumidos=bloques_resumidos,
+    )
+    metricas.TRANSCRIPCION_COMPRESION.observe(resultado.razon_compresion)
+    logger.info(
+        f"[Compactación] {resultado.turnos_originales} mensajes -> {resultado.turnos_finales} turnos, "
+        f"{resultado.tokens_originales} -> {resultado.tokens_finales} tokens "
+        f"(razón {resultado.razon_compresion:.2f}, bloques resumidos: {bloques_resumidos})"
+    )
+    return resultado
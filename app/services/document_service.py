@@ -6,6 +6,8 @@ from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
 from io import BytesIO
 import re
 
+from ..core import metricas, trazas
+
 
 def _convertir_markdown_a_html(texto: str) -> str:
     """
@@ -29,6 +31,8 @@ def _agregar_numero_pagina(canvas, doc):
     canvas.restoreState()
 
 
+@metricas.PDF_DURACION.time()
+@trazas.tracer.start_as_current_span("generar_pdf")
 def generar_pdf(documento_texto: str, nombre_solicitante: str = "Documento") -> BytesIO:
     """
     Genera un PDF del documento legal con formato profesional
@@ -0,0 +1,296 @@
+"""
+Envío en background de la cola de emails (email_outbox)
+
+Las rutas solo encolan (INSERT en la misma transacción del token); este
+servicio hace el envío fuera del camino de la request:
+- Una conexión SMTP autenticada por proceso, reutilizada entre envíos
+  (el handshake TLS + login se paga una vez, no por email)
+- Lotes reclamados con FOR UPDATE SKIP LOCKED y un lease: varios workers no
+  se pisan y un worker caído no deja emails bloqueados
+- Cada email se marca ENVIADO apenas el servidor lo acepta, y no se empieza
+  un envío que pueda terminar después del lease (lo no intentado vuelve a la
+  cola): otro worker nunca reenvía un email ya entregado
+- Reintentos con backoff exponencial hasta MAX_INTENTOS
+- El cuerpo (con tokens de verificación o de reseteo) se borra al entregar o
+  agotar los reintentos, y las filas terminadas se purgan tras DIAS_RETENCION
+- Sin SMTP_HOST, un sumidero de debug registra el email en el log
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List, Optional, Tuple
+
+import aiosmtplib
+from sqlalchemy import text
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.email_outbox import EmailOutbox, EstadoEmail
+
+logger = logging.getLogger(__name__)
+
+# Emails reclamados por lote
+TAMANO_LOTE = 50
+
+# Reintentos
+MAX_INTENTOS = 6
+BACKOFF_BASE_SEGUNDOS = 60  # 1m, 2m, 4m, 8m, 16m
+
+# Tiempo que un lote reclamado queda reservado para este worker
+LEASE_SEGUNDOS = 300
+
+# Peor caso de un envío (dos intentos de conexión + envío, 30 s cada paso):
+# no se empieza un envío si queda menos que esto del lease
+MARGEN_ENVIO_SEGUNDOS = 150
+
+# Días que se conservan las filas ENVIADO / FALLIDO (sin cuerpo) para auditoría
+DIAS_RETENCION = 30
+
+# La conexión SMTP se cierra si queda inactiva más de esto (los servidores cortan ~5 min)
+SMTP_MAX_INACTIVIDAD_SEGUNDOS = 120
+
+Fila = Tuple[int, str, str, str, Optional[str]]  # id, destinatario, asunto, html, texto
+
+
+def _construir_mensaje(destinatario: str, asunto: str, html: str, texto: Optional[str]) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["From"] = f"Abogadai <{settings.SMTP_FROM}>"
+    message["To"] = destinatario
+    message["Subject"] = asunto
+    # El orden importa: el cliente muestra la última alternativa que soporte
+    if texto:
+        message.attach(MIMEText(texto, "plain", "utf-8"))
+    message.attach(MIMEText(html, "html", "utf-8"))
+    return message
+
+
+class RemitenteSMTP:
+    """Conexión SMTP persistente (una por proceso), con reconexión al fallar."""
+
+    def __init__(self):
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._ultimo_uso = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _conectar(self) -> aiosmtplib.SMTP:
+        # Puerto 587 → STARTTLS; puerto 465 → SSL directo
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USER,
+            password=settings.SMTP_PASSWORD,
+            use_tls=settings.SMTP_PORT == 465,
+            start_tls=settings.SMTP_PORT == 587,
+            timeout=30,
+        )
+        await smtp.connect()  # incluye TLS y login
+        logger.info(f"[EMAIL] Conexión SMTP abierta con {settings.SMTP_HOST}:{settings.SMTP_PORT}")
+        return smtp
+
+    async def _conexion(self) -> aiosmtplib.SMTP:
+        inactiva = time.monotonic() - self._ultimo_uso > SMTP_MAX_INACTIVIDAD_SEGUNDOS
+        if self._smtp is not None and (inactiva or not self._smtp.is_connected):
+            await self._descartar()
+        if self._smtp is None:
+            self._smtp = await self._conectar()
+        return self._smtp
+
+    async def _descartar(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+    async def enviar(self, mensaje: MIMEMultipart):
+        """Envía por la conexión abierta; si falla, reconecta y reintenta una vez."""
+        async with self._lock:
+            for intento in range(2):
+                smtp = await self._conexion()
+                try:
+                    await smtp.send_message(mensaje)
+                    self._ultimo_uso = time.monotonic()
+                    return
+                except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError):
+                    await self._descartar()
+                    if intento == 1:
+                        raise
+                except aiosmtplib.SMTPRecipientsRefused:
+                    # La conexión sigue sana; el error es del destinatario
+                    self._ultimo_uso = time.monotonic()
+                    raise
+
+    async def cerrar(self):
+        async with self._lock:
+            await self._descartar()
+
+
+class SumideroDebug:
+    """Reemplaza SMTP en desarrollo: registra el email en el log."""
+
+    async def enviar(self, mensaje: MIMEMultipart):
+        texto = next(
+            (parte.get_payload(decode=True).decode("utf-8") for parte in mensaje.get_payload()
+             if parte.get_content_type() == "text/plain"),
+            "(solo HTML)"
+        )
+        logger.warning(
+            f"[EMAIL] SMTP no configurado. Email para {mensaje['To']}: "
+            f"'{mensaje['Subject']}'\n{texto}"
+        )
+
+    async def cerrar(self):
+        pass
+
+
+remitente_smtp = RemitenteSMTP()
+sumidero_debug = SumideroDebug()
+
+
+def _remitente():
+    return remitente_smtp if settings.SMTP_HOST else sumidero_debug
+
+
+def _reclamar_lote(limite: int) -> List[Fila]:
+    """Toma un lote listo para enviar y lo reserva LEASE_SEGUNDOS (un solo UPDATE)."""
+    db = SessionLocal()
+    try:
+        filas = db.execute(text("""
+            UPDATE email_outbox
+            SET siguiente_intento_en = :lease, intentos = intentos + 1
+            WHERE id IN (
+                SELECT id FROM email_outbox
+                WHERE estado IN ('PENDIENTE', 'ERROR')
+                  AND siguiente_intento_en <= :ahora
+                ORDER BY creado_en
+                LIMIT :limite
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, destinatario, asunto, html, texto
+        """), {
+            "ahora": datetime.utcnow(),
+            "lease": datetime.utcnow() + timedelta(seconds=LEASE_SEGUNDOS),
+            "limite": limite,
+        }).all()
+        db.commit()
+        return [tuple(fila) for fila in filas]
+    finally:
+        db.close()
+
+
+def _liberar(ids: List[int]):
+    """Devuelve a la cola los emails reclamados que no se llegaron a intentar."""
+    db = SessionLocal()
+    try:
+        db.query(EmailOutbox).filter(
+            EmailOutbox.id.in_(ids),
+            EmailOutbox.estado.in_([EstadoEmail.PENDIENTE, EstadoEmail.ERROR]),
+        ).update({
+            EmailOutbox.siguiente_intento_en: datetime.utcnow(),
+            EmailOutbox.intentos: EmailOutbox.intentos - 1,
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _registrar_enviado(email_id: int):
+    """Marca el email ENVIADO y borra su cuerpo (ya no hace falta y lleva tokens vigentes)."""
+    db = SessionLocal()
+    try:
+        db.query(EmailOutbox).filter(EmailOutbox.id == email_id).update({
+            EmailOutbox.estado: EstadoEmail.ENVIADO,
+            EmailOutbox.enviado_en: datetime.utcnow(),
+            EmailOutbox.error: None,
+            EmailOutbox.html: "",
+            EmailOutbox.texto: None,
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _registrar_error(email_id: int, error: str):
+    """ERROR con backoff, o FALLIDO (sin cuerpo) si agotó los reintentos."""
+    db = SessionLocal()
+    try:
+        email = db.query(EmailOutbox.intentos).filter(EmailOutbox.id == email_id).one()
+        agotado = email.intentos >= MAX_INTENTOS
+        cambios = {
+            EmailOutbox.estado: EstadoEmail.FALLIDO if agotado else EstadoEmail.ERROR,
+            EmailOutbox.error: error[:2000],
+            EmailOutbox.siguiente_intento_en: (
+                datetime.utcnow() + timedelta(seconds=BACKOFF_BASE_SEGUNDOS * 2 ** (email.intentos - 1))
+            ),
+        }
+        if agotado:
+            cambios.update({EmailOutbox.html: "", EmailOutbox.texto: None})
+        db.query(EmailOutbox).filter(EmailOutbox.id == email_id).update(cambios, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def purgar_terminados(dias: int = DIAS_RETENCION) -> int:
+    """Elimina los emails ENVIADO / FALLIDO creados hace más de `dias`."""
+    db = SessionLocal()
+    try:
+        eliminados = db.query(EmailOutbox).filter(
+            EmailOutbox.estado.in_([EstadoEmail.ENVIADO, EstadoEmail.FALLIDO]),
+            EmailOutbox.creado_en < datetime.utcnow() - timedelta(days=dias),
+        ).delete(synchronize_session=False)
+        db.commit()
+        return eliminados
+    finally:
+        db.close()
+
+
+async def procesar_outbox(limite: int = TAMANO_LOTE) -> int:
+    """
+    Envía los emails pendientes (o con error y backoff vencido).
+
+    Es seguro llamarlo en paralelo (tarea de la request, scheduler, varios
+    workers): cada email lo reclama un solo worker.
+
+    Returns:
+        Cantidad de emails enviados
+    """
+    remitente = _remitente()
+    total_enviados = 0
+
+    while True:
+        lote = await asyncio.to_thread(_reclamar_lote, limite)
+        if not lote:
+            break
+        ultimo_inicio = time.monotonic() + LEASE_SEGUNDOS - MARGEN_ENVIO_SEGUNDOS
+
+        for posicion, (email_id, destinatario, asunto, html, texto) in enumerate(lote):
+            if time.monotonic() > ultimo_inicio:
+                # El lease vencería a mitad del envío: el resto vuelve a la cola
+                await asyncio.to_thread(_liberar, [fila[0] for fila in lote[posicion:]])
+                logger.warning(f"[EMAIL] Lease por vencer, {len(lote) - posicion} emails devueltos a la cola")
+                break
+            try:
+                await remitente.enviar(_construir_mensaje(destinatario, asunto, html, texto))
+            except Exception as e:
+                logger.error(f"[EMAIL] Error enviando email {email_id} a {destinatario}: {e}")
+                await asyncio.to_thread(_registrar_error, email_id, str(e))
+                continue
+            await asyncio.to_thread(_registrar_enviado, email_id)
+            total_enviados += 1
+
+        if len(lote) < limite:
+            break
+
+    if total_enviados:
+        logger.info(f"[EMAIL] {total_enviados} emails enviados")
+    return total_enviados
+
+
+async def cerrar():
+    """Cierra la conexión SMTP (shutdown de la aplicación)."""
+    await remitente_smtp.cerrar()
@@ -0,0 +1,184 @@
+"""
+Plantillas de emails transaccionales, compiladas una sola vez por proceso
+
+Las plantillas viven en app/templates/email/ (sintaxis string.Template: ${variable}):
+- base.html: layout común (encabezado) con ${contenido} y ${pie}
+- pie_enlace.html: pie con el enlace de respaldo (${url_accion})
+- <tipo>.html: contenido de cada email
+
+Al cargar cada tipo se arma su fuente completa (layout + contenido + pie,
+que son fragmentos estáticos) y se compila a un Template; la versión
+text/plain se genera una vez a partir del HTML. Renderizar es solo sustituir
+variables: ${...} escapado en HTML y sin escapar en texto.
+
+Benchmark:
+    python -m app.services.email_plantillas [iteraciones]
+"""
+
+import html
+import re
+import sys
+import time
+from functools import lru_cache
+from html.parser import HTMLParser
+from pathlib import Path
+from string import Template
+from typing import Dict, List, NamedTuple, Optional
+
+DIRECTORIO_PLANTILLAS = Path(__file__).resolve().parent.parent / "templates" / "email"
+
+
+class DefinicionPlantilla(NamedTuple):
+    asunto: str
+    archivo: str
+    pie: Optional[str] = "pie_enlace.html"
+
+
+# Tipo de email -> definición. Agregar aquí los nuevos (recibos, reembolsos, ...)
+PLANTILLAS: Dict[str, DefinicionPlantilla] = {
+    "verificacion": DefinicionPlantilla(
+        asunto="Verifica tu cuenta - Abogadai",
+        archivo="verificacion.html",
+    ),
+    "reset_contrasena": DefinicionPlantilla(
+        asunto="Restablece tu contraseña - Abogadai",
+        archivo="reset_contrasena.html",
+    ),
+}
+
+
+class EmailRenderizado(NamedTuple):
+    asunto: str
+    html: str
+    texto: str
+
+
+class _HtmlATexto(HTMLParser):
+    """Convierte el HTML de la plantilla a texto plano (conserva los ${...})."""
+
+    _BLOQUES = {"p", "div", "h1", "h2", "h3", "li", "tr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.partes: List[str] = []
+        self._href: Optional[str] = None
+        self._texto_enlace: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "br":
+            self.partes.append("\n")
+        elif tag in self._BLOQUES:
+            self.partes.append("\n\n")
+        elif tag == "a":
+            self._href = dict(attrs).get("href")
+            self._texto_enlace = []
+
+    def handle_endtag(self, tag):
+        if tag in self._BLOQUES:
+            self.partes.append("\n\n")
+        elif tag == "a" and self._href is not None:
+            etiqueta = " ".join("".join(self._texto_enlace).split())
+            if etiqueta and etiqueta != self._href:
+                self.partes.append(f"{etiqueta}: {self._href}")
+            else:
+                self.partes.append(self._href)
+            self._href = None
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._texto_enlace.append(data)
+        else:
+            self.partes.append(data)
+
+    def texto(self) -> str:
+        crudo = "".join(self.partes)
+        lineas = [" ".join(linea.split()) for linea in crudo.splitlines()]
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lineas)).strip() + "\n"
+
+
+def _html_a_texto(fuente_html: str) -> str:
+    parser = _HtmlATexto()
+    parser.feed(fuente_html)
+    parser.close()
+    return parser.texto()
+
+
+@lru_cache(maxsize=None)
+def _leer(archivo: str) -> str:
+    return (DIRECTORIO_PLANTILLAS / archivo).read_text(encoding="utf-8")
+
+
+class _PlantillaCompilada(NamedTuple):
+    asunto: Template
+    html: Template
+    texto: Template
+
+
+@lru_cache(maxsize=None)
+def _compilar(tipo: str) -> _PlantillaCompilada:
+    """Arma y compila la plantilla del tipo (una vez por proceso)."""
+    definicion = PLANTILLAS[tipo]
+    # Layout, contenido y pie son estáticos: se combinan una sola vez
+    fuente = Template(_leer("base.html")).safe_substitute(
+        contenido=_leer(definicion.archivo).rstrip("\n"),
+        pie=_leer(definicion.pie).rstrip("\n") if definicion.pie else "",
+    )
+    return _PlantillaCompilada(
+        asunto=Template(definicion.asunto),
+        html=Template(fuente),
+        texto=Template(_html_a_texto(fuente)),
+    )
+
+
+def renderizar_email(tipo: str, **contexto) -> EmailRenderizado:
+    """
+    Renderiza un email transaccional.
+
+    Args:
+        tipo: Clave de PLANTILLAS (ej: "verificacion")
+        **contexto: Variables de la plantilla (ej: nombre, url_accion)
+
+    Returns:
+        EmailRenderizado(asunto, html, texto)
+
+    Raises:
+        KeyError: Si el tipo no existe o falta una variable
+    """
+    plantilla = _compilar(tipo)
+    escapado = {clave: html.escape(str(valor)) for clave, valor in contexto.items()}
+    return EmailRenderizado(
+        asunto=plantilla.asunto.substitute(contexto),
+        html=plantilla.html.substitute(escapado),
+        texto=plantilla.texto.substitute(contexto),
+    )
+
+
+def precompilar():
+    """Compila todas las plantillas (opcional, para no pagar la carga en el primer email)."""
+    for tipo in PLANTILLAS:
+        _compilar(tipo)
+
+
+def _benchmark(iteraciones: int):
+    contexto = {
+        "nombre": "María José",
+        "url_accion": "https://app.abogadai.com/reset-password?token=abc123&x=1",
+    }
+
+    inicio = time.perf_counter()
+    precompilar()
+    print(f"Compilación de {len(PLANTILLAS)} plantillas: {(time.perf_counter() - inicio) * 1000:.2f} ms")
+
+    for tipo in PLANTILLAS:
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            renderizar_email(tipo, **contexto)
+        duracion = time.perf_counter() - inicio
+        print(
+            f"{tipo:<20} {iteraciones / duracion:>12,.0f} renders/s "
+            f"({duracion / iteraciones * 1e6:.1f} µs/render)"
+        )
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
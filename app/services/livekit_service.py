@@ -1,12 +1,26 @@
 """
 Servicio de gestión de rooms LiveKit.
 Detecta y cierra sesiones de avatar inactivas para evitar costos innecesarios.
+
+El cierre normal llega por el webhook de LiveKit (POST /webhooks/livekit);
+la limpieza periódica queda como respaldo si el webhook no llega.
+
+El costo de la limpieza no crece con el número de rooms:
+- Un solo cliente LiveKitAPI por proceso (reutiliza conexiones entre ejecuciones)
+- Una sola consulta IN para resolver todos los rooms caso-{id}
+- Borrado de rooms en paralelo con concurrencia acotada
+- Un solo UPDATE para marcar los casos abandonados
 """
+import asyncio
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
+from ..core import trazas
 from ..core.config import settings
 from ..core.database import SessionLocal
+from ..core.single_flight import SingleFlightCache
 from ..models.caso import Caso, EstadoCaso
 
 logger = logging.getLogger(__name__)
@@ -14,6 +28,169 @@ logger = logging.getLogger(__name__)
 # Tiempo máximo que un room puede estar activo antes de ser cerrado (minutos)
 MAX_MINUTOS_SESION_ACTIVA = 30
 
+# Borrados simultáneos de rooms en LiveKit
+CONCURRENCIA_BORRADO = 10
+
+PREFIJO_ROOM_CASO = "caso-"
+
+# Tokens de acceso: vigencia y margen de renovación antes de vencer
+TTL_TOKEN = timedelta(hours=2)
+MARGEN_RENOVACION_TOKEN = timedelta(minutes=15)
+
+# Permisos del participante usuario (el room se agrega por caso)
+_PLANTILLA_GRANTS = {
+    "room_join": True,
+    "can_publish": True,
+    "can_subscribe": True,
+}
+
+# (caso_id, identidad, nombre) -> token vigente. Las reconexiones reutilizan el
+# mismo JWT sin volver a firmar; llamadas simultáneas comparten una sola firma.
+_tokens = SingleFlightCache(max_entradas=5000)
+
+_cliente = None
+
+
+def _obtener_cliente():
+    """Cliente LiveKitAPI compartido (se crea dentro del event loop la primera vez)."""
+    global _cliente
+    if _cliente is None:
+        from livekit import api as lk_api
+        _cliente = lk_api.LiveKitAPI(
+            settings.LIVEKIT_URL,
+            settings.LIVEKIT_API_KEY,
+            settings.LIVEKIT_API_SECRET,
+        )
+    return _cliente
+
+
+async def cerrar():
+    """Cierra el cliente compartido (shutdown de la aplicación)."""
+    global _cliente
+    if _cliente is not None:
+        cliente, _cliente = _cliente, None
+        await cliente.aclose()
+
+
+def caso_id_de_room(nombre_room: str) -> Optional[int]:
+    """Extrae el id de caso de un room 'caso-{id}'; None si no es un room de caso."""
+    if not nombre_room.startswith(PREFIJO_ROOM_CASO):
+        return None
+    try:
+        return int(nombre_room[len(PREFIJO_ROOM_CASO):])
+    except ValueError:
+        return None
+
+
+def identidad_usuario(caso_id: int) -> str:
+    """Identidad del usuario en el room (el webhook la usa para detectar su salida)."""
+    return f"user-{caso_id}"
+
+
+def _firmar_token(caso_id: int, room_name: str, identidad: str, nombre: str) -> dict:
+    from livekit import api as lk_api
+
+    token = (
+        lk_api.AccessToken(settings.LIVEKIT_API_KEY, settings.LIVEKIT_API_SECRET)
+        .with_identity(identidad)
+        .with_name(nombre)
+        .with_grants(lk_api.VideoGrants(room=room_name, **_PLANTILLA_GRANTS))
+        .with_metadata(f"caso_id:{caso_id}")  # Metadata crítica para el agente
+        .with_ttl(TTL_TOKEN)
+    )
+    return {"token": token.to_jwt(), "expira_en": time.time() + TTL_TOKEN.total_seconds()}
+
+
+async def obtener_token_sesion(caso_id: int, room_name: str, nombre: str) -> Tuple[str, str]:
+    """
+    Token de acceso al room del caso, reutilizado mientras le quede más de
+    MARGEN_RENOVACION_TOKEN de vigencia.
+
+    Returns:
+        (jwt, identidad)
+    """
+    identidad = identidad_usuario(caso_id)
+
+    async def firmar():
+        return _firmar_token(caso_id, room_name, identidad, nombre)
+
+    emitido = await _tokens.obtener(
+        (caso_id, room_name, identidad, nombre),
+        firmar,
+        ttl=lambda valor: valor["expira_en"] - time.time() - MARGEN_RENOVACION_TOKEN.total_seconds(),
+    )
+    return emitido["token"], identidad
+
+
+async def eliminar_room(nombre_room: str) -> bool:
+    """Elimina un room en LiveKit (ej: al salir el usuario). Retorna False si falla."""
+    if not settings.LIVEKIT_API_KEY or not settings.LIVEKIT_API_SECRET:
+        return False
+
+    from livekit import api as lk_api
+
+    try:
+        with trazas.span_cliente("LiveKit DeleteRoom", room=nombre_room):
+            await _obtener_cliente().room.delete_room(lk_api.DeleteRoomRequest(room=nombre_room))
+        logger.info(f"[LiveKit] Room {nombre_room} eliminado")
+        return True
+    except Exception as e:
+        logger.warning(f"[LiveKit] No se pudo borrar room {nombre_room}: {e}")
+        return False
+
+
+def _casos_a_cerrar(
+    rooms_por_caso: Dict[int, str],
+    max_minutos: int,
+) -> List[Tuple[int, str, float]]:
+    """
+    Resuelve todos los rooms en una consulta.
+
+    Returns:
+        [(caso_id, nombre_room, minutos_activo)] de las sesiones que exceden max_minutos
+    """
+    db = SessionLocal()
+    try:
+        filas = (
+            db.query(Caso.id, Caso.fecha_inicio_sesion)
+            .filter(
+                Caso.id.in_(list(rooms_por_caso)),
+                Caso.fecha_inicio_sesion.isnot(None),
+                Caso.fecha_fin_sesion.is_(None),
+            )
+            .all()
+        )
+    finally:
+        db.close()
+
+    ahora = datetime.utcnow()
+    vencidos = []
+    for caso_id, fecha_inicio in filas:
+        minutos_activo = (ahora - fecha_inicio).total_seconds() / 60
+        if minutos_activo >= max_minutos:
+            vencidos.append((caso_id, rooms_por_caso[caso_id], minutos_activo))
+    return vencidos
+
+
+def _marcar_abandonados(caso_ids: List[int]) -> int:
+    """Marca como ABANDONADO, en un solo UPDATE, los casos que siguen TEMPORAL."""
+    if not caso_ids:
+        return 0
+    db = SessionLocal()
+    try:
+        actualizados = db.query(Caso).filter(
+            Caso.id.in_(caso_ids),
+            Caso.estado == EstadoCaso.TEMPORAL,
+            Caso.fecha_fin_sesion.is_(None),
+        ).update({
+            Caso.estado: EstadoCaso.ABANDONADO,
+            Caso.fecha_fin_sesion: datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+        return actualizados
+    finally:
+        db.close()
+
 
 async def cerrar_rooms_inactivos(max_minutos: int = MAX_MINUTOS_SESION_ACTIVA) -> int:
     """
@@ -33,64 +210,51 @@ async def cerrar_rooms_inactivos(max_minutos: int = MAX_MINUTOS_SESION_ACTIVA) -
 
     from livekit import api as lk_api
 
-    cerrados = 0
-    db = SessionLocal()
-
     try:
-        async with lk_api.LiveKitAPI(
-            settings.LIVEKIT_URL,
-            settings.LIVEKIT_API_KEY,
-            settings.LIVEKIT_API_SECRET,
-        ) as lk:
+        lk = _obtener_cliente()
+        with trazas.span_cliente("LiveKit ListRooms"):
             resp = await lk.room.list_rooms(lk_api.ListRoomsRequest())
-            rooms = resp.rooms
-
-            for room in rooms:
-                # Solo procesar rooms de caso (formato caso-{id})
-                if not room.name.startswith("caso-"):
-                    continue
-
-                try:
-                    caso_id = int(room.name.split("-")[1])
-                except (IndexError, ValueError):
-                    continue
-
-                caso = db.query(Caso).filter(Caso.id == caso_id).first()
-
-                # Si el caso no existe o ya tiene fecha_fin → skip
-                if not caso or not caso.fecha_inicio_sesion or caso.fecha_fin_sesion:
-                    continue
-
-                minutos_activo = (
-                    datetime.utcnow() - caso.fecha_inicio_sesion
-                ).total_seconds() / 60
-
-                if minutos_activo < max_minutos:
-                    continue
-
-                # Cerrar room en LiveKit
-                try:
-                    await lk.room.delete_room(
-                        lk_api.DeleteRoomRequest(room=room.name)
-                    )
-                except Exception as e:
-                    logger.warning(f"[LiveKit] No se pudo borrar room {room.name}: {e}")
-
-                # Marcar caso como ABANDONADO si sigue activo
-                if caso.estado == EstadoCaso.TEMPORAL:
-                    caso.estado = EstadoCaso.ABANDONADO
-                    caso.fecha_fin_sesion = datetime.utcnow()
-                    db.commit()
-
-                cerrados += 1
-                logger.info(
-                    f"[LiveKit] Room {room.name} cerrado "
-                    f"({minutos_activo:.1f} min activo, caso #{caso_id})"
-                )
+
+        rooms_por_caso: Dict[int, str] = {}
+        for room in resp.rooms:
+            caso_id = caso_id_de_room(room.name)
+            if caso_id is not None:
+                rooms_por_caso[caso_id] = room.name
+
+        if not rooms_por_caso:
+            return 0
+
+        vencidos = await asyncio.to_thread(_casos_a_cerrar, rooms_por_caso, max_minutos)
+        if not vencidos:
+            return 0
+
+        semaforo = asyncio.Semaphore(CONCURRENCIA_BORRADO)
+
+        async def borrar(nombre_room: str):
+            async with semaforo:
+                with trazas.span_cliente("LiveKit DeleteRoom", room=nombre_room):
+                    await lk.room.delete_room(lk_api.DeleteRoomRequest(room=nombre_room))
+
+        resultados = await asyncio.gather(
+            *(borrar(nombre_room) for _, nombre_room, _ in vencidos),
+            return_exceptions=True,
+        )
+
+        cerrados = 0
+        for (caso_id, nombre_room, minutos_activo), resultado in zip(vencidos, resultados):
+            if isinstance(resultado, Exception):
+                logger.warning(f"[LiveKit] No se pudo borrar room {nombre_room}: {resultado}")
+                continue
+            cerrados += 1
+            logger.info(
+                f"[LiveKit] Room {nombre_room} cerrado "
+                f"({minutos_activo:.1f} min activo, caso #{caso_id})"
+            )
+
+        # Como antes, el caso se da por abandonado aunque el borrado del room falle
+        await asyncio.to_thread(_marcar_abandonados, [caso_id for caso_id, _, _ in vencidos])
+        return cerrados
 
     except Exception as e:
         logger.error(f"[LiveKit] Error en limpieza de rooms inactivos: {e}")
-    finally:
-        db.close()
-
-    return cerrados
+        return 0
@@ -0,0 +1,264 @@
+"""
+Punto único de llamadas al LLM (OpenAI chat.completions)
+
+Todos los servicios que usan el modelo pasan por completar(): un solo
+cliente por proceso (pool de conexiones compartido) y métricas de latencia,
+tokens y errores etiquetadas con la función que hace la llamada, y un span
+de traza por llamada.
+
+Cada llamada queda además registrada en llm_usage (tokens y costo), atribuida
+al caso/usuario fijado con atribuir():
+
+    with llm_service.atribuir(caso_id=caso.id, user_id=caso.user_id):
+        documento = openai_service.generar_tutela(datos_caso)
+
+El proveedor se elige con LLM_PROVEEDOR: "openai" (real) o "simulado"
+(llm_simulado: respuestas locales para pruebas de carga y CI sin red).
+
+Protección ante degradación del proveedor (LlmNoDisponible = fallo rápido con
+reintentar_en, sin bloquear un hilo durante todo el timeout):
+- Circuit breaker: se abre tras LLM_CIRCUITO_UMBRAL_FALLOS fallos consecutivos
+  (429, timeout, conexión, 5xx o llamada lenta) y deja pasar una llamada de
+  prueba pasados LLM_CIRCUITO_SEGUNDOS_ABIERTO
+- Concurrencia adaptativa (AIMD) entre LLM_CONCURRENCIA_MIN y LLM_CONCURRENCIA_MAX
+  llamadas simultáneas por proceso
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+import httpx
+from openai import APIConnectionError, InternalServerError, OpenAI, RateLimitError
+from openai.types.chat import ChatCompletion
+
+from ..core import metricas, trazas
+from ..core.circuit_breaker import ABIERTO, CircuitBreaker, CircuitoAbiertoError
+from ..core.config import settings
+from ..core.limitador_adaptativo import ConcurrenciaAgotadaError, LimitadorAIMD
+from .llm_uso_service import registrar_uso
+
+
+
+class ProveedorOpenAI:
+    """Proveedor real: un solo cliente por proceso (pool de conexiones compartido)."""
+
+    def __init__(self):
+        self.client = OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.LLM_TIMEOUT_S,
+            max_retries=settings.LLM_REINTENTOS,
+        )
+
+    def crear(self, funcion: str, **parametros):
+        return self.client.chat.completions.create(**parametros)
+
+
+def _crear_proveedor():
+    nombre = settings.LLM_PROVEEDOR.lower()
+    if nombre == "openai":
+        return ProveedorOpenAI()
+    if nombre == "simulado":
+        from .llm_simulado import ProveedorSimulado
+        return ProveedorSimulado()
+    raise RuntimeError(f"LLM_PROVEEDOR no soportado: {settings.LLM_PROVEEDOR}")
+
+
+proveedor = _crear_proveedor()
+
+breaker = CircuitBreaker(
+    "openai",
+    umbral_fallos=settings.LLM_CIRCUITO_UMBRAL_FALLOS,
+    segundos_abierto=settings.LLM_CIRCUITO_SEGUNDOS_ABIERTO,
+)
+limitador = LimitadorAIMD(
+    "openai",
+    minimo=settings.LLM_CONCURRENCIA_MIN,
+    maximo=settings.LLM_CONCURRENCIA_MAX,
+    segundos_reintento=settings.LLM_CIRCUITO_SEGUNDOS_ABIERTO,
+)
+
+# Errores que indican proveedor saturado o caído (APITimeoutError es un APIConnectionError;
+# a mitad de un stream llegan como errores de transporte de httpx)
+ERRORES_SOBRECARGA = (APIConnectionError, RateLimitError, InternalServerError, httpx.TransportError)
+
+# Fallo rápido: la llamada no se hizo; ambos traen reintentar_en (segundos)
+LlmNoDisponible = (CircuitoAbiertoError, ConcurrenciaAgotadaError)
+
+
+class RespuestaInterrumpida(Exception):
+    """El stream se cortó a mitad de la respuesta; `parcial` trae el texto recibido."""
+    def __init__(self, parcial: str, causa: Exception):
+        self.parcial = parcial
+        self.causa = causa
+        super().__init__(f"Respuesta interrumpida tras {len(parcial)} caracteres: {causa}")
+
+
+def _consumir_stream(chunks) -> ChatCompletion:
+    """Une los chunks de un stream en un ChatCompletion (mismo formato que sin stream)."""
+    partes = []
+    base, finish_reason, uso = None, None, None
+    try:
+        for chunk in chunks:
+            base = base or chunk
+            if chunk.usage is not None:
+                uso = chunk.usage
+            for choice in chunk.choices:
+                if choice.delta.content:
+                    partes.append(choice.delta.content)
+                finish_reason = choice.finish_reason or finish_reason
+    except Exception as e:
+        raise RespuestaInterrumpida("".join(partes), e) from e
+
+    return ChatCompletion.model_validate({
+        "id": base.id if base else "",
+        "created": base.created if base else 0,
+        "model": base.model if base else "",
+        "object": "chat.completion",
+        "choices": [{
+            "index": 0,
+            "finish_reason": finish_reason or "stop",
+            "message": {"role": "assistant", "content": "".join(partes)},
+        }],
+        "usage": uso.model_dump() if uso is not None else None,
+    })
+
+# (caso_id, user_id) al que se atribuyen las llamadas del contexto actual
+_atribucion: ContextVar[Tuple[Optional[int], Optional[int]]] = ContextVar(
+    "llm_atribucion", default=(None, None)
+)
+
+
+@contextmanager
+def atribuir(caso_id: Optional[int] = None, user_id: Optional[int] = None):
+    """Atribuye al caso/usuario las llamadas al LLM hechas dentro del bloque."""
+    token = _atribucion.set((caso_id, user_id))
+    try:
+        yield
+    finally:
+        _atribucion.reset(token)
+
+
+def _es_lenta(duracion: float, tokens_completion: int) -> bool:
+    """Lenta: más que LLM_LATENCIA_BASE_S + decodificación a LLM_TOKENS_POR_SEGUNDO_MIN."""
+    return duracion > settings.LLM_LATENCIA_BASE_S + tokens_completion / settings.LLM_TOKENS_POR_SEGUNDO_MIN
+
+
+def _actualizar_metricas():
+    """Gauges de circuito y concurrencia (el paso ABIERTO -> SEMI_ABIERTO ocurre al leer el estado)."""
+    metricas.LLM_CONCURRENCIA_LIMITE.set(limitador.limite)
+    metricas.LLM_CIRCUITO_ABIERTO.set(1 if breaker.estado == ABIERTO else 0)
+
+
+def estado() -> dict:
+    """Estado del circuito y del límite de concurrencia (health checks / admin)."""
+    _actualizar_metricas()
+    return {"circuito": breaker.resumen(), "concurrencia": limitador.resumen()}
+
+
+def _admitir(funcion: str):
+    """
+    Circuito y luego permiso de concurrencia, o LlmNoDisponible.
+
+    Con el circuito abierto se rechaza sin tocar el limitador: esperar un
+    permiso solo para descartarlo bloquearía el hilo y les quitaría el cupo
+    a llamadas que sí podrían hacerse.
+    """
+    try:
+        es_prueba = breaker.verificar()
+    except CircuitoAbiertoError:
+        metricas.LLM_RECHAZOS.labels(funcion, "circuito").inc()
+        _actualizar_metricas()
+        raise
+    try:
+        limitador.adquirir(settings.LLM_ESPERA_PERMISO_S)
+    except ConcurrenciaAgotadaError:
+        # La llamada de prueba no se hizo: que la intente la siguiente
+        if es_prueba:
+            breaker.liberar_prueba()
+        metricas.LLM_RECHAZOS.labels(funcion, "concurrencia").inc()
+        raise
+    _actualizar_metricas()
+
+
+def _cerrar_llamada(sano: bool):
+    """Informa el resultado al circuito y al limitador y actualiza sus métricas."""
+    if sano:
+        breaker.registrar_exito()
+    else:
+        breaker.registrar_fallo()
+    limitador.liberar(sano=sano)
+    _actualizar_metricas()
+
+
+def completar(funcion: str, **parametros):
+    """
+    chat.completions.create (en el proveedor activo) con métricas y registro de uso por función.
+
+    Args:
+        funcion: Nombre de la función llamadora (etiqueta de las métricas, ej: "generar_tutela")
+        **parametros: Parámetros de chat.completions.create (model, messages, ...)
+
+    Returns:
+        La respuesta de OpenAI sin modificar (con stream=True, los chunks ya unidos
+        en un ChatCompletion)
+
+    Raises:
+        LlmNoDisponible: Circuito abierto o sin cupo de concurrencia (la llamada no se hizo)
+        RespuestaInterrumpida: El stream se cortó; trae el texto parcial
+    """
+    modelo = parametros.get("model", "")
+    if parametros.get("stream"):
+        parametros.setdefault("stream_options", {"include_usage": True})
+    caso_id, user_id = _atribucion.get()
+    _admitir(funcion)
+    with trazas.span_cliente(
+        f"llm {funcion}", **{"gen_ai.system": settings.LLM_PROVEEDOR, "gen_ai.request.model": modelo}
+    ) as span:
+        inicio = time.perf_counter()
+        try:
+            respuesta = proveedor.crear(funcion, **parametros)
+            if parametros.get("stream"):
+                respuesta = _consumir_stream(respuesta)
+        except Exception as e:
+            duracion = time.perf_counter() - inicio
+            # Un 400 (prompt inválido) no dice nada de la salud del proveedor
+            causa = e.causa if isinstance(e, RespuestaInterrumpida) else e
+            _cerrar_llamada(sano=not isinstance(causa, ERRORES_SOBRECARGA))
+            metricas.LLM_ERRORES.labels(funcion, type(e).__name__).inc()
+            metricas.LLM_DURACION.labels(funcion, modelo).observe(duracion)
+            registrar_uso(
+                funcion, modelo, caso_id, user_id,
+                duracion_ms=int(duracion * 1000), error=type(e).__name__,
+            )
+            raise
+        duracion = time.perf_counter() - inicio
+        metricas.LLM_DURACION.labels(funcion, modelo).observe(duracion)
+
+        uso = getattr(respuesta, "usage", None)
+        tokens_prompt = (uso.prompt_tokens or 0) if uso else 0
+        tokens_completion = (uso.completion_tokens or 0) if uso else 0
+        detalles = getattr(uso, "prompt_tokens_details", None)
+        tokens_cache = (detalles.cached_tokens or 0) if detalles else 0
+
+        metricas.LLM_TOKENS.labels(funcion, modelo, "prompt").inc(tokens_prompt)
+        metricas.LLM_TOKENS.labels(funcion, modelo, "completion").inc(tokens_completion)
+        metricas.LLM_TOKENS.labels(funcion, modelo, "prompt_cache").inc(tokens_cache)
+        span.set_attribute("gen_ai.usage.input_tokens", tokens_prompt)
+        span.set_attribute("gen_ai.usage.output_tokens", tokens_completion)
+        span.set_attribute("gen_ai.usage.cache_read.input_tokens", tokens_cache)
+
+        lenta = _es_lenta(duracion, tokens_completion)
+        if lenta:
+            span.set_attribute("llm.lenta", True)
+            metricas.LLM_RECHAZOS.labels(funcion, "lenta").inc()
+        _cerrar_llamada(sano=not lenta)
+
+    registrar_uso(
+        funcion, modelo, caso_id, user_id,
+        tokens_prompt=tokens_prompt,
+        tokens_cache=tokens_cache,
+        tokens_completion=tokens_completion,
+        duracion_ms=int(duracion * 1000),
+    )
+    return respuesta
@@ -0,0 +1,386 @@
+"""
+Proveedor LLM simulado (LLM_PROVEEDOR=simulado)
+
+Sustituto local y determinista de OpenAI para pruebas de carga y CI sin red:
+devuelve objetos ChatCompletion / ChatCompletionChunk del SDK con contenido
+válido para cada función (el mismo JSON que esperan los parsers de
+openai_service y ai_analysis_service, documentos con las secciones reales).
+
+Latencia = tiempo al primer token (lognormal definida por mediana y p95) +
+tokens de salida / velocidad de decodificación, escalada por
+LLM_SIMULADO_ESCALA_TIEMPO (0 = sin esperas). Con LLM_SIMULADO_TASA_ERROR > 0
+se inyectan RateLimitError, APITimeoutError e InternalServerError; en stream el
+timeout corta la respuesta a mitad de camino (texto parcial).
+
+El contenido depende solo de la función y los mensajes; la secuencia de
+latencias y errores, de LLM_SIMULADO_SEMILLA (determinista en ejecución serial).
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+
+import httpx
+from openai import APITimeoutError, InternalServerError, RateLimitError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from ..core.config import settings
+from .prompts_documentos import estimar_tokens
+
+# Tokens de salida típicos por función (se limitan con max_completion_tokens)
+TOKENS_SALIDA = {
+    "generar_tutela": 2600,
+    "generar_derecho_peticion": 1600,
+    "extraer_datos_conversacion": 700,
+    "analizar_calidad_documento": 600,
+    "analizar_fortaleza_caso": 700,
+    "validar_jurisprudencia": 400,
+    "resumir_conversacion": 300,
+}
+TOKENS_SALIDA_DEFECTO = 300
+
+# Peso relativo de cada error inyectado
+ERRORES = (("rate_limit", 0.5), ("timeout", 0.3), ("servidor", 0.2))
+
+# Tokens por chunk en modo stream
+TOKENS_POR_CHUNK = 20
+
+# Granularidad del caché de prefijos de OpenAI
+BLOQUE_CACHE = 128
+
+_PALABRAS_URGENTES = re.compile(
+    r"cirug[ií]a|urgen|emergencia|c[aá]ncer|quimioterapia|di[aá]lisis|muerte|medicamento|uci\b",
+    re.IGNORECASE,
+)
+_REQUEST = httpx.Request("POST", "https://simulado.local/v1/chat/completions")
+
+
+def _hash(*partes: str) -> int:
+    return int.from_bytes(hashlib.sha256("\x00".join(partes).encode()).digest()[:8], "big")
+
+
+def _texto_mensajes(mensajes: list) -> str:
+    return "\n".join(str(m.get("content") or "") for m in mensajes)
+
+
+def _rellenar(base: str, parrafo: str, tokens_objetivo: int) -> str:
+    """Repite el párrafo hasta acercarse al tamaño de una respuesta real."""
+    partes = [base]
+    faltante = tokens_objetivo - estimar_tokens(base)
+    tokens_parrafo = max(estimar_tokens(parrafo), 1)
+    for i in range(max(faltante // tokens_parrafo, 0)):
+        partes.append(f"{i + 1}. {parrafo}")
+    return "\n\n".join(partes)
+
+
+# ============ CONTENIDO POR FUNCIÓN ============
+
+def _documento(funcion: str, mensajes: list, tokens: int) -> str:
+    datos = str(mensajes[-1].get("content") or "")
+    if funcion == "generar_tutela":
+        titulo = "ACCIÓN DE TUTELA"
+        secciones = (
+            "HECHOS", "DERECHOS VULNERADOS", "PRETENSIONES", "FUNDAMENTOS DE DERECHO",
+            "PROCEDENCIA Y LEGITIMIDAD", "INEXISTENCIA DE OTRO MECANISMO IDÓNEO",
+            "PRUEBAS", "JURAMENTO", "NOTIFICACIONES",
+        )
+        parrafo = (
+            "De conformidad con el artículo 86 de la Constitución Política y el Decreto 2591 "
+            "de 1991, la acción de tutela procede para la protección inmediata de los derechos "
+            "fundamentales vulnerados por la acción u omisión de la entidad accionada "
+            "(Sentencia T-760/2008)."
+        )
+    else:
+        titulo = "DERECHO DE PETICIÓN"
+        secciones = ("OBJETO", "HECHOS", "FUNDAMENTOS DE DERECHO", "PETICIONES", "ANEXOS", "NOTIFICACIONES")
+        parrafo = (
+            "Con fundamento en el artículo 23 de la Constitución Política y la Ley 1755 de 2015, "
+            "solicito respuesta de fondo dentro del término de quince (15) días hábiles."
+        )
+    cuerpo = "\n\n".join(f"{seccion}\n\n{parrafo}" for seccion in secciones)
+    base = f"{titulo}\n\n[DOCUMENTO SIMULADO]\n\n{datos}\n\n{cuerpo}"
+    return _rellenar(base, parrafo, tokens)
+
+
+def _extraccion(mensajes: list) -> str:
+    texto = _texto_mensajes(mensajes)
+    usuario = " ".join(re.findall(r"^USUARIO: (.+)$", texto, re.MULTILINE))
+    urgente = bool(_PALABRAS_URGENTES.search(usuario))
+    entidad = re.search(r"\b(EPS [A-ZÁÉÍÓÚÑ][\wÁÉÍÓÚÑáéíóúñ]+|Colpensiones|Nueva EPS|Sanitas)\b", usuario)
+    tipo = "TUTELA" if urgente else "DERECHO_PETICION"
+    return json.dumps({
+        "tipo_documento": tipo,
+        "razon_tipo_documento": "Respuesta simulada",
+        "hechos": usuario[:1500],
+        "ciudad_de_los_hechos": "Bogotá",
+        "derechos_vulnerados": "Derecho a la Salud (Art. 49 C.P.)" if urgente else "",
+        "entidad_accionada": entidad.group(0) if entidad else "",
+        "direccion_entidad": "",
+        "pretensiones": "Que se ordene a la entidad atender la solicitud del usuario",
+        "fundamentos_derecho": "",
+        "pruebas": "",
+        "actua_en_representacion": False,
+        "nombre_representado": "",
+        "identificacion_representado": "",
+        "relacion_representado": "",
+        "tipo_representado": "",
+        "hubo_derecho_peticion_previo": False,
+        "detalle_derecho_peticion_previo": "",
+        "tiene_perjuicio_irremediable": urgente,
+        "es_procedente_tutela": urgente,
+        "razon_improcedencia": "" if urgente else "No ha agotado derecho de petición previo",
+        "tipo_documento_recomendado": tipo,
+    }, ensure_ascii=False)
+
+
+def _criterio(rng: random.Random, maximo: int, **extra) -> dict:
+    return {"puntos": rng.randint(maximo // 2, maximo), "comentario": "Evaluación simulada", **extra}
+
+
+def _calidad(mensajes: list, rng: random.Random) -> str:
+    if "derechos de petición" in str(mensajes[0].get("content") or ""):
+        criterios = {
+            "estructura": _criterio(rng, 15), "coherencia": _criterio(rng, 15),
+            "datos": _criterio(rng, 15), "lenguaje": _criterio(rng, 15),
+            "fundamentos_juridicos": _criterio(
+                rng, 15, cita_art23=True, cita_ley1755=True, menciona_plazo_15dias=True
+            ),
+            "peticiones_numeradas": _criterio(rng, 15, estan_numeradas=True, son_especificas=True),
+            "completitud": _criterio(rng, 10),
+        }
+    else:
+        criterios = {
+            "estructura": _criterio(rng, 15), "coherencia": _criterio(rng, 15),
+            "datos": _criterio(rng, 15), "lenguaje": _criterio(rng, 15),
+            "fundamentos": _criterio(rng, 10), "procedencia": _criterio(rng, 10),
+            "subsidiariedad": _criterio(rng, 10), "completitud": _criterio(rng, 10),
+        }
+    total = sum(c["puntos"] for c in criterios.values())
+    return json.dumps({
+        "puntuacion_total": total,
+        **criterios,
+        "problemas_encontrados": [],
+        "sugerencias_mejora": ["Sugerencia simulada"],
+        "listo_para_radicar": total >= 70,
+    }, ensure_ascii=False)
+
+
+def _fortaleza(mensajes: list, rng: random.Random) -> str:
+    if "derechos de petición" in str(mensajes[0].get("content") or ""):
+        criterios = {
+            "claridad_solicitud": _criterio(rng, 20), "legitimacion": _criterio(rng, 20),
+            "competencia_entidad": _criterio(rng, 20), "claridad_hechos": _criterio(rng, 15),
+            "especificidad": _criterio(rng, 15), "fundamentos": _criterio(rng, 10),
+        }
+        tipo = {}
+    else:
+        criterios = {
+            "procedencia_tutela": _criterio(rng, 20, es_procedente=True),
+            "derechos_fundamentales": _criterio(rng, 20), "subsidiaridad": _criterio(rng, 20),
+            "legitimacion": _criterio(rng, 15), "claridad_hechos": _criterio(rng, 15),
+            "inmediatez": _criterio(rng, 10),
+        }
+        tipo = {"es_tipo_documento_correcto": True, "sugerencia_tipo_documento": "", "razon_sugerencia": ""}
+    total = sum(c["puntos"] for c in criterios.values())
+    return json.dumps({
+        "fortaleza_total": total,
+        "probabilidad_exito": "alta" if total >= 80 else "media" if total >= 60 else "baja",
+        **tipo,
+        **criterios,
+        "puntos_fuertes": ["Fortaleza simulada"],
+        "puntos_debiles": [],
+        "recomendaciones": [],
+        "advertencias": [],
+        "debe_proceder": total >= 50,
+        "razon_no_proceder": "",
+    }, ensure_ascii=False)
+
+
+def _jurisprudencia(mensajes: list) -> str:
+    referencias = re.findall(r"Sentencia\s+[TCS]U?-\d+[/-]\d{4}", _texto_mensajes(mensajes), re.IGNORECASE)
+    return json.dumps({
+        "sentencias": [
+            {
+                "referencia": referencia,
+                "posiblemente_real": True,
+                "tema_conocido": "desconocido",
+                "riesgo_alucinacion": "medio",
+                "comentario": "Validación simulada",
+            }
+            for referencia in dict.fromkeys(referencias)
+        ],
+        "recomendacion_general": "Verificar manualmente",
+    }, ensure_ascii=False)
+
+
+def _json_de_esquema(esquema: dict) -> str:
+    """Objeto que cumple un JSON Schema plano (structured outputs de funciones sin plantilla)."""
+    valores = {}
+    for campo, propiedad in esquema.get("properties", {}).items():
+        if "enum" in propiedad:
+            valores[campo] = propiedad["enum"][0]
+        elif propiedad.get("type") == "boolean":
+            valores[campo] = False
+        elif propiedad.get("type") in ("integer", "number"):
+            valores[campo] = 0
+        else:
+            valores[campo] = "Dato simulado"
+    return json.dumps(valores, ensure_ascii=False)
+
+
+def _contenido(funcion: str, parametros: dict, tokens: int, rng: random.Random) -> str:
+    mensajes = parametros.get("messages") or []
+    if funcion in ("generar_tutela", "generar_derecho_peticion"):
+        return _documento(funcion, mensajes, tokens)
+    if funcion == "extraer_datos_conversacion":
+        return _extraccion(mensajes)
+    if funcion == "analizar_calidad_documento":
+        return _calidad(mensajes, rng)
+    if funcion == "analizar_fortaleza_caso":
+        return _fortaleza(mensajes, rng)
+    if funcion == "validar_jurisprudencia":
+        return _jurisprudencia(mensajes)
+    if funcion == "resumir_conversacion":
+        lineas = [l for l in _texto_mensajes(mensajes[1:]).splitlines() if l.startswith("USUARIO:")]
+        return "\n".join(f"- {l[len('USUARIO: '):][:200]}" for l in lineas[:10]) or "- Sin datos"
+    formato = parametros.get("response_format") or {}
+    if formato.get("type") == "json_schema":
+        return _json_de_esquema(formato["json_schema"]["schema"])
+    if formato.get("type") == "json_object":
+        return "{}"
+    return _rellenar("[RESPUESTA SIMULADA]", "Texto simulado.", tokens)
+
+
+# ============ PROVEEDOR ============
+
+class ProveedorSimulado:
+    """Misma interfaz que ProveedorOpenAI: crear(funcion, **parametros)."""
+
+    def __init__(self):
+        self._rng = random.Random(settings.LLM_SIMULADO_SEMILLA)
+        self._lock = threading.Lock()
+        self._prefijos_vistos = set()
+
+    # Lognormal con la mediana y el p95 configurados (z del p95 = 1.645)
+    def _ttft(self) -> float:
+        mediana = settings.LLM_SIMULADO_TTFT_MS / 1000
+        p95 = max(settings.LLM_SIMULADO_TTFT_P95_MS / 1000, mediana)
+        sigma = math.log(p95 / mediana) / 1.645 if mediana > 0 else 0
+        with self._lock:
+            return mediana * math.exp(self._rng.gauss(0, sigma)) if mediana > 0 else 0.0
+
+    def _error(self):
+        with self._lock:
+            if self._rng.random() >= settings.LLM_SIMULADO_TASA_ERROR:
+                return None
+            sorteo = self._rng.random() * sum(peso for _, peso in ERRORES)
+        for nombre, peso in ERRORES:
+            sorteo -= peso
+            if sorteo < 0:
+                break
+        if nombre == "timeout":
+            return APITimeoutError(request=_REQUEST)
+        if nombre == "rate_limit":
+            respuesta = httpx.Response(429, request=_REQUEST)
+            return RateLimitError("Rate limit simulado", response=respuesta, body=None)
+        respuesta = httpx.Response(500, request=_REQUEST)
+        return InternalServerError("Error simulado del servidor", response=respuesta, body=None)
+
+    def _tokens_cache(self, parametros: dict, tokens_prompt: int) -> int:
+        """Caché de prefijo: el mensaje de sistema se reutiliza desde la segunda llamada."""
+        mensajes = parametros.get("messages") or []
+        if not mensajes or mensajes[0].get("role") != "system":
+            return 0
+        prefijo = estimar_tokens(str(mensajes[0].get("content") or ""))
+        if prefijo < 1024:
+            return 0
+        clave = (parametros.get("prompt_cache_key"), _hash(str(mensajes[0].get("content"))))
+        with self._lock:
+            visto = clave in self._prefijos_vistos
+            self._prefijos_vistos.add(clave)
+        return min(prefijo // BLOQUE_CACHE * BLOQUE_CACHE, tokens_prompt) if visto else 0
+
+    def crear(self, funcion: str, **parametros):
+        escala = settings.LLM_SIMULADO_ESCALA_TIEMPO
+        ttft = self._ttft() * escala
+        error = self._error()
+        # En stream los errores de conexión cortan la respuesta a mitad de camino
+        corte_stream = parametros.get("stream") and isinstance(error, APITimeoutError)
+        if error is not None and not corte_stream:
+            time.sleep(ttft)
+            raise error
+
+        mensajes = parametros.get("messages") or []
+        rng = random.Random(_hash(funcion, _texto_mensajes(mensajes)))
+        limite = parametros.get("max_completion_tokens") or parametros.get("max_tokens")
+        objetivo = min(TOKENS_SALIDA.get(funcion, TOKENS_SALIDA_DEFECTO), limite or 10**6)
+        contenido = _contenido(funcion, parametros, objetivo, rng)
+        tokens_completion = estimar_tokens(contenido)
+        cortado = False
+        if limite and tokens_completion > limite:
+            # Como la API: la salida (incluso JSON) se corta en el límite (finish_reason="length")
+            contenido = contenido[:int(len(contenido) * limite / tokens_completion)]
+            tokens_completion, cortado = estimar_tokens(contenido), True
+        tokens_prompt = estimar_tokens(_texto_mensajes(mensajes))
+        uso = {
+            "prompt_tokens": tokens_prompt,
+            "completion_tokens": tokens_completion,
+            "total_tokens": tokens_prompt + tokens_completion,
+            "prompt_tokens_details": {"cached_tokens": self._tokens_cache(parametros, tokens_prompt)},
+        }
+        base = {
+            "id": f"chatcmpl-sim-{uuid.uuid4().hex[:24]}",
+            "created": int(time.time()),
+            "model": parametros.get("model") or "simulado",
+        }
+        segundos_por_token = escala / settings.LLM_SIMULADO_TOKENS_POR_SEGUNDO
+
+        if parametros.get("stream"):
+            incluir_uso = (parametros.get("stream_options") or {}).get("include_usage", False)
+            return self._stream(
+                base, contenido, uso if incluir_uso else None, ttft, segundos_por_token,
+                finish_reason="length" if cortado else "stop",
+                error=error if corte_stream else None, corte=rng.random(),
+            )
+
+        time.sleep(ttft + tokens_completion * segundos_por_token)
+        return ChatCompletion.model_validate({
+            **base,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "finish_reason": "length" if cortado else "stop",
+                "message": {"role": "assistant", "content": contenido},
+            }],
+            "usage": uso,
+        })
+
+    def _stream(
+        self, base: dict, contenido: str, uso, ttft: float, segundos_por_token: float,
+        finish_reason: str = "stop", error: Exception = None, corte: float = 1.0,
+    ):
+        def chunk(delta: dict, finish_reason=None, **extra):
+            choices = [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else []
+            return ChatCompletionChunk.model_validate(
+                {**base, "object": "chat.completion.chunk", "choices": choices, **extra}
+            )
+
+        time.sleep(ttft)
+        yield chunk({"role": "assistant", "content": ""})
+        palabras = re.findall(r"\S+\s*", contenido)
+        paso = max(int(TOKENS_POR_CHUNK / 1.3), 1)  # ~1.3 tokens por palabra
+        for i in range(0, len(palabras), paso):
+            if error is not None and i >= len(palabras) * corte:
+                raise error
+            pedazo = "".join(palabras[i:i + paso])
+            time.sleep(estimar_tokens(pedazo) * segundos_por_token)
+            yield chunk({"content": pedazo})
+        if error is not None:
+            raise error
+        yield chunk({}, finish_reason=finish_reason)
+        if uso is not None:
+            yield chunk(None, usage=uso)
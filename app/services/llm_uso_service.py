@@ -0,0 +1,259 @@
+"""
+Contabilidad de tokens y costo de las llamadas al LLM (tabla llm_usage)
+
+- Cada llamada hecha por llm_service.completar() se registra con su función,
+  modelo, tokens y costo, atribuida al caso/usuario activo (ver llm_service.atribuir)
+- Presupuesto diario por nivel de usuario (nivel_service.PRESUPUESTO_LLM_POR_NIVEL):
+  las rutas que disparan generaciones lo verifican antes de llamar al modelo.
+  Cuentan las generaciones exitosas y las que están en curso (casos en
+  GENERANDO): la generación se reserva al encolarla, no al terminar
+- Agregados para el panel de administración (costo por función, usuario, caso, día)
+"""
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import cast, Date, func
+from sqlalchemy.orm import Session
+
+from ..core.database import SessionLocal
+from ..models.caso import Caso, EstadoCaso
+from ..models.llm_uso import LlmUso
+from ..models.user import User
+from .nivel_service import presupuesto_llm_de_nivel
+
+logger = logging.getLogger(__name__)
+
+# Precios en USD por millón de tokens: (prompt, prompt en caché, completion)
+PRECIOS_USD_POR_MILLON = {
+    "gpt-5.1-2025-11-13": (Decimal("1.25"), Decimal("0.125"), Decimal("10.00")),
+    "gpt-5-mini-2025-08-07": (Decimal("0.25"), Decimal("0.025"), Decimal("2.00")),
+}
+
+# Funciones que cuentan como una generación de documento
+FUNCIONES_GENERACION = ("generar_tutela", "generar_derecho_peticion")
+
+VENTANA_PRESUPUESTO = timedelta(hours=24)
+
+AGRUPACIONES = {
+    "funcion": LlmUso.funcion,
+    "modelo": LlmUso.modelo,
+    "usuario": LlmUso.user_id,
+    "caso": LlmUso.caso_id,
+    "dia": cast(LlmUso.creado_en, Date),
+}
+
+_modelos_sin_precio = set()
+
+
+class PresupuestoExcedido(Exception):
+    """El usuario agotó su presupuesto de IA de las últimas 24 horas."""
+    def __init__(self, razon: str, consumo: dict):
+        self.razon = razon
+        self.consumo = consumo
+        super().__init__(razon)
+
+
+def calcular_costo(modelo: str, tokens_prompt: int, tokens_cache: int, tokens_completion: int) -> Decimal:
+    """Costo en USD de una llamada (0 si el modelo no tiene precio configurado)."""
+    precios = PRECIOS_USD_POR_MILLON.get(modelo)
+    if precios is None:
+        if modelo not in _modelos_sin_precio:
+            _modelos_sin_precio.add(modelo)
+            logger.warning(f"[LLM] Modelo sin precio configurado: {modelo} (costo registrado en 0)")
+        return Decimal(0)
+
+    precio_prompt, precio_cache, precio_completion = precios
+    total = (
+        (tokens_prompt - tokens_cache) * precio_prompt
+        + tokens_cache * precio_cache
+        + tokens_completion * precio_completion
+    )
+    return (total / 1_000_000).quantize(Decimal("0.000001"))
+
+
+def registrar_uso(
+    funcion: str,
+    modelo: str,
+    caso_id: Optional[int],
+    user_id: Optional[int],
+    tokens_prompt: int = 0,
+    tokens_cache: int = 0,
+    tokens_completion: int = 0,
+    duracion_ms: Optional[int] = None,
+    error: Optional[str] = None,
+):
+    """
+    Inserta el registro de una llamada en su propia transacción.
+
+    Nunca lanza: un fallo de contabilidad no debe romper la generación.
+    """
+    db = SessionLocal()
+    try:
+        db.add(LlmUso(
+            caso_id=caso_id,
+            user_id=user_id,
+            funcion=funcion,
+            modelo=modelo,
+            tokens_prompt=tokens_prompt,
+            tokens_prompt_cache=tokens_cache,
+            tokens_completion=tokens_completion,
+            costo_usd=calcular_costo(modelo, tokens_prompt, tokens_cache, tokens_completion),
+            duracion_ms=duracion_ms,
+            exito=error is None,
+            error=error,
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[LLM] No se pudo registrar el uso de {funcion} (caso {caso_id}): {e}")
+    finally:
+        db.close()
+
+
+def bloquear_presupuesto(user_id: int, db: Session):
+    """
+    Serializa las reservas de generación de un usuario hasta el próximo commit
+    (SELECT ... FOR UPDATE sobre su fila): dos /generar simultáneos no pueden
+    pasar la verificación con el mismo cupo.
+    """
+    db.query(User.id).filter(User.id == user_id).with_for_update().one()
+
+
+def consumo_usuario(user_id: int, db: Session, ventana: timedelta = VENTANA_PRESUPUESTO) -> dict:
+    """
+    Generaciones y costo del usuario en la ventana.
+
+    generaciones = exitosas (las fallidas no consumen cupo) + en curso (casos
+    en GENERANDO, aún sin registro en llm_usage).
+    """
+    desde = datetime.utcnow() - ventana
+    exitosas, costo = db.query(
+        func.count(LlmUso.id).filter(
+            LlmUso.funcion.in_(FUNCIONES_GENERACION),
+            LlmUso.exito.is_(True),
+        ),
+        func.coalesce(func.sum(LlmUso.costo_usd), 0),
+    ).filter(
+        LlmUso.user_id == user_id,
+        LlmUso.creado_en >= desde,
+    ).one()
+    en_curso = db.query(func.count(Caso.id)).filter(
+        Caso.user_id == user_id,
+        Caso.estado == EstadoCaso.GENERANDO,
+        Caso.updated_at >= desde,  # una tarea caída no bloquea el cupo indefinidamente
+    ).scalar()
+    return {
+        "generaciones": exitosas + en_curso,
+        "generaciones_en_curso": en_curso,
+        "costo_usd": float(costo),
+    }
+
+
+def verificar_presupuesto(usuario: User, db: Session, generacion: bool = True) -> dict:
+    """
+    Verifica que el usuario tenga presupuesto de IA disponible.
+
+    Args:
+        usuario: Usuario que dispara la llamada
+        generacion: True si la operación genera un documento (cuenta contra generaciones_dia)
+
+    Returns:
+        dict: consumo actual y presupuesto del nivel
+
+    Raises:
+        PresupuestoExcedido: Si alcanzó el límite de generaciones o de costo
+    """
+    presupuesto = presupuesto_llm_de_nivel(usuario.nivel_usuario)
+    consumo = consumo_usuario(usuario.id, db)
+    estado = {**consumo, "presupuesto": presupuesto}
+
+    if generacion and consumo["generaciones"] >= presupuesto["generaciones_dia"]:
+        raise PresupuestoExcedido(
+            f"Alcanzaste el límite de {presupuesto['generaciones_dia']} generaciones en 24 horas",
+            estado,
+        )
+    if consumo["costo_usd"] >= presupuesto["costo_usd_dia"]:
+        raise PresupuestoExcedido("Alcanzaste el límite diario de uso de IA", estado)
+    return estado
+
+
+def resumen_uso(
+    db: Session,
+    agrupar_por: str = "funcion",
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    caso_id: Optional[int] = None,
+    limite: int = 100,
+) -> list:
+    """
+    Agregados de uso del LLM, ordenados por costo descendente.
+
+    Args:
+        agrupar_por: funcion | modelo | usuario | caso | dia
+    """
+    clave = AGRUPACIONES[agrupar_por]
+    query = db.query(
+        clave.label("clave"),
+        func.count(LlmUso.id).label("llamadas"),
+        func.count(LlmUso.id).filter(LlmUso.exito.is_(False)).label("errores"),
+        func.coalesce(func.sum(LlmUso.tokens_prompt), 0).label("tokens_prompt"),
+        func.coalesce(func.sum(LlmUso.tokens_prompt_cache), 0).label("tokens_prompt_cache"),
+        func.coalesce(func.sum(LlmUso.tokens_completion), 0).label("tokens_completion"),
+        func.coalesce(func.sum(LlmUso.costo_usd), 0).label("costo_usd"),
+        func.avg(LlmUso.duracion_ms).label("duracion_promedio_ms"),
+    )
+    if desde:
+        query = query.filter(LlmUso.creado_en >= desde)
+    if hasta:
+        query = query.filter(LlmUso.creado_en < hasta)
+    if user_id is not None:
+        query = query.filter(LlmUso.user_id == user_id)
+    if caso_id is not None:
+        query = query.filter(LlmUso.caso_id == caso_id)
+
+    filas = query.group_by(clave).order_by(func.sum(LlmUso.costo_usd).desc()).limit(limite).all()
+    return [
+        {
+            agrupar_por: fila.clave.isoformat() if agrupar_por == "dia" else fila.clave,
+            "llamadas": fila.llamadas,
+            "errores": fila.errores,
+            "tokens_prompt": int(fila.tokens_prompt),
+            "tokens_prompt_cache": int(fila.tokens_prompt_cache),
+            "tokens_completion": int(fila.tokens_completion),
+            "costo_usd": float(fila.costo_usd),
+            "duracion_promedio_ms": int(fila.duracion_promedio_ms or 0),
+        }
+        for fila in filas
+    ]
+
+
+def costo_por_documento(db: Session, desde: Optional[datetime] = None) -> dict:
+    """
+    Costo unitario de los documentos: total de IA por caso (extracción,
+    generaciones y regeneraciones) promediado sobre los casos con generación.
+    """
+    por_caso = db.query(
+        LlmUso.caso_id.label("caso_id"),
+        func.sum(LlmUso.costo_usd).label("costo"),
+        func.count(LlmUso.id).filter(LlmUso.funcion.in_(FUNCIONES_GENERACION)).label("generaciones"),
+    ).filter(LlmUso.caso_id.isnot(None))
+    if desde:
+        por_caso = por_caso.filter(LlmUso.creado_en >= desde)
+    por_caso = por_caso.group_by(LlmUso.caso_id).subquery()
+
+    casos, costo_promedio, costo_maximo, generaciones_promedio = db.query(
+        func.count(por_caso.c.caso_id),
+        func.avg(por_caso.c.costo),
+        func.max(por_caso.c.costo),
+        func.avg(por_caso.c.generaciones),
+    ).filter(por_caso.c.generaciones > 0).one()
+
+    return {
+        "casos": casos,
+        "costo_promedio_usd": float(costo_promedio or 0),
+        "costo_maximo_usd": float(costo_maximo or 0),
+        "generaciones_promedio": float(generaciones_promedio or 0),
+    }
@@ -8,6 +8,67 @@ from sqlalchemy import func
 
 from ..models import User, Pago, EstadoPago
 
+# Límites de sesión por nivel (0=FREE, 1=BRONCE, 2=PLATA, 3=ORO)
+LIMITES_POR_NIVEL = {
+    0: {  # FREE
+        "sesiones_dia": 3,
+        "min_sesion": 15,  # 15 min universal para todos
+        "min_totales": None  # Sin límite de minutos totales
+    },
+    1: {  # BRONCE
+        "sesiones_dia": 5,
+        "min_sesion": 15,  # 15 min universal para todos
+        "min_totales": None  # Sin límite de minutos totales
+    },
+    2: {  # PLATA
+        "sesiones_dia": 7,
+        "min_sesion": 15,  # 15 min universal para todos
+        "min_totales": None  # Sin límite de minutos totales
+    },
+    3: {  # ORO
+        "sesiones_dia": 10,
+        "min_sesion": 15,  # 15 min universal para todos
+        "min_totales": None  # Sin límite de minutos totales
+    }
+}
+
+# Presupuesto de IA por nivel, en una ventana móvil de 24 horas:
+# - generaciones_dia: documentos generados (cada regeneración cuenta)
+# - costo_usd_dia: costo de todas las llamadas al LLM atribuidas al usuario
+PRESUPUESTO_LLM_POR_NIVEL = {
+    0: {"generaciones_dia": 6, "costo_usd_dia": 1.00},   # FREE
+    1: {"generaciones_dia": 10, "costo_usd_dia": 1.50},  # BRONCE
+    2: {"generaciones_dia": 14, "costo_usd_dia": 2.00},  # PLATA
+    3: {"generaciones_dia": 20, "costo_usd_dia": 3.00},  # ORO
+}
+
+NOMBRES_NIVEL = {
+    0: "FREE",
+    1: "BRONCE",
+    2: "PLATA",
+    3: "ORO"
+}
+
+
+def nivel_por_pagos(pagos_semana: int) -> int:
+    """
+    Nivel correspondiente a una cantidad de pagos exitosos en la última semana
+
+    Returns:
+        int: 0=FREE, 1=BRONCE, 2=PLATA, 3=ORO (3 o más pagos)
+    """
+    return min(max(pagos_semana, 0), 3)
+
+
+def limites_de_nivel(nivel: int) -> dict:
+    """Límites de sesión para un nivel (FREE si el nivel no existe)"""
+    return LIMITES_POR_NIVEL.get(nivel, LIMITES_POR_NIVEL[0])
+
+
+def presupuesto_llm_de_nivel(nivel: int) -> dict:
+    """Presupuesto diario de IA para un nivel (FREE si el nivel no existe)"""
+    return PRESUPUESTO_LLM_POR_NIVEL.get(nivel, PRESUPUESTO_LLM_POR_NIVEL[0])
+
 
 def calcular_nivel_usuario(user_id: int, db: Session) -> int:
     """
@@ -26,24 +87,8 @@ def calcular_nivel_usuario(user_id: int, db: Session) -> int:
     Returns:
         int: 0=FREE, 1=BRONCE, 2=PLATA, 3=ORO
     """
-    hace_7_dias = datetime.utcnow() - timedelta(days=7)
-
-    # Contar pagos exitosos en últimos 7 días
-    pagos_semana = db.query(Pago).filter(
-        Pago.user_id == user_id,
-        Pago.estado == EstadoPago.EXITOSO,
-        Pago.fecha_pago >= hace_7_dias
-    ).count()
-
-    # Determinar nivel según cantidad de pagos
-    if pagos_semana == 0:
-        return 0  # FREE
-    elif pagos_semana == 1:
-        return 1  # BRONCE
-    elif pagos_semana == 2:
-        return 2  # PLATA
-    else:  # 3 o más
-        return 3  # ORO
+    # Contar pagos exitosos en últimos 7 días y determinar nivel
+    return nivel_por_pagos(_contar_pagos_semana(user_id, db))
 
 
 def recalcular_todos_los_niveles(db: Session):
@@ -93,41 +138,11 @@ def obtener_limites_usuario(user_id: int, db: Session) -> dict:
     if not usuario:
         raise ValueError(f"Usuario {user_id} no encontrado")
 
-    limites_por_nivel = {
-        0: {  # FREE
-            "sesiones_dia": 3,
-            "min_sesion": 15,  # 15 min universal para todos
-            "min_totales": None  # Sin límite de minutos totales
-        },
-        1: {  # BRONCE
-            "sesiones_dia": 5,
-            "min_sesion": 15,  # 15 min universal para todos
-            "min_totales": None  # Sin límite de minutos totales
-        },
-        2: {  # PLATA
-            "sesiones_dia": 7,
-            "min_sesion": 15,  # 15 min universal para todos
-            "min_totales": None  # Sin límite de minutos totales
-        },
-        3: {  # ORO
-            "sesiones_dia": 10,
-            "min_sesion": 15,  # 15 min universal para todos
-            "min_totales": None  # Sin límite de minutos totales
-        }
-    }
-
-    nombres_nivel = {
-        0: "FREE",
-        1: "BRONCE",
-        2: "PLATA",
-        3: "ORO"
-    }
-
-    limites = limites_por_nivel.get(usuario.nivel_usuario, limites_por_nivel[0])
+    limites = limites_de_nivel(usuario.nivel_usuario)
 
     return {
         "nivel": usuario.nivel_usuario,
-        "nombre_nivel": nombres_nivel.get(usuario.nivel_usuario, "FREE"),
+        "nombre_nivel": NOMBRES_NIVEL.get(usuario.nivel_usuario, "FREE"),
         **limites
     }
 
@@ -147,9 +162,11 @@ def actualizar_nivel_post_pago(user_id: int, db: Session):
     if not usuario:
         raise ValueError(f"Usuario {user_id} no encontrado")
 
-    # Recalcular nivel
-    nivel_nuevo = calcular_nivel_usuario(user_id, db)
+    nivel_anterior = usuario.nivel_usuario
+
+    # Recalcular nivel (un solo COUNT)
     pagos_semana = _contar_pagos_semana(user_id, db)
+    nivel_nuevo = nivel_por_pagos(pagos_semana)
 
     # Actualizar usuario
     usuario.nivel_usuario = nivel_nuevo
@@ -159,7 +176,7 @@ def actualizar_nivel_post_pago(user_id: int, db: Session):
     db.commit()
 
     return {
-        "nivel_anterior": usuario.nivel_usuario,
+        "nivel_anterior": nivel_anterior,
         "nivel_nuevo": nivel_nuevo,
         "pagos_semana": pagos_semana
     }
@@ -1,173 +1,31 @@
-from openai import OpenAI
-from ..core.config import settings
-import json
+from . import compactacion_service, llm_service, prompts_documentos
+from ..core.json_parcial import parsear_json_parcial
+from ..schemas import extraccion
+import logging
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
+
+MODELO_EXTRACCION = "gpt-5.1-2025-11-13"
+MAX_TOKENS_EXTRACCION = 2000
+MIN_TOKENS_REEXTRACCION = 400
 
 
 def generar_tutela(datos_caso: dict) -> str:
     """
     Genera un documento de tutela completo usando GPT-4
-    """
-
-    prompt = f"""Eres un abogado experto en derecho constitucional colombiano especializado en acciones de tutela.
-
-Genera un documento de ACCIÓN DE TUTELA completo, formal y profesional siguiendo la estructura legal colombiana.
-
-DATOS DEL CASO:
-
-SOLICITANTE:
-- Nombre: {datos_caso.get('nombre_solicitante', '')}
-- Identificación: {datos_caso.get('identificacion_solicitante', '')}
-- Dirección: {datos_caso.get('direccion_solicitante', '')}
-- Teléfono: {datos_caso.get('telefono_solicitante', '')}
-- Email: {datos_caso.get('email_solicitante', '')}
-- Actúa en representación: {'Sí' if datos_caso.get('actua_en_representacion', False) else 'No'}
-{f'''- Persona representada: {datos_caso.get('nombre_representado', '')}
-- Identificación representado: {datos_caso.get('identificacion_representado', '')}
-- Relación: {datos_caso.get('relacion_representado', '')}
-- Tipo de persona representada: {datos_caso.get('tipo_representado', '')}''' if datos_caso.get('actua_en_representacion', False) else ''}
-
-ENTIDAD ACCIONADA:
-- Nombre: {datos_caso.get('entidad_accionada', '')}
-- Dirección: {datos_caso.get('direccion_entidad', '')}
-
-HECHOS:
-{datos_caso.get('hechos', '')}
-
-CIUDAD DONDE OCURRIERON LOS HECHOS:
-{datos_caso.get('ciudad_de_los_hechos', '')}
-
-DERECHOS VULNERADOS:
-{datos_caso.get('derechos_vulnerados', '')}
-
-PRETENSIONES:
-{datos_caso.get('pretensiones', '')}
-
-FUNDAMENTOS DE DERECHO:
-{datos_caso.get('fundamentos_derecho', '')}
-
-PRUEBAS Y DOCUMENTOS ANEXOS:
-{datos_caso.get('pruebas', 'No se especificaron pruebas')}
-
-INSTRUCCIONES PARA FORMATO PROFESIONAL:
-
-1. ENCABEZADO FORMAL:
-   Inicia el documento con este formato exacto:
-
-   **ACCIÓN DE TUTELA**
-
-   Señor
-   JUEZ COMPETENTE
-   REPARTO TUTELAS
-   Ciudad
-
-   REFERENCIA: Acción de Tutela
-   ACCIONANTE: [Nombre completo del solicitante]
-   ACCIONADO: [Nombre de la entidad]
-
-   [Nombre completo del solicitante], identificado(a) como aparece al pie de mi firma, {f'actuando en calidad de {datos_caso.get("relacion_representado", "representante legal")} de {datos_caso.get("nombre_representado", "")},' if datos_caso.get('actua_en_representacion', False) else 'actuando en nombre propio,'} me permito presentar ACCIÓN DE TUTELA contra [entidad], con fundamento en los artículos 86 de la Constitución Política de Colombia y el Decreto 2591 de 1991, con base en los siguientes:
-
-2. Si el solicitante actúa en representación de otra persona:
-   - Indica claramente en el encabezado quién firma y en qué calidad (madre, padre, cuidador, apoderado, etc.)
-   - Explica quién es la persona cuyos derechos están siendo vulnerados
-   - En la sección de PROCEDENCIA Y LEGITIMIDAD, justifica por qué tiene legitimidad para actuar
-
-3. ESTRUCTURA REQUERIDA (usar NUMERACIÓN ROMANA):
-
-   **I. HECHOS**
-   IMPORTANTE: Si hay VARIOS hechos, enuméralos en LISTA con formato numérico (1., 2., 3., etc.) o con guiones (- , - , -).
-   Si es UN SOLO hecho o narrativa simple, escríbelo como PÁRRAFO corrido bien redactado y argumentado.
-   Los hechos deben presentarse de forma clara y cronológica.
-
-   **II. DERECHOS FUNDAMENTALES VULNERADOS**
-   FORMATO DE PÁRRAFO: Presenta los derechos fundamentales vulnerados en un párrafo bien argumentado y profesional.
-   Explica de forma narrativa cuáles derechos se están vulnerando y cita los artículos constitucionales integrados en el texto.
-   Ejemplo: "En el presente caso se encuentran vulnerados el derecho a la salud consagrado en el Artículo 49 de la Constitución Política, así como el derecho a la vida contemplado en el Artículo 11 de la misma norma superior..."
-   NO uses listas, desarrolla una argumentación coherente en prosa legal.
-
-   **III. PRETENSIONES**
-   FORMATO DE LISTA OBLIGATORIO: Lo que se solicita que ordene el juez de manera clara y específica.
-   Usar formato enumerado: "PRIMERA:", "SEGUNDA:", "TERCERA:", etc.
-
-   **IV. FUNDAMENTOS DE DERECHO**
-   FORMATO DE PÁRRAFO: Redacta la base jurídica constitucional en párrafos corridos bien argumentados.
-   Menciona Art. 86 C.P. y Decreto 2591 de 1991 integrados en una argumentación coherente.
-   NO uses listas aquí, escribe texto argumentativo profesional.
-
-   **V. PROCEDENCIA Y LEGITIMIDAD**
-   FORMATO DE PÁRRAFO: Explica en texto corrido y bien argumentado por qué la tutela es procedente, citando el Decreto 2591 de 1991.
-   Demuestra la legitimación en la causa de forma narrativa.
-   Si actúa en representación, justifica la legitimidad en párrafos coherentes.
-   NO uses listas, desarrolla la argumentación en prosa legal profesional.
 
-   **VI. INEXISTENCIA DE OTRO MECANISMO DE DEFENSA JUDICIAL**
-   FORMATO DE PÁRRAFO: Explica en texto corrido qué otros medios ya se usaron y por qué no fueron suficientes.
-   Si hay perjuicio irremediable o urgencia, desarróllalo en argumentación coherente.
-   NO uses listas, escribe párrafos argumentativos profesionales.
-
-   **VII. PRUEBAS Y ANEXOS**
-   FORMATO DE LISTA OBLIGATORIO: Enumeración formal de las pruebas que se anexan.
-   Formato: "- Anexo 1: [descripción]" o "1. [descripción]"
-   USA EXACTAMENTE la información proporcionada en "PRUEBAS Y DOCUMENTOS ANEXOS" arriba.
-   Si no se especificaron pruebas, indica: "Se aportarán las pruebas pertinentes en el término legal."
-
-   **VIII. JURAMENTO**
-   "Manifiesto bajo la gravedad del juramento que no he interpuesto otra acción de tutela por los mismos hechos y derechos ante ninguna autoridad judicial."
-
-   **IX. NOTIFICACIONES**
-   Formato formal:
-   "Para efectos de notificaciones:
-   Dirección física: [dirección]
-   Correo electrónico: [email]
-   Teléfono: [teléfono]"
-
-4. CIERRE FORMAL:
-   Después de la sección IX, incluir:
-
-   "Del señor Juez, respetuosamente,
-
-   _________________________________
-   [Nombre completo del solicitante]
-   C.C. No. [número de identificación]
-   Dirección: [dirección]
-   Teléfono: [teléfono]
-   Email: [correo electrónico]"
-
-5. Usa lenguaje jurídico formal, profesional y técnico
-
-6. Cita artículos constitucionales relevantes con formato correcto: "Artículo XX de la Constitución Política de Colombia" o "Art. XX C.P."
-
-7. Las PRETENSIONES deben solicitar órdenes específicas al juez usando: "PRIMERA:", "SEGUNDA:", "TERCERA:"
-
-8. Todos los títulos de secciones principales deben estar en NEGRITA usando formato **TÍTULO**
-
-9. El documento debe tener apariencia de documento legal oficial, no de borrador
-
-10. NO cites jurisprudencia ni sentencias de la Corte Constitucional. Basa los argumentos únicamente en artículos constitucionales y decretos legales.
-
-11. Para separar secciones usa ÚNICAMENTE líneas en blanco (saltos de línea). NO uses separadores gráficos como guiones (--), asteriscos, líneas, ni ningún otro símbolo decorativo.
-
-12. IMPORTANTE - FORMATO DE CONTENIDO:
-   - USA LISTAS solo para: Hechos (si son varios), Pretensiones, Pruebas y Anexos
-   - USA PÁRRAFOS ARGUMENTATIVOS para: Derechos Fundamentales Vulnerados, Fundamentos de Derecho, Procedencia y Legitimidad, Inexistencia de otro mecanismo
-   - Los párrafos argumentativos deben ser texto corrido profesional, coherente y bien desarrollado. NO uses viñetas ni listas en secciones argumentativas.
-
-El documento debe estar completo, profesional y listo para ser presentado ante un juez de la República de Colombia."""
+    Instrucciones en un prefijo estable (cacheable) y datos del caso al final,
+    recortados al presupuesto de tokens (ver prompts_documentos).
+    """
+    prompt = prompts_documentos.armar_prompt(prompts_documentos.TUTELA, datos_caso)
+    prompts_documentos.registrar_prompt("generar_tutela", prompt)
 
     try:
-        response = client.chat.completions.create(
+        response = llm_service.completar(
+            "generar_tutela",
             model="gpt-5.1-2025-11-13",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Eres un abogado constitucionalista experto en Colombia. Generas documentos legales formales, completos y profesionales."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            messages=prompt.mensajes,
+            prompt_cache_key=prompts_documentos.clave_cache(prompts_documentos.TUTELA),
             temperature=0.3,  # Temperatura baja para máxima estabilidad en documentos jurídicos
             max_completion_tokens=4000
         )
@@ -175,6 +33,8 @@ El documento debe estar completo, profesional y listo para ser presentado ante u
         documento_generado = response.choices[0].message.content
         return documento_generado
 
+    except llm_service.LlmNoDisponible:
+        raise
     except Exception as e:
         raise Exception(f"Error generando tutela con OpenAI: {str(e)}")
 
@@ -182,151 +42,18 @@ El documento debe estar completo, profesional y listo para ser presentado ante u
 def generar_derecho_peticion(datos_caso: dict) -> str:
     """
     Genera un documento de derecho de petición usando GPT-4
-    """
-
-    prompt = f"""Eres un abogado experto en derecho administrativo colombiano especializado en derechos de petición.
-
-Genera un documento de DERECHO DE PETICIÓN completo, formal y profesional siguiendo la estructura legal colombiana.
-
-DATOS DEL CASO:
-
-SOLICITANTE:
-- Nombre: {datos_caso.get('nombre_solicitante', '')}
-- Identificación: {datos_caso.get('identificacion_solicitante', '')}
-- Dirección: {datos_caso.get('direccion_solicitante', '')}
-- Teléfono: {datos_caso.get('telefono_solicitante', '')}
-- Email: {datos_caso.get('email_solicitante', '')}
-- Actúa en representación: {'Sí' if datos_caso.get('actua_en_representacion', False) else 'No'}
-{f'''- Persona representada: {datos_caso.get('nombre_representado', '')}
-- Identificación representado: {datos_caso.get('identificacion_representado', '')}
-- Relación: {datos_caso.get('relacion_representado', '')}
-- Tipo de persona representada: {datos_caso.get('tipo_representado', '')}''' if datos_caso.get('actua_en_representacion', False) else ''}
 
-ENTIDAD DESTINATARIA:
-- Nombre: {datos_caso.get('entidad_accionada', '')}
-- Dirección: {datos_caso.get('direccion_entidad', '')}
-
-HECHOS:
-{datos_caso.get('hechos', '')}
-
-CIUDAD DONDE OCURRIERON LOS HECHOS:
-{datos_caso.get('ciudad_de_los_hechos', '')}
-
-PETICIONES:
-{datos_caso.get('pretensiones', '')}
-
-FUNDAMENTOS DE DERECHO:
-{datos_caso.get('fundamentos_derecho', '')}
-
-PRUEBAS Y DOCUMENTOS ANEXOS:
-{datos_caso.get('pruebas', 'No se especificaron documentos anexos')}
-
-INSTRUCCIONES PARA FORMATO PROFESIONAL:
-
-1. ENCABEZADO FORMAL:
-   Inicia el documento con este formato exacto:
-
-   **DERECHO DE PETICIÓN**
-
-   Señor(a)
-   REPRESENTANTE LEGAL
-   {datos_caso.get('entidad_accionada', 'ENTIDAD DESTINATARIA')}
-   {datos_caso.get('direccion_entidad', 'Ciudad')}
-
-   REFERENCIA: Derecho de Petición
-   PETICIONARIO: [Nombre completo del solicitante]
-   ASUNTO: [Breve descripción del objeto de la petición]
-
-   [Nombre completo del solicitante], identificado(a) como aparece al pie de mi firma, {f'actuando en calidad de {datos_caso.get("relacion_representado", "representante legal")} de {datos_caso.get("nombre_representado", "")},' if datos_caso.get('actua_en_representacion', False) else 'actuando en nombre propio,'} respetuosamente me dirijo a usted para presentar DERECHO DE PETICIÓN, con fundamento en el artículo 23 de la Constitución Política de Colombia y la Ley 1755 de 2015, con base en lo siguiente:
-
-2. ESTRUCTURA REQUERIDA (usar NUMERACIÓN ROMANA):
-
-   **I. OBJETO**
-   FORMATO DE PÁRRAFO: Presenta la naturaleza de la petición en texto corrido, de manera clara y directa.
-   NO uses listas, escribe un párrafo introductorio profesional.
-
-   **II. HECHOS**
-   IMPORTANTE: Si hay VARIOS hechos, enuméralos en LISTA con formato numérico (1., 2., 3., etc.) o con guiones (- , - , -).
-   Si es UN SOLO hecho o narrativa simple, escríbelo como PÁRRAFO corrido bien redactado.
-   Relata los hechos cronológicamente y de forma clara.
-
-   **III. FUNDAMENTOS DE DERECHO**
-   FORMATO DE PÁRRAFO: Redacta los fundamentos legales en párrafos corridos bien argumentados.
-   Integra de forma narrativa:
-   - Art. 23 de la Constitución Política de Colombia (fundamento constitucional)
-   - Ley 1755 de 2015 "Por medio de la cual se regula el Derecho Fundamental de Petición" (norma principal y específica)
-   - Menciona el término de respuesta dentro del texto argumentativo:
-     * 15 días hábiles (Ley 1755 de 2015) para peticiones generales
-     * 10 días hábiles (Ley 1755 de 2015) cuando se solicitan documentos o información específica
-   - Si involucra menores de edad: cita el Art. 44 C.P. y menciona el interés superior del menor en el texto
-   - Si involucra adultos mayores: cita el Art. 46 C.P. dentro de la argumentación
-   - Si involucra personas con discapacidad: cita el Art. 47 C.P. integrado en el texto
-   IMPORTANTE: La Ley 1755 de 2015 es la norma específica que regula el derecho de petición y sustituye los capítulos respectivos de la Ley 1437 de 2011.
-   NO uses listas de viñetas, desarrolla una argumentación legal coherente en prosa profesional.
-
-   **IV. PETICIONES**
-   FORMATO DE LISTA OBLIGATORIO: Enumera de forma clara, específica y accionable lo que se solicita a la entidad.
-   Usar formato: "PRIMERO:", "SEGUNDO:", "TERCERO:", etc.
-   Cada petición debe ser específica, medible y accionable.
-
-   **V. ANEXOS**
-   FORMATO DE LISTA OBLIGATORIO: Si se especificaron pruebas o documentos anexos, USA EXACTAMENTE la información proporcionada en "PRUEBAS Y DOCUMENTOS ANEXOS" arriba.
-   Formato: "- Anexo 1: [descripción]" o "1. [descripción]"
-   Si no se especificaron, indica: "Se aportarán posteriormente los documentos necesarios."
-
-   **VI. NOTIFICACIONES**
-   Formato formal:
-   "Para efectos de notificaciones y respuestas:
-   Dirección física: [dirección]
-   Correo electrónico: [email]
-   Teléfono: [teléfono]"
-
-3. CIERRE FORMAL:
-   Después de la sección VI, incluir:
-
-   "Cordialmente,
-
-   _________________________________
-   [Nombre completo del solicitante]
-   C.C. No. [número de identificación]
-   Dirección: [dirección]
-   Teléfono: [teléfono]
-   Email: [correo electrónico]"
-
-4. Usa lenguaje formal, respetuoso y técnico apropiado para un derecho de petición
-
-5. IMPORTANTE - NO uses terminología de acción de tutela:
-   - NO uses: "accionante", "accionado", "juez", "sentencia", "fallo", "pretensiones", "amparo"
-   - USA: "peticionario", "entidad destinataria", "respuesta", "peticiones", "solicitud"
-
-6. Todos los títulos de secciones principales deben estar en NEGRITA usando formato **TÍTULO**
-
-7. El documento debe tener apariencia de documento legal oficial, no de borrador
-
-8. El documento debe estar completo y listo para radicar
-
-9. Para separar secciones usa ÚNICAMENTE líneas en blanco (saltos de línea). NO uses separadores gráficos como guiones (--), asteriscos, líneas, ni ningún otro símbolo decorativo.
-
-10. IMPORTANTE - FORMATO DE CONTENIDO:
-   - USA LISTAS solo para: Hechos (si son varios), Peticiones, y Anexos
-   - USA PÁRRAFOS ARGUMENTATIVOS para: Objeto y Fundamentos de Derecho
-   - Los párrafos argumentativos deben ser texto corrido profesional, coherente y bien desarrollado. NO uses viñetas ni listas en secciones argumentativas.
-
-El documento debe estar listo para ser presentado ante la entidad correspondiente en Colombia."""
+    Misma estructura de prompt que generar_tutela (prefijo estable + datos).
+    """
+    prompt = prompts_documentos.armar_prompt(prompts_documentos.DERECHO_PETICION, datos_caso)
+    prompts_documentos.registrar_prompt("generar_derecho_peticion", prompt)
 
     try:
-        response = client.chat.completions.create(
+        response = llm_service.completar(
+            "generar_derecho_peticion",
             model="gpt-5.1-2025-11-13",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Eres un abogado experto en derecho administrativo en Colombia. Generas documentos legales formales, completos y profesionales."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            messages=prompt.mensajes,
+            prompt_cache_key=prompts_documentos.clave_cache(prompts_documentos.DERECHO_PETICION),
             temperature=0.3,  # Temperatura baja para máxima estabilidad en documentos jurídicos
             max_completion_tokens=3000
         )
@@ -334,6 +61,8 @@ El documento debe estar listo para ser presentado ante la entidad correspondient
         documento_generado = response.choices[0].message.content
         return documento_generado
 
+    except llm_service.LlmNoDisponible:
+        raise
     except Exception as e:
         raise Exception(f"Error generando derecho de petición con OpenAI: {str(e)}")
 
@@ -347,18 +76,17 @@ def extraer_datos_conversacion(mensajes: list) -> dict:
                   [{"remitente": "usuario|asistente", "texto": "...", "timestamp": "..."}]
 
     Returns:
-        dict con los campos extraídos: tipo_documento, razon_tipo_documento, hechos,
-        derechos_vulnerados, entidad_accionada, pretensiones, fundamentos_derecho, pruebas,
-        actua_en_representacion, nombre_representado, identificacion_representado,
-        relacion_representado, tipo_representado, hubo_derecho_peticion_previo,
-        detalle_derecho_peticion_previo
+        dict con todos los campos de schemas.extraccion.ExtraccionConversacion
+        (tipo_documento, hechos, entidad_accionada, pretensiones, subsidiariedad, ...)
+
+    La respuesta se restringe al esquema (structured outputs). Si llega cortada
+    o con campos inválidos se conservan los campos válidos y solo los demás se
+    vuelven a pedir (_reextraer_campos); lo que siga faltando toma su valor por
+    defecto.
     """
 
-    # Construir la conversación en formato legible
-    conversacion_texto = ""
-    for msg in mensajes:
-        remitente = "ASISTENTE" if msg["remitente"] == "asistente" else "USUARIO"
-        conversacion_texto += f"{remitente}: {msg['texto']}\n\n"
+    # Conversación compacta: sin relleno ni repeticiones, dentro del techo de tokens
+    conversacion_texto = compactacion_service.compactar_conversacion(mensajes).texto
 
     prompt = f"""Eres un asistente legal experto en derecho constitucional y administrativo colombiano.
 
@@ -589,58 +317,87 @@ Devuelve ÚNICAMENTE un objeto JSON válido con esta estructura exacta, sin mark
     "tipo_documento_recomendado": "TUTELA" o "DERECHO_PETICION"
 }}"""
 
+    mensajes_llm = [
+        {
+            "role": "system",
+            "content": "Eres un asistente legal experto en derecho constitucional colombiano. Extraes información de conversaciones y la estructuras en formato JSON válido."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-5.1-2025-11-13",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Eres un asistente legal experto en derecho constitucional colombiano. Extraes información de conversaciones y la estructuras en formato JSON válido."
-                },
+        # Salida restringida al esquema; en stream para rescatar lo recibido si se corta
+        try:
+            response = llm_service.completar(
+                "extraer_datos_conversacion",
+                model=MODELO_EXTRACCION,
+                messages=mensajes_llm,
+                temperature=0.3,  # Baja temperatura para mayor precisión
+                max_completion_tokens=MAX_TOKENS_EXTRACCION,
+                response_format=extraccion.formato_respuesta(),
+                stream=True
+            )
+            resultado_texto = response.choices[0].message.content
+        except llm_service.RespuestaInterrumpida as e:
+            logger.warning(f"[Extracción] Respuesta interrumpida, se rescatan los campos completos: {e.causa}")
+            resultado_texto = e.parcial
+
+        datos_validos, pendientes = extraccion.validar_parcial(parsear_json_parcial(resultado_texto))
+
+        # Solo los campos faltantes o inválidos se vuelven a pedir
+        if pendientes:
+            datos_validos.update(_reextraer_campos(mensajes_llm, resultado_texto, pendientes))
+
+        return extraccion.completar_con_defaults(datos_validos)
+
+    except llm_service.LlmNoDisponible:
+        raise
+    except Exception as e:
+        raise Exception(f"Error extrayendo datos de conversación con OpenAI: {str(e)}")
+
+
+def _reextraer_campos(mensajes_llm: list, respuesta_previa: str, campos: list) -> dict:
+    """
+    Vuelve a pedir solo los campos faltantes o inválidos de una extracción.
+
+    La conversación y las instrucciones se repiten idénticas (prefijo servido
+    desde el caché de prompts) y la salida se limita a los campos pedidos, así
+    que cuesta una fracción de la extracción completa. Si falla, los campos
+    quedan con su valor por defecto.
+    """
+    logger.info(f"[Extracción] Re-pidiendo {len(campos)} campos: {', '.join(campos)}")
+    try:
+        response = llm_service.completar(
+            "reextraer_campos",
+            model=MODELO_EXTRACCION,
+            messages=mensajes_llm + [
+                {"role": "assistant", "content": respuesta_previa or "{}"},
                 {
                     "role": "user",
-                    "content": prompt
-                }
+                    "content": (
+                        "Tu respuesta anterior quedó incompleta o tiene valores inválidos. "
+                        "Con las mismas reglas, devuelve ÚNICAMENTE un objeto JSON con estos campos: "
+                        + ", ".join(campos)
+                    )
+                },
             ],
-            temperature=0.3,  # Baja temperatura para mayor precisión
-            max_completion_tokens=2000,
-            response_format={"type": "json_object"}  # Forzar respuesta JSON
+            temperature=0.3,
+            max_completion_tokens=max(
+                MIN_TOKENS_REEXTRACCION,
+                MAX_TOKENS_EXTRACCION * len(campos) // len(extraccion.CAMPOS)
+            ),
+            response_format=extraccion.formato_respuesta(campos)
         )
-
-        resultado_texto = response.choices[0].message.content
-
-        # Parsear el JSON
-        datos_extraidos = json.loads(resultado_texto)
-
-        # Validar que tenga las claves esperadas
-        campos_esperados = [
-            "tipo_documento", "razon_tipo_documento", "hechos", "derechos_vulnerados",
-            "entidad_accionada", "direccion_entidad", "representante_legal",
-            "pretensiones", "fundamentos_derecho", "pruebas",
-            "actua_en_representacion", "nombre_representado", "identificacion_representado",
-            "relacion_representado", "tipo_representado", "hubo_derecho_peticion_previo",
-            "detalle_derecho_peticion_previo", "tiene_perjuicio_irremediable",
-            "es_procedente_tutela", "razon_improcedencia", "tipo_documento_recomendado"
-        ]
-        for campo in campos_esperados:
-            if campo not in datos_extraidos:
-                if campo == "tipo_documento":
-                    datos_extraidos[campo] = "TUTELA"  # Valor por defecto
-                elif campo in ["actua_en_representacion", "hubo_derecho_peticion_previo",
-                               "tiene_perjuicio_irremediable", "es_procedente_tutela"]:
-                    datos_extraidos[campo] = False  # Valor por defecto para booleanos
-                elif campo == "tipo_documento_recomendado":
-                    datos_extraidos[campo] = "DERECHO_PETICION"  # Por defecto recomendar derecho de petición (subsidiariedad)
-                else:
-                    datos_extraidos[campo] = ""
-
-        # Validar que tipo_documento tenga un valor válido
-        if datos_extraidos["tipo_documento"] not in ["TUTELA", "DERECHO_PETICION"]:
-            datos_extraidos["tipo_documento"] = "TUTELA"  # Fallback a tutela si el valor no es válido
-
-        return datos_extraidos
-
-    except json.JSONDecodeError as e:
-        raise Exception(f"Error al parsear respuesta JSON de OpenAI: {str(e)}")
     except Exception as e:
-        raise Exception(f"Error extrayendo datos de conversación con OpenAI: {str(e)}")
+        logger.warning(f"[Extracción] No se pudieron re-pedir los campos, quedan por defecto: {e}")
+        return {}
+
+    validos, pendientes = extraccion.validar_parcial(
+        parsear_json_parcial(response.choices[0].message.content), campos
+    )
+    if pendientes:
+        logger.warning(f"[Extracción] Campos por defecto tras re-pedirlos: {', '.join(pendientes)}")
+    return validos
@@ -2,14 +2,24 @@
 Servicio para gestión de pagos y reembolsos
 """
 
-from datetime import datetime
-from typing import List
+import logging
+from datetime import datetime, date, timedelta
+from typing import List, Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
-from ..models import Pago, Caso, User, EstadoPago, EstadoCaso, MetodoPago
-from .nivel_service import actualizar_nivel_post_pago
-from .sesion_service import desbloquear_sesiones_extra
+from ..models import Pago, Caso, User, SesionDiaria, EstadoPago, EstadoCaso, MetodoPago
+from .nivel_service import actualizar_nivel_post_pago, nivel_por_pagos, limites_de_nivel
+
+logger = logging.getLogger(__name__)
+
+# Estados desde los que una confirmación de la pasarela puede marcar el pago como exitoso
+# (un pago FALLIDO puede confirmarse si la pasarela reporta el éxito tarde)
+ESTADOS_CONFIRMABLES = [EstadoPago.PENDIENTE, EstadoPago.FALLIDO]
+
+# Sesiones bonus que se otorgan el mismo día por cada pago exitoso
+SESIONES_BONUS_POR_PAGO = 2
 
 
 def crear_pago_simulado(user_id: int, caso_id: int, monto: float, db: Session) -> Pago:
@@ -61,13 +71,89 @@ def crear_pago_simulado(user_id: int, caso_id: int, monto: float, db: Session) -
     return pago
 
 
+def _aplicar_beneficios_pago(pago: Pago, db: Session) -> dict:
+    """
+    Aplica los beneficios de un pago EXITOSO sin hacer commit (lo hace el llamador).
+
+    Bloquea las filas en orden fijo (pago -> caso -> usuario -> sesión diaria)
+    para que pagos concurrentes del mismo usuario se serialicen sin deadlocks.
+    El pago ya debe estar bloqueado por el llamador.
+    """
+    caso = db.query(Caso).filter(Caso.id == pago.caso_id).with_for_update().first()
+
+    if not caso:
+        raise ValueError(f"Caso {pago.caso_id} no encontrado")
+
+    usuario = db.query(User).filter(User.id == pago.user_id).with_for_update().first()
+
+    if not usuario:
+        raise ValueError(f"Usuario {pago.user_id} no encontrado")
+
+    # 1. Desbloquear documento
+    caso.documento_desbloqueado = True
+    caso.estado = EstadoCaso.PAGADO
+    caso.fecha_pago = pago.fecha_pago
+
+    # 2. Actualizar nivel del usuario (un solo COUNT; incluye este pago)
+    hace_7_dias = datetime.utcnow() - timedelta(days=7)
+    pagos_semana = db.query(func.count(Pago.id)).filter(
+        Pago.user_id == pago.user_id,
+        Pago.estado == EstadoPago.EXITOSO,
+        Pago.fecha_pago >= hace_7_dias
+    ).scalar()
+
+    nivel_anterior = usuario.nivel_usuario
+    nivel_nuevo = nivel_por_pagos(pagos_semana)
+
+    usuario.nivel_usuario = nivel_nuevo
+    usuario.pagos_ultimo_mes = pagos_semana  # Campo en BD, pero contiene pagos de semana
+    usuario.ultimo_recalculo_nivel = datetime.utcnow()
+
+    # 3. Desbloquear sesiones extra (+2 por cada pago)
+    usuario.sesiones_extra_hoy = (usuario.sesiones_extra_hoy or 0) + SESIONES_BONUS_POR_PAGO
+
+    hoy = date.today()
+    sesion_diaria = db.query(SesionDiaria).filter(
+        SesionDiaria.user_id == pago.user_id,
+        SesionDiaria.fecha == hoy
+    ).with_for_update().first()
+
+    if sesion_diaria:
+        sesion_diaria.sesiones_extra_bonus = usuario.sesiones_extra_hoy
+        total_permitidas = sesion_diaria.sesiones_base_permitidas + sesion_diaria.sesiones_extra_bonus
+        total_sesiones_disponibles = max(0, total_permitidas - sesion_diaria.sesiones_creadas)
+    else:
+        total_sesiones_disponibles = limites_de_nivel(nivel_nuevo)["sesiones_dia"] + usuario.sesiones_extra_hoy
+
+    return {
+        "documento_desbloqueado": True,
+        "caso_id": caso.id,
+        "nivel_actualizado": {
+            "nivel_anterior": nivel_anterior,
+            "nivel_nuevo": nivel_nuevo,
+            "pagos_semana": pagos_semana
+        },
+        "sesiones_extra": {
+            "sesiones_extra_hoy": usuario.sesiones_extra_hoy,
+            "total_sesiones_disponibles": total_sesiones_disponibles
+        },
+        "beneficios": {
+            "sesiones_bonus_hoy": SESIONES_BONUS_POR_PAGO,
+            "nivel_nuevo": nivel_nuevo,
+            "pagos_semana": pagos_semana
+        }
+    }
+
+
 def procesar_pago_exitoso(pago_id: int, db: Session) -> dict:
     """
-    Procesa un pago exitoso:
+    Procesa un pago exitoso en una sola transacción:
     1. Desbloquea documento
     2. Actualiza nivel del usuario
     3. Desbloquea sesiones extra
 
+    Si algo falla no queda nada aplicado a medias (rollback completo).
+
     Args:
         pago_id: ID del pago
         db: Sesión de base de datos
@@ -75,43 +161,105 @@ def procesar_pago_exitoso(pago_id: int, db: Session) -> dict:
     Returns:
         dict: Información de beneficios desbloqueados
     """
-    pago = db.query(Pago).filter(Pago.id == pago_id).first()
+    try:
+        pago = db.query(Pago).filter(Pago.id == pago_id).with_for_update().first()
 
-    if not pago:
-        raise ValueError(f"Pago {pago_id} no encontrado")
+        if not pago:
+            raise ValueError(f"Pago {pago_id} no encontrado")
 
-    if pago.estado != EstadoPago.EXITOSO:
-        raise ValueError(f"Pago {pago_id} no está en estado EXITOSO")
+        if pago.estado != EstadoPago.EXITOSO:
+            raise ValueError(f"Pago {pago_id} no está en estado EXITOSO")
 
-    caso = db.query(Caso).filter(Caso.id == pago.caso_id).first()
+        resultado = _aplicar_beneficios_pago(pago, db)
+        db.commit()
+        return resultado
+    except Exception:
+        db.rollback()
+        raise
+
+
+def confirmar_pago(
+    pago_id: int,
+    db: Session,
+    referencia_pago: Optional[str] = None,
+    fecha_pago: Optional[datetime] = None,
+) -> Optional[dict]:
+    """
+    Marca un pago como EXITOSO y entrega los beneficios, exactamente una vez.
 
-    if not caso:
-        raise ValueError(f"Caso {pago.caso_id} no encontrado")
+    La transición es un UPDATE condicionado al estado actual: si el webhook, el
+    polling del frontend y la reconciliación confirman el mismo pago a la vez,
+    solo uno de ellos gana y procesa los beneficios. Transición y beneficios
+    van en la misma transacción: si los beneficios fallan, el pago sigue
+    pendiente y el siguiente intento lo vuelve a procesar.
 
-    # 1. Desbloquear documento
-    caso.documento_desbloqueado = True
-    caso.estado = EstadoCaso.PAGADO
-    caso.fecha_pago = pago.fecha_pago
+    Args:
+        pago_id: ID del pago
+        db: Sesión de base de datos
+        referencia_pago: ID de la transacción en la pasarela (opcional)
+        fecha_pago: Momento del pago según la pasarela (por defecto ahora)
+
+    Returns:
+        dict con los beneficios, o None si el pago ya no estaba pendiente/fallido
+    """
+    valores = {
+        Pago.estado: EstadoPago.EXITOSO,
+        Pago.fecha_pago: fecha_pago or datetime.utcnow(),
+        Pago.updated_at: datetime.utcnow(),
+    }
+    if referencia_pago:
+        valores[Pago.referencia_pago] = str(referencia_pago)
 
-    # 2. Actualizar nivel del usuario
-    nivel_info = actualizar_nivel_post_pago(pago.user_id, db)
+    try:
+        # El UPDATE deja la fila del pago bloqueada hasta el commit
+        actualizados = db.query(Pago).filter(
+            Pago.id == pago_id,
+            Pago.estado.in_(ESTADOS_CONFIRMABLES)
+        ).update(valores, synchronize_session=False)
 
-    # 3. Desbloquear sesiones extra (+2 por cada pago)
-    sesiones_info = desbloquear_sesiones_extra(pago.user_id, 2, db)
+        if not actualizados:
+            db.rollback()
+            return None
+
+        # Los objetos cargados en la sesión deben ver el nuevo estado
+        db.expire_all()
+        pago = db.query(Pago).filter(Pago.id == pago_id).first()
+
+        resultado = _aplicar_beneficios_pago(pago, db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error confirmando pago {pago_id}: {str(e)}")
+        raise
+
+    return resultado
+
+
+def marcar_pago_fallido(pago_id: int, motivo: str, db: Session) -> bool:
+    """
+    Marca un pago PENDIENTE como FALLIDO.
+
+    Args:
+        pago_id: ID del pago
+        motivo: Se guarda en notas_admin
+        db: Sesión de base de datos
 
+    Returns:
+        True si el pago cambió de estado
+    """
+    actualizados = db.query(Pago).filter(
+        Pago.id == pago_id,
+        Pago.estado == EstadoPago.PENDIENTE
+    ).update({
+        Pago.estado: EstadoPago.FALLIDO,
+        Pago.notas_admin: motivo,
+        Pago.updated_at: datetime.utcnow(),
+    }, synchronize_session=False)
     db.commit()
 
-    return {
-        "documento_desbloqueado": True,
-        "caso_id": caso.id,
-        "nivel_actualizado": nivel_info,
-        "sesiones_extra": sesiones_info,
-        "beneficios": {
-            "sesiones_bonus_hoy": 2,
-            "nivel_nuevo": nivel_info["nivel_nuevo"],
-            "pagos_semana": nivel_info["pagos_semana"]
-        }
-    }
+    if actualizados:
+        db.expire_all()
+    return bool(actualizados)
 
 
 def solicitar_reembolso(caso_id: int, motivo: str, evidencia_url: str, db: Session):
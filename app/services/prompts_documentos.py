@@ -0,0 +1,495 @@
+"""
+Prompts de generación de documentos (tutela y derecho de petición)
+
+El prompt se arma en dos mensajes:
+- system: rol + instrucciones de formato. Es idéntico en todas las llamadas
+  del mismo tipo de documento, así que el proveedor lo sirve desde su caché de
+  prompts (prefijo estable ≥ 1024 tokens): menos latencia y tokens más baratos
+- user: los DATOS DEL CASO, lo único que cambia entre llamadas
+
+Los hechos se recortan para que los datos no pasen de
+LLM_PRESUPUESTO_TOKENS_DATOS; el recorte conserva el inicio y el final del
+texto y corta en límites de párrafo u oración. Las pruebas no se recortan: el
+documento debe listarlas exactamente como se dieron.
+
+Reporte de tamaños y ahorro estimado:
+    python -m app.services.prompts_documentos
+"""
+import logging
+import math
+import re
+from typing import Dict, List, NamedTuple
+
+from ..core import metricas
+from ..core.config import settings
+
+try:
+    import tiktoken
+    _CODIFICADOR = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken es opcional: sin él se estima por caracteres
+    _CODIFICADOR = None
+
+logger = logging.getLogger(__name__)
+
+TUTELA = "TUTELA"
+DERECHO_PETICION = "DERECHO_PETICION"
+
+# Caracteres por token en español (estimación conservadora sin tiktoken)
+CARACTERES_POR_TOKEN = 3.5
+
+# Campos que se pueden recortar (pruebas no: el documento las lista tal cual)
+CAMPOS_RECORTABLES = ("hechos",)
+
+# Ningún campo recortado queda por debajo de esto
+MIN_TOKENS_CAMPO = 200
+
+MARCA_RECORTE = "\n[… texto abreviado por extensión …]\n"
+
+_FIN_ORACION = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+class PromptDocumento(NamedTuple):
+    mensajes: List[dict]
+    tokens_prefijo: int      # Parte estable (cacheable)
+    tokens_datos: int        # Datos del caso, ya recortados
+    tokens_recortados: int   # Tokens de datos eliminados por el presupuesto
+
+
+def estimar_tokens(texto: str) -> int:
+    """Tokens del texto (tiktoken si está instalado; si no, estimación por caracteres)."""
+    if not texto:
+        return 0
+    if _CODIFICADOR is not None:
+        return len(_CODIFICADOR.encode(texto))
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+# Prefijos estables: no interpolar datos del caso aquí (rompería la caché)
+SISTEMA_TUTELA = """Eres un abogado constitucionalista experto en Colombia. Generas documentos legales formales, completos y profesionales.
+
+Eres un abogado experto en derecho constitucional colombiano especializado en acciones de tutela.
+
+Genera un documento de ACCIÓN DE TUTELA completo, formal y profesional siguiendo la estructura legal colombiana, con los DATOS DEL CASO que envía el usuario. [FÓRMULA DE ACTUACIÓN] es el texto de "FÓRMULA DE ACTUACIÓN" en los DATOS DEL CASO.
+
+INSTRUCCIONES PARA FORMATO PROFESIONAL:
+
+1. ENCABEZADO FORMAL:
+   Inicia el documento con este formato exacto:
+
+   **ACCIÓN DE TUTELA**
+
+   Señor
+   JUEZ COMPETENTE
+   REPARTO TUTELAS
+   Ciudad
+
+   REFERENCIA: Acción de Tutela
+   ACCIONANTE: [Nombre completo del solicitante]
+   ACCIONADO: [Nombre de la entidad]
+
+   [Nombre completo del solicitante], identificado(a) como aparece al pie de mi firma, [FÓRMULA DE ACTUACIÓN] me permito presentar ACCIÓN DE TUTELA contra [entidad], con fundamento en los artículos 86 de la Constitución Política de Colombia y el Decreto 2591 de 1991, con base en los siguientes:
+
+2. Si el solicitante actúa en representación de otra persona:
+   - Indica claramente en el encabezado quién firma y en qué calidad (madre, padre, cuidador, apoderado, etc.)
+   - Explica quién es la persona cuyos derechos están siendo vulnerados
+   - En la sección de PROCEDENCIA Y LEGITIMIDAD, justifica por qué tiene legitimidad para actuar
+
+3. ESTRUCTURA REQUERIDA (usar NUMERACIÓN ROMANA):
+
+   **I. HECHOS**
+   IMPORTANTE: Si hay VARIOS hechos, enuméralos en LISTA con formato numérico (1., 2., 3., etc.) o con guiones (- , - , -).
+   Si es UN SOLO hecho o narrativa simple, escríbelo como PÁRRAFO corrido bien redactado y argumentado.
+   Los hechos deben presentarse de forma clara y cronológica.
+
+   **II. DERECHOS FUNDAMENTALES VULNERADOS**
+   FORMATO DE PÁRRAFO: Presenta los derechos fundamentales vulnerados en un párrafo bien argumentado y profesional.
+   Explica de forma narrativa cuáles derechos se están vulnerando y cita los artículos constitucionales integrados en el texto.
+   Ejemplo: "En el presente caso se encuentran vulnerados el derecho a la salud consagrado en el Artículo 49 de la Constitución Política, así como el derecho a la vida contemplado en el Artículo 11 de la misma norma superior..."
+   NO uses listas, desarrolla una argumentación coherente en prosa legal.
+
+   **III. PRETENSIONES**
+   FORMATO DE LISTA OBLIGATORIO: Lo que se solicita que ordene el juez de manera clara y específica.
+   Usar formato enumerado: "PRIMERA:", "SEGUNDA:", "TERCERA:", etc.
+
+   **IV. FUNDAMENTOS DE DERECHO**
+   FORMATO DE PÁRRAFO: Redacta la base jurídica constitucional en párrafos corridos bien argumentados.
+   Menciona Art. 86 C.P. y Decreto 2591 de 1991 integrados en una argumentación coherente.
+   NO uses listas aquí, escribe texto argumentativo profesional.
+
+   **V. PROCEDENCIA Y LEGITIMIDAD**
+   FORMATO DE PÁRRAFO: Explica en texto corrido y bien argumentado por qué la tutela es procedente, citando el Decreto 2591 de 1991.
+   Demuestra la legitimación en la causa de forma narrativa.
+   Si actúa en representación, justifica la legitimidad en párrafos coherentes.
+   NO uses listas, desarrolla la argumentación en prosa legal profesional.
+
+   **VI. INEXISTENCIA DE OTRO MECANISMO DE DEFENSA JUDICIAL**
+   FORMATO DE PÁRRAFO: Explica en texto corrido qué otros medios ya se usaron y por qué no fueron suficientes.
+   Si hay perjuicio irremediable o urgencia, desarróllalo en argumentación coherente.
+   NO uses listas, escribe párrafos argumentativos profesionales.
+
+   **VII. PRUEBAS Y ANEXOS**
+   FORMATO DE LISTA OBLIGATORIO: Enumeración formal de las pruebas que se anexan.
+   Formato: "- Anexo 1: [descripción]" o "1. [descripción]"
+   USA EXACTAMENTE la información proporcionada en "PRUEBAS Y DOCUMENTOS ANEXOS" de los DATOS DEL CASO.
+   Si no se especificaron pruebas, indica: "Se aportarán las pruebas pertinentes en el término legal."
+
+   **VIII. JURAMENTO**
+   "Manifiesto bajo la gravedad del juramento que no he interpuesto otra acción de tutela por los mismos hechos y derechos ante ninguna autoridad judicial."
+
+   **IX. NOTIFICACIONES**
+   Formato formal:
+   "Para efectos de notificaciones:
+   Dirección física: [dirección]
+   Correo electrónico: [email]
+   Teléfono: [teléfono]"
+
+4. CIERRE FORMAL:
+   Después de la sección IX, incluir:
+
+   "Del señor Juez, respetuosamente,
+
+   _________________________________
+   [Nombre completo del solicitante]
+   C.C. No. [número de identificación]
+   Dirección: [dirección]
+   Teléfono: [teléfono]
+   Email: [correo electrónico]"
+
+5. Usa lenguaje jurídico formal, profesional y técnico
+
+6. Cita artículos constitucionales relevantes con formato correcto: "Artículo XX de la Constitución Política de Colombia" o "Art. XX C.P."
+
+7. Las PRETENSIONES deben solicitar órdenes específicas al juez usando: "PRIMERA:", "SEGUNDA:", "TERCERA:"
+
+8. Todos los títulos de secciones principales deben estar en NEGRITA usando formato **TÍTULO**
+
+9. El documento debe tener apariencia de documento legal oficial, no de borrador
+
+10. NO cites jurisprudencia ni sentencias de la Corte Constitucional. Basa los argumentos únicamente en artículos constitucionales y decretos legales.
+
+11. Para separar secciones usa ÚNICAMENTE líneas en blanco (saltos de línea). NO uses separadores gráficos como guiones (--), asteriscos, líneas, ni ningún otro símbolo decorativo.
+
+12. IMPORTANTE - FORMATO DE CONTENIDO:
+   - USA LISTAS solo para: Hechos (si son varios), Pretensiones, Pruebas y Anexos
+   - USA PÁRRAFOS ARGUMENTATIVOS para: Derechos Fundamentales Vulnerados, Fundamentos de Derecho, Procedencia y Legitimidad, Inexistencia de otro mecanismo
+   - Los párrafos argumentativos deben ser texto corrido profesional, coherente y bien desarrollado. NO uses viñetas ni listas en secciones argumentativas.
+
+13. Si en los DATOS DEL CASO aparece la marca "[… texto abreviado por extensión …]", significa que ese texto se abrevió por su longitud. NUNCA copies esa marca al documento ni menciones que hay texto omitido: redacta con la información disponible.
+
+El documento debe estar completo, profesional y listo para ser presentado ante un juez de la República de Colombia."""
+
+SISTEMA_DERECHO_PETICION = """Eres un abogado experto en derecho administrativo en Colombia. Generas documentos legales formales, completos y profesionales.
+
+Eres un abogado experto en derecho administrativo colombiano especializado en derechos de petición.
+
+Genera un documento de DERECHO DE PETICIÓN completo, formal y profesional siguiendo la estructura legal colombiana, con los DATOS DEL CASO que envía el usuario. [FÓRMULA DE ACTUACIÓN] es el texto de "FÓRMULA DE ACTUACIÓN" en los DATOS DEL CASO.
+
+INSTRUCCIONES PARA FORMATO PROFESIONAL:
+
+1. ENCABEZADO FORMAL:
+   Inicia el documento con este formato exacto:
+
+   **DERECHO DE PETICIÓN**
+
+   Señor(a)
+   REPRESENTANTE LEGAL
+   [Nombre de la entidad destinataria]
+   [Dirección de la entidad destinataria, o "Ciudad" si no se indicó]
+
+   REFERENCIA: Derecho de Petición
+   PETICIONARIO: [Nombre completo del solicitante]
+   ASUNTO: [Breve descripción del objeto de la petición]
+
+   [Nombre completo del solicitante], identificado(a) como aparece al pie de mi firma, [FÓRMULA DE ACTUACIÓN] respetuosamente me dirijo a usted para presentar DERECHO DE PETICIÓN, con fundamento en el artículo 23 de la Constitución Política de Colombia y la Ley 1755 de 2015, con base en lo siguiente:
+
+2. ESTRUCTURA REQUERIDA (usar NUMERACIÓN ROMANA):
+
+   **I. OBJETO**
+   FORMATO DE PÁRRAFO: Presenta la naturaleza de la petición en texto corrido, de manera clara y directa.
+   NO uses listas, escribe un párrafo introductorio profesional.
+
+   **II. HECHOS**
+   IMPORTANTE: Si hay VARIOS hechos, enuméralos en LISTA con formato numérico (1., 2., 3., etc.) o con guiones (- , - , -).
+   Si es UN SOLO hecho o narrativa simple, escríbelo como PÁRRAFO corrido bien redactado.
+   Relata los hechos cronológicamente y de forma clara.
+
+   **III. FUNDAMENTOS DE DERECHO**
+   FORMATO DE PÁRRAFO: Redacta los fundamentos legales en párrafos corridos bien argumentados.
+   Integra de forma narrativa:
+   - Art. 23 de la Constitución Política de Colombia (fundamento constitucional)
+   - Ley 1755 de 2015 "Por medio de la cual se regula el Derecho Fundamental de Petición" (norma principal y específica)
+   - Menciona el término de respuesta dentro del texto argumentativo:
+     * 15 días hábiles (Ley 1755 de 2015) para peticiones generales
+     * 10 días hábiles (Ley 1755 de 2015) cuando se solicitan documentos o información específica
+   - Si involucra menores de edad: cita el Art. 44 C.P. y menciona el interés superior del menor en el texto
+   - Si involucra adultos mayores: cita el Art. 46 C.P. dentro de la argumentación
+   - Si involucra personas con discapacidad: cita el Art. 47 C.P. integrado en el texto
+   IMPORTANTE: La Ley 1755 de 2015 es la norma específica que regula el derecho de petición y sustituye los capítulos respectivos de la Ley 1437 de 2011.
+   NO uses listas de viñetas, desarrolla una argumentación legal coherente en prosa profesional.
+
+   **IV. PETICIONES**
+   FORMATO DE LISTA OBLIGATORIO: Enumera de forma clara, específica y accionable lo que se solicita a la entidad.
+   Usar formato: "PRIMERO:", "SEGUNDO:", "TERCERO:", etc.
+   Cada petición debe ser específica, medible y accionable.
+
+   **V. ANEXOS**
+   FORMATO DE LISTA OBLIGATORIO: Si se especificaron pruebas o documentos anexos, USA EXACTAMENTE la información proporcionada en "PRUEBAS Y DOCUMENTOS ANEXOS" de los DATOS DEL CASO.
+   Formato: "- Anexo 1: [descripción]" o "1. [descripción]"
+   Si no se especificaron, indica: "Se aportarán posteriormente los documentos necesarios."
+
+   **VI. NOTIFICACIONES**
+   Formato formal:
+   "Para efectos de notificaciones y respuestas:
+   Dirección física: [dirección]
+   Correo electrónico: [email]
+   Teléfono: [teléfono]"
+
+3. CIERRE FORMAL:
+   Después de la sección VI, incluir:
+
+   "Cordialmente,
+
+   _________________________________
+   [Nombre completo del solicitante]
+   C.C. No. [número de identificación]
+   Dirección: [dirección]
+   Teléfono: [teléfono]
+   Email: [correo electrónico]"
+
+4. Usa lenguaje formal, respetuoso y técnico apropiado para un derecho de petición
+
+5. IMPORTANTE - NO uses terminología de acción de tutela:
+   - NO uses: "accionante", "accionado", "juez", "sentencia", "fallo", "pretensiones", "amparo"
+   - USA: "peticionario", "entidad destinataria", "respuesta", "peticiones", "solicitud"
+
+6. Todos los títulos de secciones principales deben estar en NEGRITA usando formato **TÍTULO**
+
+7. El documento debe tener apariencia de documento legal oficial, no de borrador
+
+8. El documento debe estar completo y listo para radicar
+
+9. Para separar secciones usa ÚNICAMENTE líneas en blanco (saltos de línea). NO uses separadores gráficos como guiones (--), asteriscos, líneas, ni ningún otro símbolo decorativo.
+
+10. IMPORTANTE - FORMATO DE CONTENIDO:
+   - USA LISTAS solo para: Hechos (si son varios), Peticiones, y Anexos
+   - USA PÁRRAFOS ARGUMENTATIVOS para: Objeto y Fundamentos de Derecho
+   - Los párrafos argumentativos deben ser texto corrido profesional, coherente y bien desarrollado. NO uses viñetas ni listas en secciones argumentativas.
+
+11. Si en los DATOS DEL CASO aparece la marca "[… texto abreviado por extensión …]", significa que ese texto se abrevió por su longitud. NUNCA copies esa marca al documento ni menciones que hay texto omitido: redacta con la información disponible.
+
+El documento debe estar listo para ser presentado ante la entidad correspondiente en Colombia."""
+
+_SISTEMA: Dict[str, str] = {
+    TUTELA: SISTEMA_TUTELA,
+    DERECHO_PETICION: SISTEMA_DERECHO_PETICION,
+}
+
+# Tokens de cada prefijo (se calculan una vez)
+_TOKENS_PREFIJO: Dict[str, int] = {}
+
+
+def clave_cache(tipo: str) -> str:
+    """prompt_cache_key: agrupa en el proveedor las llamadas con el mismo prefijo."""
+    return f"abogadai-{tipo.lower()}"
+
+
+def tokens_prefijo(tipo: str) -> int:
+    if tipo not in _TOKENS_PREFIJO:
+        _TOKENS_PREFIJO[tipo] = estimar_tokens(_SISTEMA[tipo])
+    return _TOKENS_PREFIJO[tipo]
+
+
+def _valor(datos: dict, campo: str, defecto: str = "") -> str:
+    return datos.get(campo) or defecto
+
+
+def _formula_actuacion(datos: dict) -> str:
+    if datos.get("actua_en_representacion", False):
+        relacion = _valor(datos, "relacion_representado", "representante legal")
+        return f"actuando en calidad de {relacion} de {_valor(datos, 'nombre_representado')},"
+    return "actuando en nombre propio,"
+
+
+def _bloque_datos(tipo: str, datos: dict) -> str:
+    """Mensaje de usuario con los datos del caso (la parte variable del prompt)."""
+    es_tutela = tipo == TUTELA
+    lineas = [
+        "DATOS DEL CASO:",
+        "",
+        "SOLICITANTE:",
+        f"- Nombre: {_valor(datos, 'nombre_solicitante')}",
+        f"- Identificación: {_valor(datos, 'identificacion_solicitante')}",
+        f"- Dirección: {_valor(datos, 'direccion_solicitante')}",
+        f"- Teléfono: {_valor(datos, 'telefono_solicitante')}",
+        f"- Email: {_valor(datos, 'email_solicitante')}",
+        f"- Actúa en representación: {'Sí' if datos.get('actua_en_representacion', False) else 'No'}",
+    ]
+    if datos.get("actua_en_representacion", False):
+        lineas += [
+            f"- Persona representada: {_valor(datos, 'nombre_representado')}",
+            f"- Identificación representado: {_valor(datos, 'identificacion_representado')}",
+            f"- Relación: {_valor(datos, 'relacion_representado')}",
+            f"- Tipo de persona representada: {_valor(datos, 'tipo_representado')}",
+        ]
+    lineas += [
+        "",
+        "FÓRMULA DE ACTUACIÓN:",
+        _formula_actuacion(datos),
+        "",
+        "ENTIDAD ACCIONADA:" if es_tutela else "ENTIDAD DESTINATARIA:",
+        f"- Nombre: {_valor(datos, 'entidad_accionada')}",
+        f"- Dirección: {_valor(datos, 'direccion_entidad')}",
+        "",
+        "HECHOS:",
+        _valor(datos, "hechos"),
+        "",
+        "CIUDAD DONDE OCURRIERON LOS HECHOS:",
+        _valor(datos, "ciudad_de_los_hechos"),
+    ]
+    if es_tutela:
+        lineas += ["", "DERECHOS VULNERADOS:", _valor(datos, "derechos_vulnerados")]
+    lineas += [
+        "",
+        "PRETENSIONES:" if es_tutela else "PETICIONES:",
+        _valor(datos, "pretensiones"),
+        "",
+        "FUNDAMENTOS DE DERECHO:",
+        _valor(datos, "fundamentos_derecho"),
+        "",
+        "PRUEBAS Y DOCUMENTOS ANEXOS:",
+        _valor(
+            datos, "pruebas",
+            "No se especificaron pruebas" if es_tutela else "No se especificaron documentos anexos",
+        ),
+    ]
+    return "\n".join(lineas)
+
+
+def recortar_texto(texto: str, max_tokens: int) -> str:
+    """
+    Reduce el texto a max_tokens conservando inicio (2/3) y final (1/3),
+    cortando en límites de oración o párrafo.
+    """
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+
+    disponible = max(max_tokens - estimar_tokens(MARCA_RECORTE), 0)
+    limite_inicio = disponible * 2 // 3
+    limite_final = disponible - limite_inicio
+
+    segmentos, anterior = [], 0
+    for corte in _FIN_ORACION.finditer(texto):
+        segmentos.append(texto[anterior:corte.end()])
+        anterior = corte.end()
+    segmentos.append(texto[anterior:])
+
+    inicio, usados = [], 0
+    for segmento in segmentos:
+        tokens = estimar_tokens(segmento)
+        if usados + tokens > limite_inicio:
+            break
+        inicio.append(segmento)
+        usados += tokens
+
+    final, usados = [], 0
+    for segmento in reversed(segmentos[len(inicio):]):
+        tokens = estimar_tokens(segmento)
+        if usados + tokens > limite_final:
+            break
+        final.append(segmento)
+        usados += tokens
+
+    texto_inicio = "".join(inicio)
+    if not texto_inicio:
+        # Primera oración más larga que el límite: corte duro por caracteres
+        texto_inicio = texto[:int(limite_inicio * CARACTERES_POR_TOKEN)]
+    return texto_inicio.rstrip() + MARCA_RECORTE + "".join(reversed(final)).lstrip()
+
+
+def _recortar_campos(datos: dict, exceso: int) -> dict:
+    """Recorta los campos recortables, empezando por el más largo, hasta cubrir el exceso."""
+    datos = dict(datos)
+    tamanos = {campo: estimar_tokens(datos.get(campo) or "") for campo in CAMPOS_RECORTABLES}
+    for campo in sorted(tamanos, key=tamanos.get, reverse=True):
+        if exceso <= 0:
+            break
+        recortable = tamanos[campo] - MIN_TOKENS_CAMPO
+        if recortable <= 0:
+            continue
+        datos[campo] = recortar_texto(datos[campo], tamanos[campo] - min(exceso, recortable))
+        exceso -= tamanos[campo] - estimar_tokens(datos[campo])
+    return datos
+
+
+def armar_prompt(tipo: str, datos_caso: dict, presupuesto_tokens: int = None) -> PromptDocumento:
+    """
+    Mensajes para generar el documento: prefijo estable + datos del caso
+    recortados a presupuesto_tokens (por defecto LLM_PRESUPUESTO_TOKENS_DATOS).
+    """
+    presupuesto = presupuesto_tokens or settings.LLM_PRESUPUESTO_TOKENS_DATOS
+
+    datos = _bloque_datos(tipo, datos_caso)
+    tokens_datos = estimar_tokens(datos)
+    tokens_recortados = 0
+    if tokens_datos > presupuesto:
+        datos = _bloque_datos(tipo, _recortar_campos(datos_caso, tokens_datos - presupuesto))
+        tokens_recortados = tokens_datos - estimar_tokens(datos)
+        tokens_datos -= tokens_recortados
+
+    return PromptDocumento(
+        mensajes=[
+            {"role": "system", "content": _SISTEMA[tipo]},
+            {"role": "user", "content": datos},
+        ],
+        tokens_prefijo=tokens_prefijo(tipo),
+        tokens_datos=tokens_datos,
+        tokens_recortados=tokens_recortados,
+    )
+
+
+def registrar_prompt(funcion: str, prompt: PromptDocumento):
+    """Deja en log y métricas el tamaño del prompt y los tokens recortados."""
+    if prompt.tokens_recortados:
+        metricas.LLM_TOKENS_RECORTADOS.labels(funcion).inc(prompt.tokens_recortados)
+        logger.info(
+            f"[LLM] {funcion}: datos recortados {prompt.tokens_recortados} tokens "
+            f"(quedan {prompt.tokens_datos}; prefijo cacheable {prompt.tokens_prefijo})"
+        )
+
+
+def _reporte():
+    from .llm_uso_service import PRECIOS_USD_POR_MILLON
+
+    precio_prompt, precio_cache, _ = next(iter(PRECIOS_USD_POR_MILLON.values()))
+    print(f"Tokenizador: {'tiktoken o200k_base' if _CODIFICADOR else 'estimación por caracteres'}")
+    print(f"Presupuesto de datos: {settings.LLM_PRESUPUESTO_TOKENS_DATOS} tokens\n")
+
+    parrafo = "El día 3 de marzo radiqué la solicitud ante la EPS y no obtuve respuesta alguna. "
+    datos = {
+        "nombre_solicitante": "María José Pérez",
+        "entidad_accionada": "EPS Ejemplo",
+        "hechos": parrafo * 400,
+        "pretensiones": "Que se ordene la entrega del medicamento.",
+        "pruebas": "Copia de la fórmula médica. " * 200,
+    }
+
+    for tipo in _SISTEMA:
+        prompt = armar_prompt(tipo, datos)
+        # USD por 1k llamadas (precios por millón de tokens). Caché y recorte por separado:
+        # el ahorro de caché se mide sobre el mismo prompt ya recortado, y el recorte
+        # no es ahorro sino contenido que el modelo deja de ver
+        sin_cache = (prompt.tokens_prefijo + prompt.tokens_datos) * precio_prompt / 1000
+        con_cache = (prompt.tokens_prefijo * precio_cache + prompt.tokens_datos * precio_prompt) / 1000
+        recortado = prompt.tokens_recortados * precio_prompt / 1000
+        print(
+            f"{tipo:<17} prefijo {prompt.tokens_prefijo:>5} tokens | datos {prompt.tokens_datos:>5} tokens | "
+            f"prompt USD/1k llamadas: {sin_cache:.2f} sin caché -> {con_cache:.2f} con caché"
+        )
+        print(
+            f"{'':<17} recortados {prompt.tokens_recortados:>5} tokens de datos "
+            f"(USD/1k llamadas que no se envían: {recortado:.2f})"
+        )
+
+
+if __name__ == "__main__":
+    _reporte()
@@ -0,0 +1,212 @@
+"""
+Reconciliación periódica de pagos pendientes con Vita Wallet
+
+Los pagos se resuelven normalmente por webhook o por el polling del frontend.
+Este proceso cubre el resto (webhook perdido, usuario que cerró la pestaña):
+1. Toma los pagos PENDIENTE de Vita con vita_public_code
+2. Consulta en Vita el estado de cada orden (GET por public_code, no la lista
+   de últimos eventos) en paralelo con concurrencia acotada
+3. Aplica las transiciones: exitosos uno a uno (beneficios), fallidos en lote.
+   Solo se marca FALLIDO lo que Vita reporta como expirado, cancelado o
+   rechazado; una orden sin estado confirmado sigue PENDIENTE
+4. Registra métricas de la ejecución (incluye demora entre pago y desbloqueo)
+
+Corre como job del scheduler (una vez en toda la flota); el resumen de cada
+ejecución queda en job_ejecuciones y de ahí lo lee el panel admin.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+from ..core.database import SessionLocal
+from ..models.job_ejecucion import JobEjecucion
+from ..models.pago import Pago, EstadoPago, MetodoPago
+from .vitawallet_service import vitawallet_service
+from .pago_service import confirmar_pago
+
+logger = logging.getLogger(__name__)
+
+# Consultas simultáneas a Vita por ejecución
+CONCURRENCIA_MAXIMA = 5
+
+# Pagos revisados por ejecución (los más antiguos primero)
+TAMANO_LOTE = 200
+
+ESTADOS_EXITOSOS_VITA = {"paid", "completed"}
+ESTADOS_FALLIDOS_VITA = {"expired", "cancelled", "failed", "denied", "time_out"}
+
+# Nombre del job en el scheduler (y en job_ejecuciones)
+JOB_RECONCILIACION = "reconciliacion_pagos"
+
+
+def _pagos_pendientes(limite: int) -> List[Tuple[int, str]]:
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Pago.id, Pago.vita_public_code)
+            .filter(
+                Pago.estado == EstadoPago.PENDIENTE,
+                Pago.metodo_pago == MetodoPago.VITA_WALLET,
+                Pago.vita_public_code.isnot(None),
+            )
+            .order_by(Pago.created_at)
+            .limit(limite)
+            .all()
+        )
+    finally:
+        db.close()
+
+
+def _parsear_fecha(valor: Optional[str]) -> Optional[datetime]:
+    """Fecha ISO8601 de Vita ("2024-03-12T03:27:34Z") a datetime UTC naive."""
+    if not valor:
+        return None
+    try:
+        fecha = datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if fecha.tzinfo is not None:
+        fecha = fecha.replace(tzinfo=None) - (fecha.utcoffset() or timedelta(0))
+    return fecha
+
+
+def _marcar_fallidos_en_lote(fallidos: List[Tuple[int, str]], db: Session) -> int:
+    """
+    Marca como FALLIDO los pagos que sigan PENDIENTE con un único
+    UPDATE ... WHERE id IN (...) AND estado = PENDIENTE (motivo por CASE).
+    """
+    if not fallidos:
+        return 0
+
+    motivos = dict(fallidos)
+    actualizados = db.query(Pago).filter(
+        Pago.id.in_(motivos),
+        Pago.estado == EstadoPago.PENDIENTE
+    ).update({
+        Pago.estado: EstadoPago.FALLIDO,
+        Pago.notas_admin: case(motivos, value=Pago.id),
+        Pago.updated_at: datetime.utcnow(),
+    }, synchronize_session=False)
+    db.commit()
+    return actualizados
+
+
+def _aplicar_resultados(
+    exitosos: List[Tuple[int, Optional[datetime]]],
+    fallidos: List[Tuple[int, str]],
+) -> Tuple[int, int, List[float]]:
+    """
+    Aplica las transiciones detectadas.
+
+    Returns:
+        (confirmados, marcados_fallidos, demoras_desbloqueo_segundos)
+    """
+    db = SessionLocal()
+    confirmados = 0
+    demoras: List[float] = []
+    try:
+        for pago_id, pagado_en in exitosos:
+            try:
+                beneficios = confirmar_pago(pago_id, db, fecha_pago=pagado_en)
+            except Exception as e:
+                # Queda PENDIENTE: la próxima pasada lo reintenta
+                logger.error(f"[Reconciliación] Error confirmando pago {pago_id}: {str(e)}")
+                continue
+            if beneficios is not None:
+                confirmados += 1
+                if pagado_en:
+                    demoras.append(max(0.0, (datetime.utcnow() - pagado_en).total_seconds()))
+                logger.info(f"[Reconciliación] Pago {pago_id} confirmado")
+
+        marcados = _marcar_fallidos_en_lote(fallidos, db)
+        return confirmados, marcados, demoras
+    finally:
+        db.close()
+
+
+async def reconciliar_pagos_pendientes(limite: int = TAMANO_LOTE) -> dict:
+    """
+    Ejecuta una pasada de reconciliación.
+
+    Returns:
+        Resumen de la ejecución (el scheduler lo guarda en job_ejecuciones)
+    """
+    inicio = time.monotonic()
+    pendientes = await asyncio.to_thread(_pagos_pendientes, limite)
+
+    semaforo = asyncio.Semaphore(CONCURRENCIA_MAXIMA)
+
+    async def consultar(public_code: str) -> dict:
+        async with semaforo:
+            return await vitawallet_service.consultar_payment_order(public_code)
+
+    resultados = await asyncio.gather(
+        *(consultar(public_code) for _, public_code in pendientes),
+        return_exceptions=True,
+    )
+
+    exitosos: List[Tuple[int, Optional[datetime]]] = []
+    fallidos: List[Tuple[int, str]] = []
+    errores = 0
+
+    for (pago_id, _), resultado in zip(pendientes, resultados):
+        if isinstance(resultado, BaseException) or resultado.get("error"):
+            errores += 1
+            continue
+
+        estado_vita = resultado.get("status")
+        if estado_vita in ESTADOS_EXITOSOS_VITA:
+            exitosos.append((pago_id, _parsear_fecha(resultado.get("paid_at"))))
+        elif estado_vita in ESTADOS_FALLIDOS_VITA:
+            fallidos.append((pago_id, f"Estado Vita (reconciliación): {estado_vita}"))
+
+    confirmados, marcados_fallidos, demoras = 0, 0, []
+    if exitosos or fallidos:
+        confirmados, marcados_fallidos, demoras = await asyncio.to_thread(
+            _aplicar_resultados, exitosos, fallidos
+        )
+
+    demoras.sort()
+    resumen = {
+        "ejecutado_en": datetime.utcnow().isoformat(),
+        "duracion_ms": int((time.monotonic() - inicio) * 1000),
+        "pendientes_revisados": len(pendientes),
+        "confirmados": confirmados,
+        "fallidos_o_expirados": marcados_fallidos,
+        "errores_consulta": errores,
+        "demora_desbloqueo_segundos": {
+            "p50": demoras[len(demoras) // 2] if demoras else None,
+            "max": demoras[-1] if demoras else None,
+        },
+    }
+    if confirmados or marcados_fallidos or errores:
+        logger.info(f"[Reconciliación] {resumen}")
+
+    return resumen
+
+
+def ultima_ejecucion(db: Session) -> Optional[dict]:
+    """
+    Última ejecución terminada del job, desde job_ejecuciones (la misma en
+    todos los workers, aunque solo uno la haya corrido).
+    """
+    ejecucion = (
+        db.query(JobEjecucion)
+        .filter(JobEjecucion.job == JOB_RECONCILIACION, JobEjecucion.estado != "EJECUTANDO")
+        .order_by(JobEjecucion.programado_para.desc())
+        .first()
+    )
+    if ejecucion is None:
+        return None
+    return {
+        "estado": ejecucion.estado,
+        "worker": ejecucion.worker,
+        "finalizado_en": ejecucion.finalizado_en.isoformat() if ejecucion.finalizado_en else None,
+        "resumen": ejecucion.resultado,
+        "error": ejecucion.error,
+    }
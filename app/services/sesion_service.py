@@ -272,3 +272,51 @@ def desbloquear_sesiones_extra(user_id: int, cantidad: int, db: Session):
         "sesiones_extra_hoy": usuario.sesiones_extra_hoy,
         "total_sesiones_disponibles": obtener_uso_diario(user_id, hoy, db)["sesiones_disponibles"]
     }
+
+
+def finalizar_sesion_caso(caso_id: int, db: Session, fecha_fin: datetime = None) -> dict:
+    """
+    Cierra la sesión de avatar de un caso: fecha_fin_sesion, duración y sesiones_diarias
+    en una sola transacción.
+
+    Lo usan el frontend (PUT /sesiones/{id}/finalizar) y el webhook de LiveKit
+    (room_finished / participant_left). El caso se bloquea con FOR UPDATE y solo
+    la primera finalización registra minutos; las siguientes (ej: el frontend
+    después del webhook) retornan la duración ya registrada sin contarla dos veces.
+
+    Args:
+        caso_id: ID del caso
+        db: Sesión de base de datos
+        fecha_fin: Momento de fin (por defecto ahora; el webhook envía la hora del evento)
+
+    Returns:
+        dict: {"duracion_minutos": int, "ya_finalizada": bool}
+
+    Raises:
+        ValueError: Si el caso no existe
+    """
+    caso = db.query(Caso).filter(Caso.id == caso_id).with_for_update().first()
+    if not caso:
+        raise ValueError(f"Caso {caso_id} no encontrado")
+
+    if caso.fecha_fin_sesion is not None:
+        duracion_minutos = 0
+        if caso.fecha_inicio_sesion:
+            duracion_minutos = int((caso.fecha_fin_sesion - caso.fecha_inicio_sesion).total_seconds() / 60)
+        db.rollback()
+        return {"duracion_minutos": duracion_minutos, "ya_finalizada": True}
+
+    fecha_fin = fecha_fin or datetime.utcnow()
+    if caso.fecha_inicio_sesion and fecha_fin < caso.fecha_inicio_sesion:
+        fecha_fin = caso.fecha_inicio_sesion
+    caso.fecha_fin_sesion = fecha_fin
+
+    duracion_minutos = 0
+    if caso.fecha_inicio_sesion:
+        duracion_minutos = int((fecha_fin - caso.fecha_inicio_sesion).total_seconds() / 60)
+        # registrar_fin_sesion hace commit junto con fecha_fin_sesion
+        registrar_fin_sesion(caso.id, duracion_minutos, db, ya_fue_finalizada=False)
+    else:
+        db.commit()
+
+    return {"duracion_minutos": duracion_minutos, "ya_finalizada": False}
@@ -15,18 +15,53 @@ AUTENTICACIÓN:
 - Formato: signature = hmac(secret, x_login + x_date + request_body_hash)
 """
 
+import asyncio
 import hmac
 import hashlib
 import json
 import logging
+import random
 import httpx
 from typing import Optional
 from datetime import datetime, timezone
 
+from ..core import trazas
 from ..core.config import settings
+from ..core.circuit_breaker import CircuitBreaker, CircuitoAbiertoError
+from ..core.single_flight import SingleFlightCache
 
 logger = logging.getLogger(__name__)
 
+# HTTP/2 requiere el extra httpx[http2] (paquete h2); sin él se usa HTTP/1.1 con keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_DISPONIBLE = True
+except ImportError:
+    HTTP2_DISPONIBLE = False
+
+# Pool de conexiones compartido por todo el proceso
+VITA_LIMITES_CONEXION = httpx.Limits(
+    max_connections=20,
+    max_keepalive_connections=10,
+    keepalive_expiry=60.0,
+)
+VITA_TIMEOUT_DEFECTO = httpx.Timeout(15.0, connect=5.0)
+VITA_TIMEOUT_PAGO = httpx.Timeout(30.0, connect=5.0)
+
+# Reintentos con backoff exponencial + jitter (solo llamadas idempotentes)
+VITA_MAX_INTENTOS = 3
+VITA_BACKOFF_BASE = 0.3  # segundos
+VITA_BACKOFF_MAXIMO = 3.0
+VITA_STATUS_REINTENTABLES = {429, 502, 503, 504}
+
+# Consultas de estado coalescidas: el tráfico hacia Vita escala con las órdenes
+# pendientes y no con la cantidad de pestañas haciendo polling
+ESTADO_INTERVALO_MINIMO = 10.0  # segundos entre consultas a Vita por orden pendiente
+ESTADO_TTL_FINAL = 600.0  # paid/completed/expired... ya no cambian
+ESTADO_TTL_ERROR = 5.0
+EVENTOS_TTL = 3.0  # la lista de eventos es la misma para todas las órdenes
+ESTADOS_FINALES_VITA = {"paid", "completed", "expired", "cancelled", "failed", "denied", "time_out"}
+
 
 class VitaWalletError(Exception):
     """Excepción personalizada para errores de Vita Wallet"""
@@ -55,6 +90,121 @@ class VitaWalletService:
         self.wallet_master_uuid = getattr(settings, 'VITA_WALLET_MASTER_UUID', None)
         self.environment = settings.VITA_ENVIRONMENT
 
+        # Cliente HTTP de larga vida (se crea en el lifespan de la app)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker("vita_wallet", umbral_fallos=5, segundos_abierto=30)
+
+        # Cachés single-flight para el polling de estado
+        self._estado_cache = SingleFlightCache()
+        self._eventos_cache = SingleFlightCache(max_entradas=1)
+
+    async def iniciar(self):
+        """Crea el cliente HTTP compartido (pool + keep-alive + HTTP/2 si está disponible)."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=HTTP2_DISPONIBLE,
+                limits=VITA_LIMITES_CONEXION,
+                timeout=VITA_TIMEOUT_DEFECTO,
+            )
+            logger.info(f"Cliente Vita Wallet iniciado (http2={HTTP2_DISPONIBLE})")
+
+    async def cerrar(self):
+        """Cierra el cliente HTTP compartido y sus conexiones."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _obtener_cliente(self) -> httpx.AsyncClient:
+        # Fuera de la app (scripts, cron) el cliente se crea bajo demanda
+        if self._client is None or self._client.is_closed:
+            await self.iniciar()
+        return self._client
+
+    @staticmethod
+    def _espera_reintento(intento: int) -> float:
+        """Backoff exponencial con jitter completo."""
+        return random.uniform(0, min(VITA_BACKOFF_MAXIMO, VITA_BACKOFF_BASE * (2 ** intento)))
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[dict] = None,
+        idempotente: bool = True,
+        timeout: Optional[httpx.Timeout] = None,
+    ) -> httpx.Response:
+        """
+        Ejecuta un request firmado contra Vita usando el cliente compartido.
+
+        - Cada intento se firma de nuevo (X-Date cambia)
+        - Llamadas idempotentes: reintenta timeouts, errores de red, 429 y 5xx
+        - Llamadas no idempotentes (crear orden): solo reintenta si la conexión
+          no llegó a establecerse (el request nunca salió)
+        - Circuit breaker: tras fallos consecutivos (5xx, 429, red) falla rápido
+          sin llamar a Vita; la llamada de prueba siempre se resuelve (o se
+          libera si se cancela) en el finally
+
+        Raises:
+            CircuitoAbiertoError: Si el circuito está abierto
+            httpx.TimeoutException / httpx.RequestError: Si se agotan los intentos
+        """
+        es_prueba = self.breaker.verificar()
+        # Veredicto para el breaker: True = Vita respondió bien, False = fallo
+        # (5xx, 429, red), None = sin veredicto (cancelado, error local)
+        sano: Optional[bool] = None
+        try:
+            client = await self._obtener_cliente()
+
+            for intento in range(VITA_MAX_INTENTOS):
+                ultimo_intento = intento == VITA_MAX_INTENTOS - 1
+                headers = self._get_headers(payload or {})
+
+                try:
+                    with trazas.span_cliente(
+                        f"Vita {method} {path}",
+                        **{"http.request.method": method, "http.request.resend_count": intento},
+                    ) as span:
+                        response = await client.request(
+                            method,
+                            path,
+                            headers=headers,
+                            json=payload,
+                            timeout=timeout or VITA_TIMEOUT_DEFECTO,
+                        )
+                        span.set_attribute("http.response.status_code", response.status_code)
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                    # El request no se envió: reintentar es seguro incluso si no es idempotente
+                    if ultimo_intento:
+                        sano = False
+                        raise
+                    logger.warning(f"Vita {method} {path}: error de conexión ({type(e).__name__}), reintentando...")
+                except (httpx.TimeoutException, httpx.RequestError) as e:
+                    if not idempotente or ultimo_intento:
+                        sano = False
+                        raise
+                    logger.warning(f"Vita {method} {path}: {type(e).__name__}, reintentando...")
+                else:
+                    if response.status_code >= 500 or response.status_code == 429:
+                        if idempotente and not ultimo_intento and response.status_code in VITA_STATUS_REINTENTABLES:
+                            logger.warning(f"Vita {method} {path}: HTTP {response.status_code}, reintentando...")
+                            await asyncio.sleep(self._espera_reintento(intento))
+                            continue
+                        sano = False
+                        return response
+
+                    sano = True
+                    return response
+
+                await asyncio.sleep(self._espera_reintento(intento))
+        finally:
+            if sano is True:
+                self.breaker.registrar_exito()
+            elif sano is False:
+                self.breaker.registrar_fallo()
+            elif es_prueba:
+                self.breaker.liberar_prueba()
+
     def _calculate_request_body_hash(self, body: dict) -> str:
         """
         Calcula el hash del body para la firma HMAC.
@@ -192,43 +342,47 @@ class VitaWalletService:
         logger.info(f"Creando payment order en Vita: caso={caso_id}, monto={monto}")
 
         try:
-            # Generar headers con firma HMAC
-            headers = self._get_headers(payload)
-
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/businesses/payment_orders",
-                    headers=headers,
-                    json=payload
+            response = await self._request(
+                "POST",
+                "/api/businesses/payment_orders",
+                payload=payload,
+                idempotente=False,
+                timeout=VITA_TIMEOUT_PAGO,
+            )
+
+            response_data = response.json()
+
+            if response.status_code not in [200, 201]:
+                logger.error(f"Error Vita API: {response.status_code} - {response_data}")
+                raise VitaWalletError(
+                    message=f"Error creando orden de pago: {response_data}",
+                    status_code=response.status_code,
+                    response_data=response_data
                 )
 
-                response_data = response.json()
-
-                if response.status_code not in [200, 201]:
-                    logger.error(f"Error Vita API: {response.status_code} - {response_data}")
-                    raise VitaWalletError(
-                        message=f"Error creando orden de pago: {response_data}",
-                        status_code=response.status_code,
-                        response_data=response_data
-                    )
-
-                # Extraer datos de la respuesta
-                # Estructura: { "data": { "id": "37", "type": "payment_order", "attributes": {...} } }
-                data = response_data.get("data", {})
-                attributes = data.get("attributes", {})
-
-                result = {
-                    "payment_url": attributes.get("url"),
-                    "public_code": attributes.get("public_code"),
-                    "vita_order_id": data.get("id"),
-                    "expires_at": attributes.get("expires_at"),
-                    "status": attributes.get("status", "pending")
-                }
+            # Extraer datos de la respuesta
+            # Estructura: { "data": { "id": "37", "type": "payment_order", "attributes": {...} } }
+            data = response_data.get("data", {})
+            attributes = data.get("attributes", {})
+
+            result = {
+                "payment_url": attributes.get("url"),
+                "public_code": attributes.get("public_code"),
+                "vita_order_id": data.get("id"),
+                "expires_at": attributes.get("expires_at"),
+                "status": attributes.get("status", "pending")
+            }
 
-                logger.info(f"Payment order creada: public_code={result['public_code']}")
+            logger.info(f"Payment order creada: public_code={result['public_code']}")
 
-                return result
+            return result
 
+        except CircuitoAbiertoError as e:
+            logger.error(f"Vita Wallet no disponible: {str(e)}")
+            raise VitaWalletError(
+                "Vita Wallet no está disponible temporalmente, intenta de nuevo en unos segundos",
+                status_code=503
+            )
         except httpx.TimeoutException:
             logger.error("Timeout conectando con Vita Wallet API")
             raise VitaWalletError("Timeout conectando con Vita Wallet")
@@ -435,7 +589,12 @@ class VitaWalletService:
 
         try:
             # Usar el endpoint de eventos que sí está documentado
-            eventos = await self.obtener_ultimos_eventos()
+            # (una sola llamada compartida por todas las órdenes consultadas a la vez)
+            eventos = await self._eventos_cache.obtener(
+                "eventos",
+                self.obtener_ultimos_eventos,
+                ttl=lambda r: 0 if r.get("error") else EVENTOS_TTL,
+            )
 
             if eventos.get("error"):
                 return {"status": "unknown", "error": eventos["error"]}
@@ -495,6 +654,76 @@ class VitaWalletService:
             logger.error(f"Error consultando estado de payment order: {str(e)}")
             return {"status": "unknown", "error": str(e)}
 
+    async def consultar_payment_order(self, public_code: str) -> dict:
+        """
+        Estado de una payment order consultada por su public_code
+        (GET /api/businesses/payment_orders/{public_code}).
+
+        A diferencia de consultar_estado_payment_order, no depende de que el
+        evento de la orden siga entre los últimos eventos de Vita: la
+        reconciliación la usa para órdenes con webhook perdido hace horas.
+
+        Returns:
+            {
+                "status": "pending|paid|completed|expired|cancelled|...|unknown",
+                "amount": 39000,
+                "paid_at": "2024-03-12T...",  # si fue pagado
+                "error": None  # o mensaje de error (status "unknown")
+            }
+        """
+        if not public_code:
+            return {"status": "unknown", "error": "No public_code provided"}
+
+        try:
+            response = await self._request("GET", f"/api/businesses/payment_orders/{public_code}")
+
+            if response.status_code != 200:
+                return {"status": "unknown", "error": f"HTTP {response.status_code}: {response.text}"}
+
+            attributes = response.json().get("data", {}).get("attributes", {})
+            status = (attributes.get("status") or "").lower()
+            if not status:
+                return {"status": "unknown", "error": "Respuesta de Vita sin status"}
+
+            return {
+                "status": status,
+                "amount": attributes.get("amount"),
+                "paid_at": attributes.get("paid_at") or (
+                    attributes.get("updated_at") if status in ("paid", "completed") else None
+                ),
+                "error": None,
+            }
+
+        except Exception as e:
+            logger.error(f"Error consultando payment order {public_code}: {str(e)}")
+            return {"status": "unknown", "error": str(e)}
+
+    @staticmethod
+    def _ttl_estado(resultado: dict) -> float:
+        if resultado.get("error") or resultado.get("status") == "unknown":
+            return ESTADO_TTL_ERROR
+        if resultado.get("status") in ESTADOS_FINALES_VITA:
+            return ESTADO_TTL_FINAL
+        return ESTADO_INTERVALO_MINIMO
+
+    async def consultar_estado_coalescido(self, public_code: str) -> dict:
+        """
+        Igual que consultar_estado_payment_order, pero coalescido por public_code:
+
+        - Si ya hay una consulta en curso para la orden, se espera esa misma
+        - El último estado se reutiliza durante ESTADO_INTERVALO_MINIMO segundos
+          (o más si el estado es final), así N pestañas haciendo polling generan
+          como máximo una consulta a Vita por intervalo
+        """
+        if not public_code:
+            return await self.consultar_estado_payment_order(public_code)
+
+        return await self._estado_cache.obtener(
+            public_code,
+            lambda: self.consultar_estado_payment_order(public_code),
+            ttl=self._ttl_estado,
+        )
+
     async def obtener_configuracion_webhook(self) -> dict:
         """
         Obtiene la configuración actual del webhook desde Vita.
@@ -510,29 +739,23 @@ class VitaWalletService:
             }
         """
         try:
-            headers = self._get_headers({})
-
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.get(
-                    f"{self.base_url}/api/businesses/webhooks",
-                    headers=headers
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "webhook_url": data.get("webhook_url"),
-                        "configured_categories": data.get("configured_categories", []),
-                        "available_categories": data.get("available_categories", []),
-                        "error": None
-                    }
-                else:
-                    return {
-                        "webhook_url": None,
-                        "configured_categories": [],
-                        "available_categories": [],
-                        "error": f"HTTP {response.status_code}: {response.text}"
-                    }
+            response = await self._request("GET", "/api/businesses/webhooks")
+
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "webhook_url": data.get("webhook_url"),
+                    "configured_categories": data.get("configured_categories", []),
+                    "available_categories": data.get("available_categories", []),
+                    "error": None
+                }
+            else:
+                return {
+                    "webhook_url": None,
+                    "configured_categories": [],
+                    "available_categories": [],
+                    "error": f"HTTP {response.status_code}: {response.text}"
+                }
 
         except Exception as e:
             logger.error(f"Error obteniendo configuración webhook: {str(e)}")
@@ -568,30 +791,24 @@ class VitaWalletService:
                 "categories": categories
             }
 
-            headers = self._get_headers(payload)
-
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.put(
-                    f"{self.base_url}/api/businesses/webhooks",
-                    headers=headers,
-                    json=payload
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "success": True,
-                        "message": data.get("message", "Configuración actualizada"),
-                        "webhook_url": data.get("webhook_url"),
-                        "categories": data.get("categories"),
-                        "error": None
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "message": "Error actualizando configuración",
-                        "error": f"HTTP {response.status_code}: {response.text}"
-                    }
+            # PUT con la configuración completa: repetirlo deja el mismo estado
+            response = await self._request("PUT", "/api/businesses/webhooks", payload=payload)
+
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "success": True,
+                    "message": data.get("message", "Configuración actualizada"),
+                    "webhook_url": data.get("webhook_url"),
+                    "categories": data.get("categories"),
+                    "error": None
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": "Error actualizando configuración",
+                    "error": f"HTTP {response.status_code}: {response.text}"
+                }
 
         except Exception as e:
             logger.error(f"Error actualizando webhook: {str(e)}")
@@ -615,27 +832,21 @@ class VitaWalletService:
             }
         """
         try:
-            headers = self._get_headers({})
-
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.get(
-                    f"{self.base_url}/api/businesses/events",
-                    headers=headers
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "events": data.get("events", []),
-                        "total": data.get("total", 0),
-                        "error": None
-                    }
-                else:
-                    return {
-                        "events": [],
-                        "total": 0,
-                        "error": f"HTTP {response.status_code}: {response.text}"
-                    }
+            response = await self._request("GET", "/api/businesses/events")
+
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "events": data.get("events", []),
+                    "total": data.get("total", 0),
+                    "error": None
+                }
+            else:
+                return {
+                    "events": [],
+                    "total": 0,
+                    "error": f"HTTP {response.status_code}: {response.text}"
+                }
 
         except Exception as e:
             logger.error(f"Error obteniendo eventos: {str(e)}")
@@ -0,0 +1,335 @@
+"""
+Servicio de procesamiento de webhooks (pasarelas de pago y LiveKit)
+
+La recepción solo valida la firma y registra el evento en webhook_events
+(INSERT ... ON CONFLICT DO NOTHING). La aplicación del evento sobre los pagos
+la hace este worker, fuera del camino del ack:
+- Se toman eventos con FOR UPDATE SKIP LOCKED (varios workers no se pisan)
+- Los errores se reintentan con backoff exponencial hasta MAX_INTENTOS
+- Las transiciones de pago son condicionales, así que reaplicar es inocuo
+"""
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..core import metricas
+from ..core.database import SessionLocal
+from ..models.pago import Pago, EstadoPago, MetodoPago
+from ..models.webhook_event import WebhookEvent, EstadoWebhookEvent
+from .vitawallet_service import vitawallet_service
+from .pago_service import confirmar_pago, marcar_pago_fallido
+from .sesion_service import finalizar_sesion_caso
+from .livekit_service import caso_id_de_room
+
+logger = logging.getLogger(__name__)
+
+PROVEEDOR_VITA = "vita"
+PROVEEDOR_LIVEKIT = "livekit"
+
+# Eventos de LiveKit que cierran la sesión de avatar
+EVENTOS_FIN_SESION_LIVEKIT = {"room_finished", "participant_left"}
+
+# Identidad del usuario en el room (ver POST /sesiones/{id}/conectar)
+PREFIJO_IDENTIDAD_USUARIO = "user-"
+
+# Reintentos de eventos con error
+MAX_INTENTOS = 6
+BACKOFF_BASE_SEGUNDOS = 30  # 30s, 1m, 2m, 4m, 8m
+
+# Máximo de eventos aplicados por cada drenado de la cola
+TAMANO_LOTE = 100
+
+
+def obtener_event_id(body: dict, body_bytes: bytes) -> str:
+    """
+    ID del evento para la deduplicación.
+    Si el proveedor no envía event_id, se usa el hash del body (mismo body = mismo evento).
+    """
+    event_id = body.get("event_id")
+    if event_id:
+        return str(event_id)
+    return f"sha256:{hashlib.sha256(body_bytes).hexdigest()}"
+
+
+def registrar_evento(
+    proveedor: str,
+    event_id: str,
+    event_type: Optional[str],
+    payload: dict,
+    db: Session,
+) -> Optional[int]:
+    """
+    Registra el evento en el ledger.
+
+    Returns:
+        ID del registro, o None si el evento ya existía (entrega duplicada)
+    """
+    stmt = (
+        insert(WebhookEvent)
+        .values(
+            proveedor=proveedor,
+            event_id=event_id,
+            event_type=event_type,
+            payload=payload,
+            estado=EstadoWebhookEvent.PENDIENTE,
+            intentos=0,
+            recibido_en=datetime.utcnow(),
+            siguiente_intento_en=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(constraint="uq_webhook_events_proveedor_event_id")
+        .returning(WebhookEvent.id)
+    )
+    evento_id = db.execute(stmt).scalar()
+    db.commit()
+    return evento_id
+
+
+def _extraer_public_code(body: dict) -> Optional[str]:
+    """El public_code viene en diferentes lugares según el tipo de evento."""
+    data = body.get("data")
+    if not isinstance(data, dict):
+        return None
+
+    # 1. Directo en data.public_code (payment_order.paid)
+    public_code = data.get("public_code")
+    # 2. En data.order (transaction.completed)
+    if not public_code:
+        public_code = data.get("order")
+    # 3. En data.payment_order.public_code (payment_order_attempt.paid)
+    if not public_code and isinstance(data.get("payment_order"), dict):
+        public_code = data["payment_order"].get("public_code")
+    # 4. En data.attributes.public_code (formato alternativo)
+    if not public_code and isinstance(data.get("attributes"), dict):
+        public_code = data["attributes"].get("public_code")
+
+    return public_code
+
+
+def _buscar_pago_vita(evento: dict, public_code: Optional[str], db: Session) -> Optional[Pago]:
+    """Busca el pago por public_code, luego por transaction_id y por último por caso_id."""
+    if public_code:
+        pago = db.query(Pago).filter(Pago.vita_public_code == public_code).first()
+        if pago:
+            return pago
+
+    if evento.get("transaction_id"):
+        pago = db.query(Pago).filter(
+            Pago.referencia_pago == str(evento["transaction_id"])
+        ).first()
+        if pago:
+            return pago
+
+    # La descripción tiene formato "Pago Tutela - Caso #123"
+    desc = evento.get("description") or ""
+    if "Caso #" in desc:
+        try:
+            caso_id = int(desc.split("Caso #")[1].split()[0])
+        except (ValueError, IndexError):
+            return None
+        return db.query(Pago).filter(
+            Pago.caso_id == caso_id,
+            Pago.estado == EstadoPago.PENDIENTE,
+            Pago.metodo_pago == MetodoPago.VITA_WALLET
+        ).order_by(Pago.created_at.desc()).first()
+
+    return None
+
+
+def _aplicar_evento_vita(payload: dict, db: Session) -> Tuple[EstadoWebhookEvent, str, Optional[int]]:
+    """
+    Aplica un evento de Vita sobre el pago correspondiente.
+
+    Returns:
+        (estado final del evento, resumen, pago_id)
+    """
+    evento = vitawallet_service.parsear_evento_webhook(payload)
+    public_code = _extraer_public_code(payload)
+
+    pago = _buscar_pago_vita(evento, public_code, db)
+    if not pago:
+        logger.warning(
+            f"Webhook Vita: No se encontró pago para transaction_id={evento.get('transaction_id')}, "
+            f"public_code={public_code}"
+        )
+        return EstadoWebhookEvent.IGNORADO, "Pago no encontrado", None
+
+    if pago.estado in (EstadoPago.EXITOSO, EstadoPago.REEMBOLSADO):
+        return EstadoWebhookEvent.IGNORADO, f"Pago ya en estado {pago.estado.value}", pago.id
+
+    if vitawallet_service.es_pago_exitoso(evento):
+        beneficios = confirmar_pago(pago.id, db, referencia_pago=evento.get("transaction_id"))
+        if beneficios is None:
+            return EstadoWebhookEvent.IGNORADO, "Pago ya procesado por otra vía", pago.id
+        logger.info(f"Pago {pago.id} confirmado via webhook: {beneficios}")
+        return EstadoWebhookEvent.PROCESADO, "Pago confirmado", pago.id
+
+    if vitawallet_service.es_pago_fallido(evento):
+        motivo = f"Fallido via webhook: {evento['status']} - {evento.get('event_type')}"
+        if marcar_pago_fallido(pago.id, motivo, db):
+            return EstadoWebhookEvent.PROCESADO, "Pago marcado como fallido", pago.id
+        return EstadoWebhookEvent.IGNORADO, "Pago no estaba pendiente", pago.id
+
+    return (
+        EstadoWebhookEvent.IGNORADO,
+        f"Estado no procesable: {evento.get('status')} ({evento.get('event_type')})",
+        pago.id,
+    )
+
+
+def es_fin_de_sesion_livekit(payload: dict) -> bool:
+    """room_finished, o participant_left del usuario (no del agente/avatar)."""
+    evento = payload.get("event")
+    if evento == "room_finished":
+        return True
+    if evento == "participant_left":
+        identidad = (payload.get("participant") or {}).get("identity") or ""
+        return identidad.startswith(PREFIJO_IDENTIDAD_USUARIO)
+    return False
+
+
+def _aplicar_evento_livekit(payload: dict, db: Session) -> Tuple[EstadoWebhookEvent, str, Optional[int]]:
+    """
+    Cierra la sesión del caso asociado al room (fecha_fin_sesion, duración y
+    sesiones_diarias), usando la hora del evento como fin de sesión.
+
+    Returns:
+        (estado final del evento, resumen, pago_id=None)
+    """
+    if not es_fin_de_sesion_livekit(payload):
+        return EstadoWebhookEvent.IGNORADO, f"Evento no procesable: {payload.get('event')}", None
+
+    nombre_room = (payload.get("room") or {}).get("name") or ""
+    caso_id = caso_id_de_room(nombre_room)
+    if caso_id is None:
+        return EstadoWebhookEvent.IGNORADO, f"Room sin caso: {nombre_room}", None
+
+    fecha_fin = None
+    if payload.get("createdAt"):
+        fecha_fin = datetime.utcfromtimestamp(int(payload["createdAt"]))
+
+    try:
+        resultado = finalizar_sesion_caso(caso_id, db, fecha_fin=fecha_fin)
+    except ValueError:
+        return EstadoWebhookEvent.IGNORADO, f"Caso {caso_id} no encontrado", None
+
+    if resultado["ya_finalizada"]:
+        return EstadoWebhookEvent.IGNORADO, f"Sesión del caso {caso_id} ya finalizada", None
+    return (
+        EstadoWebhookEvent.PROCESADO,
+        f"Sesión del caso {caso_id} finalizada ({resultado['duracion_minutos']} min)",
+        None,
+    )
+
+
+# Proveedor -> función que aplica el evento
+_APLICADORES = {
+    PROVEEDOR_VITA: _aplicar_evento_vita,
+    PROVEEDOR_LIVEKIT: _aplicar_evento_livekit,
+}
+
+
+def _siguiente_evento(db: Session) -> Optional[WebhookEvent]:
+    """Toma el siguiente evento listo para procesar, bloqueándolo para este worker."""
+    return (
+        db.query(WebhookEvent)
+        .filter(
+            WebhookEvent.estado.in_([EstadoWebhookEvent.PENDIENTE, EstadoWebhookEvent.ERROR]),
+            WebhookEvent.intentos < MAX_INTENTOS,
+            WebhookEvent.siguiente_intento_en <= datetime.utcnow(),
+        )
+        .order_by(WebhookEvent.recibido_en)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+
+
+def _procesar_evento(evento_db: WebhookEvent, db: Session):
+    evento_id = evento_db.id
+    proveedor = evento_db.proveedor
+    payload = evento_db.payload
+    recibido_en = evento_db.recibido_en
+    intentos = evento_db.intentos + 1
+
+    try:
+        aplicar = _APLICADORES[proveedor]
+        estado, resultado, pago_id = aplicar(payload, db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error aplicando webhook {evento_id} ({proveedor}): {str(e)}", exc_info=True)
+        db.query(WebhookEvent).filter(WebhookEvent.id == evento_id).update({
+            WebhookEvent.estado: EstadoWebhookEvent.ERROR,
+            WebhookEvent.intentos: intentos,
+            WebhookEvent.error: str(e)[:2000],
+            WebhookEvent.siguiente_intento_en: (
+                datetime.utcnow() + timedelta(seconds=BACKOFF_BASE_SEGUNDOS * 2 ** (intentos - 1))
+            ),
+        }, synchronize_session=False)
+        db.commit()
+        return
+
+    procesado_en = datetime.utcnow()
+    db.query(WebhookEvent).filter(WebhookEvent.id == evento_id).update({
+        WebhookEvent.estado: estado,
+        WebhookEvent.intentos: intentos,
+        WebhookEvent.error: None,
+        WebhookEvent.resultado: resultado[:200],
+        WebhookEvent.pago_id: pago_id,
+        WebhookEvent.procesado_en: procesado_en,
+    }, synchronize_session=False)
+    db.commit()
+    metricas.WEBHOOK_RETRASO.labels(proveedor).observe((procesado_en - recibido_en).total_seconds())
+    logger.info(f"Webhook {evento_id} ({proveedor}) -> {estado.value}: {resultado}")
+
+
+def procesar_eventos_pendientes(limite: int = TAMANO_LOTE) -> int:
+    """
+    Drena la cola de eventos pendientes (o con error y backoff vencido).
+
+    Es seguro ejecutarlo en paralelo (tarea de la request, tarea periódica,
+    varios workers): cada evento lo toma un solo worker gracias a SKIP LOCKED.
+
+    Returns:
+        Cantidad de eventos procesados
+    """
+    db = SessionLocal()
+    procesados = 0
+    try:
+        while procesados < limite:
+            evento_db = _siguiente_evento(db)
+            if not evento_db:
+                db.rollback()
+                break
+            _procesar_evento(evento_db, db)
+            procesados += 1
+    except Exception as e:
+        logger.error(f"Error drenando webhooks pendientes: {str(e)}", exc_info=True)
+        db.rollback()
+    finally:
+        db.close()
+
+    return procesados
+
+
+def resumen_cola(db: Session) -> dict:
+    """Conteo de eventos por estado y antigüedad del pendiente más viejo."""
+    conteos = dict(
+        db.query(WebhookEvent.estado, func.count(WebhookEvent.id))
+        .group_by(WebhookEvent.estado)
+        .all()
+    )
+    mas_antiguo = db.query(func.min(WebhookEvent.recibido_en)).filter(
+        WebhookEvent.estado.in_([EstadoWebhookEvent.PENDIENTE, EstadoWebhookEvent.ERROR]),
+        WebhookEvent.intentos < MAX_INTENTOS,
+    ).scalar()
+
+    return {
+        "por_estado": {estado.value: conteos.get(estado, 0) for estado in EstadoWebhookEvent},
+        "pendiente_mas_antiguo_segundos": (
+            int((datetime.utcnow() - mas_antiguo).total_seconds()) if mas_antiguo else 0
+        ),
+    }
@@ -0,0 +1,131 @@
+"""
+Benchmark del pipeline de generación con el proveedor LLM simulado (sin red)
+
+Recorre por cada caso el mismo camino que la aplicación: extracción de la
+transcripción -> fortaleza del caso -> generación del documento -> análisis de
+calidad -> validación de jurisprudencia -> PDF, con N casos concurrentes (las
+rutas síncronas de FastAPI corren en un threadpool, igual que aquí).
+
+Uso:
+    python benchmark_generacion.py --casos 200 --concurrencia 40
+    python benchmark_generacion.py --escala 0 --tasa-error 0.05   # CI: sin esperas
+
+Las llamadas se registran en llm_usage si DATABASE_URL es accesible; si no,
+el registro falla y se informa en el log sin afectar el benchmark.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+parser = argparse.ArgumentParser(description="Benchmark del pipeline de generación (LLM simulado)")
+parser.add_argument("--casos", type=int, default=50)
+parser.add_argument("--concurrencia", type=int, default=10)
+parser.add_argument("--escala", type=float, default=None, help="LLM_SIMULADO_ESCALA_TIEMPO (0 = sin esperas)")
+parser.add_argument("--tasa-error", type=float, default=None, help="LLM_SIMULADO_TASA_ERROR")
+parser.add_argument("--turnos", type=int, default=80, help="Fragmentos de transcripción por caso")
+args = parser.parse_args()
+
+# Antes de importar la app: settings se lee del entorno al importar
+os.environ["LLM_PROVEEDOR"] = "simulado"
+if args.escala is not None:
+    os.environ["LLM_SIMULADO_ESCALA_TIEMPO"] = str(args.escala)
+if args.tasa_error is not None:
+    os.environ["LLM_SIMULADO_TASA_ERROR"] = str(args.tasa_error)
+
+from app.services import ai_analysis_service, openai_service  # noqa: E402
+from app.services.document_service import generar_pdf  # noqa: E402
+
+HECHOS = [
+    "Tengo una orden médica para una cirugía de rodilla desde hace dos meses",
+    "La EPS Sanitas no me ha autorizado el procedimiento",
+    "Fui tres veces a la sede y me dicen que no hay agenda",
+    "El dolor no me deja trabajar y el médico dice que es urgente",
+    "Tengo la historia clínica y la orden del especialista",
+]
+PREGUNTAS = [
+    "Entiendo. ¿Cuál es la entidad que vulneró sus derechos?",
+    "¿Desde cuándo ocurre esta situación?",
+    "¿Tiene documentos que lo respalden?",
+    "Perfecto. ¿Presentó antes un derecho de petición?",
+]
+
+
+def transcripcion(caso: int, turnos: int) -> list:
+    mensajes = [{"remitente": "asistente", "texto": "¡Hola! Bienvenido, soy tu asistente legal."}]
+    for i in range(turnos):
+        if i % 2 == 0:
+            mensajes.append({"remitente": "asistente", "texto": PREGUNTAS[(i // 2) % len(PREGUNTAS)]})
+        else:
+            mensajes.append({"remitente": "usuario", "texto": f"{HECHOS[(i // 2) % len(HECHOS)]} (caso {caso})."})
+    return mensajes
+
+
+def medir(tiempos: dict, errores: dict, etapa: str, funcion, *args):
+    inicio = time.perf_counter()
+    try:
+        resultado = funcion(*args)
+    except Exception:
+        errores[etapa] += 1
+        raise
+    finally:
+        tiempos[etapa].append(time.perf_counter() - inicio)
+    if isinstance(resultado, dict) and resultado.get("error"):
+        errores[etapa] += 1
+    return resultado
+
+
+def procesar_caso(caso: int, tiempos: dict, errores: dict):
+    inicio = time.perf_counter()
+    try:
+        datos = medir(tiempos, errores, "extraccion", openai_service.extraer_datos_conversacion,
+                      transcripcion(caso, args.turnos))
+        datos["nombre_solicitante"] = f"Usuario {caso}"
+        tipo = datos["tipo_documento"]
+        medir(tiempos, errores, "fortaleza", ai_analysis_service.analizar_fortaleza_caso, datos, tipo)
+        generar = openai_service.generar_tutela if tipo == "TUTELA" else openai_service.generar_derecho_peticion
+        documento = medir(tiempos, errores, "generacion", generar, datos)
+        medir(tiempos, errores, "calidad", ai_analysis_service.analizar_calidad_documento, documento, datos, tipo)
+        medir(tiempos, errores, "jurisprudencia", ai_analysis_service.validar_jurisprudencia, documento)
+        medir(tiempos, errores, "pdf", generar_pdf, documento, datos["nombre_solicitante"])
+    except Exception:
+        errores["caso"] += 1
+    finally:
+        tiempos["caso"].append(time.perf_counter() - inicio)
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p), len(ordenados) - 1)]
+
+
+print("=" * 80)
+print(f"BENCHMARK DE GENERACIÓN: {args.casos} casos, concurrencia {args.concurrencia}")
+print("=" * 80)
+
+tiempos = defaultdict(list)
+errores = defaultdict(int)
+inicio = time.perf_counter()
+with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+    for caso in range(args.casos):
+        pool.submit(procesar_caso, caso, tiempos, errores)
+total = time.perf_counter() - inicio
+
+print(f"\n{'etapa':<16}{'n':>6}{'errores':>9}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}{'media s':>10}")
+for etapa in ("extraccion", "fortaleza", "generacion", "calidad", "jurisprudencia", "pdf", "caso"):
+    valores = tiempos[etapa]
+    if not valores:
+        continue
+    print(
+        f"{etapa:<16}{len(valores):>6}{errores[etapa]:>9}"
+        f"{percentil(valores, 0.50):>10.3f}{percentil(valores, 0.95):>10.3f}"
+        f"{percentil(valores, 0.99):>10.3f}{statistics.mean(valores):>10.3f}"
+    )
+
+completos = args.casos - errores["caso"]
+print(f"\nDuración total: {total:.1f} s")
+print(f"Casos completos: {completos}/{args.casos} ({completos / total:.2f} casos/s)")
+sys.exit(1 if completos == 0 else 0)
@@ -0,0 +1,44 @@
+"""Compactación de transcripciones: limpieza de turnos sin llamadas al LLM."""
+from app.services.compactacion_service import ASISTENTE, USUARIO, Turno, _compactar_turnos
+
+
+def _mensajes(*pares):
+    return [{"remitente": remitente, "texto": texto} for remitente, texto in pares]
+
+
+def test_conserva_respuestas_cortas_repetidas_a_preguntas_distintas():
+    mensajes = _mensajes(
+        ("asistente", "¿Presentó derecho de petición?"),
+        ("usuario", "Sí."),
+        ("asistente", "¿Le respondieron?"),
+        ("usuario", "No."),
+        ("asistente", "¿Tiene diagnóstico?"),
+        ("usuario", "Sí."),
+        ("asistente", "¿La EPS negó la cirugía?"),
+        ("usuario", "Sí."),
+    )
+
+    assert _compactar_turnos(mensajes) == [
+        Turno(ASISTENTE, "¿Presentó derecho de petición?"),
+        Turno(USUARIO, "Sí."),
+        Turno(ASISTENTE, "¿Le respondieron?"),
+        Turno(USUARIO, "No."),
+        Turno(ASISTENTE, "¿Tiene diagnóstico?"),
+        Turno(USUARIO, "Sí."),
+        Turno(ASISTENTE, "¿La EPS negó la cirugía?"),
+        Turno(USUARIO, "Sí."),
+    ]
+
+
+def test_elimina_repeticion_dentro_del_mismo_turno():
+    mensajes = _mensajes(
+        ("asistente", "¿Cuál es la entidad?"),
+        ("asistente", "¿Cuál es la entidad?"),
+        ("usuario", "La EPS Ejemplo."),
+        ("usuario", "La EPS ejemplo"),
+    )
+
+    assert _compactar_turnos(mensajes) == [
+        Turno(ASISTENTE, "¿Cuál es la entidad?"),
+        Turno(USUARIO, "La EPS Ejemplo."),
+    ]